@@ -1,4 +1,6 @@
-from dobot_api import DobotApiFeedBack,DobotApiDashboard
+from dobot_api import DobotTimeoutError,DobotConnectionError
+from dobot_connect import connectRobot
+from dobot_state import RobotState
 import threading
 from time import sleep
 import re
@@ -23,11 +25,22 @@ class DobotDemo:
                 # 自定义添加所需反馈数据
 
         self.feedData = item()  # 定义结构对象
+        # 由反馈维护的状态，转换时打印事件 State tracked from the feedback, transitions are printed
+        self.state = RobotState()
+        self.state.on(None, lambda event: print("状态变化:", event))
 
     def start(self):
+        # 并行连接 29999/30004 并等待第一帧反馈，IP 不可达时在超时内失败
+        try:
+            session = connectRobot(self.ip, self.dashboardPort, self.feedPortFour)
+        except (DobotTimeoutError, DobotConnectionError) as e:
+            print("连接失败:", e)
+            return
+        print("连接耗时:", session.timings)
+        self.dashboard = session.dashboard
+        self.feedFour = session.feedback
+
         # 启动机器人并使能
-        self.dashboard = DobotApiDashboard(self.ip, self.dashboardPort)
-        self.feedFour = DobotApiFeedBack(self.ip, self.feedPortFour)
         if self.parseResultId(self.dashboard.EnableRobot())[0] != 0:
             print("使能失败: 检查29999端口是否被占用")
             return
@@ -47,7 +60,8 @@ class DobotDemo:
         while True:
             print("DI:", self.feedData.DigitalInputs,"2DI:", bin(self.feedData.DigitalInputs),"--16:",hex(self.feedData.DigitalInputs))
             print("DO:", self.feedData.DigitalOutputs,"2DO:" ,bin(self.feedData.DigitalOutputs),"--16:",hex(self.feedData.DigitalOutputs))
-            print("robomode",self.feedData.robotMode)
+            print("robomode", self.state.mode, self.state.modeName, "enabled:", self.state.enabled,
+                  "error:", self.state.error)
             sleep(2)
 
     def GetFeed(self):
@@ -63,6 +77,7 @@ class DobotDemo:
                         self.feedData.DigitalInputs = feedInfo['DigitalInputs'][0]
                         self.feedData.DigitalOutputs = feedInfo['DigitalOutputs'][0]
                         self.feedData.robotCurrentCommandID = feedInfo['CurrentCommandId'][0]
+                        self.state.update(feedInfo)
                         # 自定义添加所需反馈数据
                         '''
                         self.feedData.DigitalOutputs = int(feedInfo['DigitalOutputs'][0])
@@ -77,14 +92,13 @@ class DobotDemo:
         print(self.parseResultId(recvmovemess))
         currentCommandID = self.parseResultId(recvmovemess)[1]
         print("指令 ID:", currentCommandID)
-        #sleep(0.02)
-        while True:  #完成判断循环
-
-            print(self.feedData.robotMode)
-            if self.feedData.robotMode == 5 and self.feedData.robotCurrentCommandID == currentCommandID:
-                print("运动结束")
-                break
-            sleep(0.1)
+        # 完成判断：在满足条件的那一帧返回，不再轮询 Completion check: returns on the frame that meets it, no polling
+        frame = self.feedFour.wait_until(
+            "RobotMode == 5 and CurrentCommandId == {:d}".format(currentCommandID), timeout=60)
+        if frame is None:
+            print("等待运动结束超时")
+            return
+        print("运动结束")
 
     def parseResultId(self, valueRecv):
         # 解析返回值，确保机器人在 TCP 控制模式
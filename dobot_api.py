@@ -1,100 +1,151 @@
 import socket
-import numpy as np
+import struct
 import os
 import re
 import json
 import threading
 import time
+import random
+import contextlib
 from time import sleep
+from collections import deque
+from dobot_encoder import CommandEncoder
+from dobot_session import SessionState
 
 alarmControllerFile = "files/alarmController.json"
 alarmServoFile = "files/alarmServo.json"
 
 # Port Feedback
-MyType = np.dtype([('len', np.uint16,),
-                   ('reserve', np.byte, (6, )),
-                   ('DigitalInputs', np.uint64,),
-                   ('DigitalOutputs', np.uint64,),
-                   ('RobotMode', np.uint64,),
-                   ('TimeStamp', np.uint64,),
-                   ('RunTime', np.uint64,),
-                   ('TestValue', np.uint64,),
-                   ('reserve2', np.byte, (8, )),
-                   ('SpeedScaling', np.float64,),
-                   ('reserve3', np.byte, (16, )),
-                   ('VRobot', np.float64, ),      
-                   ('IRobot', np.float64,),
-                   ('ProgramState', np.float64,),
-                   ('SafetyOIn', np.uint16,),
-                   ('SafetyOOut', np.uint16,),
-                   ('reserve4', np.byte, (76, )),
-                   ('QTarget', np.float64, (6, )),
-                   ('QDTarget', np.float64, (6, )),
-                   ('QDDTarget', np.float64, (6, )),
-                   ('ITarget', np.float64, (6, )),
-                   ('MTarget', np.float64, (6, )),
-                   ('QActual', np.float64, (6, )),
-                   ('QDActual', np.float64, (6, )),
-                   ('IActual', np.float64, (6, )),
-                   ('ActualTCPForce', np.float64, (6, )),
-                   ('ToolVectorActual', np.float64, (6, )),
-                   ('TCPSpeedActual', np.float64, (6, )),
-                   ('TCPForce', np.float64, (6, )),
-                   ('ToolVectorTarget', np.float64, (6, )),
-                   ('TCPSpeedTarget', np.float64, (6, )),
-                   ('MotorTemperatures', np.float64, (6, )),
-                   ('JointModes', np.float64, (6, )),
-                   ('VActual', np.float64, (6, )),
-                   ('HandType', np.byte, (4, )),
-                   ('User', np.byte,),
-                   ('Tool', np.byte,),
-                   ('RunQueuedCmd', np.byte,),
-                   ('PauseCmdFlag', np.byte,),
-                   ('VelocityRatio', np.byte,),
-                   ('AccelerationRatio', np.byte,),
-                   ('reserve5', np.byte, ),
-                   ('XYZVelocityRatio', np.byte,),
-                   ('RVelocityRatio', np.byte,),
-                   ('XYZAccelerationRatio', np.byte,),
-                   ('RAccelerationRatio', np.byte,),
-                   ('reserve6', np.byte,(2,)),
-                   ('BrakeStatus', np.byte,),
-                   ('EnableStatus', np.byte,),
-                   ('DragStatus', np.byte,),
-                   ('RunningStatus', np.byte,),
-                   ('ErrorStatus', np.byte,),
-                   ('JogStatusCR', np.byte,),   
-                   ('CRRobotType', np.byte,),
-                   ('DragButtonSignal', np.byte,),
-                   ('EnableButtonSignal', np.byte,),
-                   ('RecordButtonSignal', np.byte,),
-                   ('ReappearButtonSignal', np.byte,),
-                   ('JawButtonSignal', np.byte,),
-                   ('SixForceOnline', np.byte,),
-                   ('CollisionState', np.byte,),
-                   ('ArmApproachState', np.byte,),
-                   ('J4ApproachState', np.byte,),
-                   ('J5ApproachState', np.byte,),
-                   ('J6ApproachState', np.byte,),
-                   ('reserve7', np.byte, (61, )),
-                   ('VibrationDisZ', np.float64,),
-                   ('CurrentCommandId', np.uint64,),
-                   ('MActual', np.float64, (6, )),
-                   ('Load', np.float64,),
-                   ('CenterX', np.float64,),
-                   ('CenterY', np.float64,),
-                   ('CenterZ', np.float64,),
-                   ('UserValue[6]', np.float64, (6, )),
-                   ('ToolValue[6]', np.float64, (6, )),
-                   ('reserve8', np.byte, (8, )),
-                   ('SixForceValue', np.float64, (6, )),
-                   ('TargetQuaternion', np.float64, (4, )),
-                   ('ActualQuaternion', np.float64, (4, )),
-                   ('AutoManualMode', np.uint16, ),
-                   ('ExportStatus', np.uint16, ),
-                   ('SafetyState', np.byte, ),
-                   ('reserve9', np.byte,(19,))
-                   ])
+# 实时反馈帧结构，首次使用 MyType 时才构建（并导入 NumPy），只用 Dashboard 的脚本不必加载 NumPy
+# Realtime feedback frame layout. It is built (and NumPy imported) the first time MyType is used, so
+# dashboard-only scripts never load NumPy
+def _feedbackType():
+    global MyType
+    if 'MyType' in globals():
+        return MyType
+    import numpy as np
+    MyType = np.dtype([('len', np.uint16,),
+                       ('reserve', np.byte, (6, )),
+                       ('DigitalInputs', np.uint64,),
+                       ('DigitalOutputs', np.uint64,),
+                       ('RobotMode', np.uint64,),
+                       ('TimeStamp', np.uint64,),
+                       ('RunTime', np.uint64,),
+                       ('TestValue', np.uint64,),
+                       ('reserve2', np.byte, (8, )),
+                       ('SpeedScaling', np.float64,),
+                       ('reserve3', np.byte, (16, )),
+                       ('VRobot', np.float64, ),      
+                       ('IRobot', np.float64,),
+                       ('ProgramState', np.float64,),
+                       ('SafetyOIn', np.uint16,),
+                       ('SafetyOOut', np.uint16,),
+                       ('reserve4', np.byte, (76, )),
+                       ('QTarget', np.float64, (6, )),
+                       ('QDTarget', np.float64, (6, )),
+                       ('QDDTarget', np.float64, (6, )),
+                       ('ITarget', np.float64, (6, )),
+                       ('MTarget', np.float64, (6, )),
+                       ('QActual', np.float64, (6, )),
+                       ('QDActual', np.float64, (6, )),
+                       ('IActual', np.float64, (6, )),
+                       ('ActualTCPForce', np.float64, (6, )),
+                       ('ToolVectorActual', np.float64, (6, )),
+                       ('TCPSpeedActual', np.float64, (6, )),
+                       ('TCPForce', np.float64, (6, )),
+                       ('ToolVectorTarget', np.float64, (6, )),
+                       ('TCPSpeedTarget', np.float64, (6, )),
+                       ('MotorTemperatures', np.float64, (6, )),
+                       ('JointModes', np.float64, (6, )),
+                       ('VActual', np.float64, (6, )),
+                       ('HandType', np.byte, (4, )),
+                       ('User', np.byte,),
+                       ('Tool', np.byte,),
+                       ('RunQueuedCmd', np.byte,),
+                       ('PauseCmdFlag', np.byte,),
+                       ('VelocityRatio', np.byte,),
+                       ('AccelerationRatio', np.byte,),
+                       ('reserve5', np.byte, ),
+                       ('XYZVelocityRatio', np.byte,),
+                       ('RVelocityRatio', np.byte,),
+                       ('XYZAccelerationRatio', np.byte,),
+                       ('RAccelerationRatio', np.byte,),
+                       ('reserve6', np.byte,(2,)),
+                       ('BrakeStatus', np.byte,),
+                       ('EnableStatus', np.byte,),
+                       ('DragStatus', np.byte,),
+                       ('RunningStatus', np.byte,),
+                       ('ErrorStatus', np.byte,),
+                       ('JogStatusCR', np.byte,),   
+                       ('CRRobotType', np.byte,),
+                       ('DragButtonSignal', np.byte,),
+                       ('EnableButtonSignal', np.byte,),
+                       ('RecordButtonSignal', np.byte,),
+                       ('ReappearButtonSignal', np.byte,),
+                       ('JawButtonSignal', np.byte,),
+                       ('SixForceOnline', np.byte,),
+                       ('CollisionState', np.byte,),
+                       ('ArmApproachState', np.byte,),
+                       ('J4ApproachState', np.byte,),
+                       ('J5ApproachState', np.byte,),
+                       ('J6ApproachState', np.byte,),
+                       ('reserve7', np.byte, (61, )),
+                       ('VibrationDisZ', np.float64,),
+                       ('CurrentCommandId', np.uint64,),
+                       ('MActual', np.float64, (6, )),
+                       ('Load', np.float64,),
+                       ('CenterX', np.float64,),
+                       ('CenterY', np.float64,),
+                       ('CenterZ', np.float64,),
+                       ('UserValue[6]', np.float64, (6, )),
+                       ('ToolValue[6]', np.float64, (6, )),
+                       ('reserve8', np.byte, (8, )),
+                       ('SixForceValue', np.float64, (6, )),
+                       ('TargetQuaternion', np.float64, (4, )),
+                       ('ActualQuaternion', np.float64, (4, )),
+                       ('AutoManualMode', np.uint16, ),
+                       ('ExportStatus', np.uint16, ),
+                       ('SafetyState', np.byte, ),
+                       ('reserve9', np.byte,(19,))
+                       ])
+    return MyType
+
+
+def __getattr__(name):
+    if name == 'MyType':
+        return _feedbackType()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# 反馈帧校验值（小端字节序）Feedback frame check value, little-endian
+FEEDBACK_TEST_VALUE = 0x0123456789ABCDEF
+FEEDBACK_TEST_BYTES = struct.pack('<Q', FEEDBACK_TEST_VALUE)
+
+
+def takeLatestFrame(buffer):
+    """
+    从接收缓冲区 (bytearray) 中取出最新的完整反馈帧并删除已处理的字节，没有完整帧时返回 None。
+    TestValue 不符时按其字节特征重新对齐
+    Take the newest complete feedback frame out of a receive buffer (bytearray) and delete the consumed bytes,
+    returns None when there is no complete frame. Realigns on the TestValue bytes when it does not match
+    """
+    import numpy as np
+    feedbackType = _feedbackType()
+    size = feedbackType.itemsize
+    offset = feedbackType.fields['TestValue'][1]
+    count = len(buffer) // size
+    if count == 0:
+        return None
+    start = (count - 1) * size
+    if buffer[start + offset:start + offset + 8] != FEEDBACK_TEST_BYTES:
+        found = buffer.rfind(FEEDBACK_TEST_BYTES, 0, len(buffer) - size + offset + 8)
+        if found < offset:
+            del buffer[:len(buffer) - size]
+            return None
+        start = found - offset
+    frame = np.frombuffer(bytes(buffer[start:start + size]), dtype=feedbackType)
+    del buffer[:start + size]
+    return frame
 
 # 读取控制器和伺服告警文件
 # Read controller and servo alarm files
@@ -111,26 +162,79 @@ def alarmAlarmJsonFile():
         dataServo = json.load(f)
     return dataController, dataServo
 
+
+def replyOk(valueRecv):
+    """
+    判断返回值的 ErrorID 是否为 0
+    Whether the ErrorID of a reply is 0
+    """
+    return isinstance(valueRecv, str) and re.match(r'\s*0\s*,', valueRecv) is not None
+
+# 通信超时与连接异常
+# Communication timeout and connection errors
+
+
+class DobotTimeoutError(TimeoutError):
+    """
+    指令未能在截止时间内完成（等待连接、获取通道、发送或接收），command 为对应的指令文本
+    A command did not complete before its deadline (waiting for the connection, the channel, sending or
+    receiving). command holds the command text
+    """
+
+    def __init__(self, message, command=None):
+        super().__init__(message)
+        self.command = command
+
+
+class DobotConnectionError(ConnectionError):
+    """
+    连接已断开，后台正在重连
+    The connection is lost and is being re-established in the background
+    """
+
 # Tcp通信接口类
 # TCP communication interface
 
 
 class DobotApi:
-    def __init__(self, ip, port, *args):
+    # 默认超时与重连退避，单位秒 Default timeouts and reconnect backoff, in seconds
+    connectTimeout = 2.0
+    commandTimeout = 5.0
+    backoffBase = 0.1
+    backoffMax = 5.0
+
+    def __init__(self, ip, port, *args, timeout=None, connect=True):
+        """
+        connect=False 时只初始化状态而不建立连接，连接由外部持有（如 Fleet 的 I/O 线程）
+        With connect=False only the state is initialised, the connection is owned elsewhere (e.g. the Fleet I/O
+        thread)
+        """
         self.ip = ip
         self.port = port
         self.socket_dobot = 0
         self.__globalLock = threading.Lock()
         if args:
             self.text_log = args[0]
-
+        self.timeout = self.commandTimeout if timeout is None else timeout
+        # 连接状态机：connecting -> connected -> reconnecting -> restoring -> connected，close() 后为 closed
+        # Connection state machine: connecting -> connected -> reconnecting -> restoring -> connected,
+        # closed after close()
+        self.state = "connecting"
+        self.reconnectCallbacks = []
+        self.__stateLock = threading.Lock()
+        self.__connected = threading.Event()
+        self.__closed = threading.Event()
+        self.__local = threading.local()
+
+        if not connect:
+            return
         if self.port == 29999 or self.port == 30004 or self.port == 30005:
             try:
-                self.socket_dobot = socket.socket()
-                self.socket_dobot.connect((self.ip, self.port))
-                self.socket_dobot.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 144000)
-            except socket.error:
-                print(socket.error)
+                self.socket_dobot = self.__connect()
+                self.__setConnected()
+            except socket.error as e:
+                print(f"Connect to {self.ip}:{self.port} failed: {e}, reconnecting in background")
+                self.startReconnect()
 
         else:
             print(f"Connect to dashboard server need use port {self.port} !")
@@ -139,43 +243,212 @@ class DobotApi:
         if self.text_log:
             print(text)
 
-    def send_data(self, string):
-       # self.log(f"Send to {self.ip}:{self.port}: {string}")
-        try:
-            self.socket_dobot.send(str.encode(string, 'utf-8'))
-        except Exception as e:
-            print(e)
-            while True:
-                try:
-                    self.socket_dobot = self.reConnect(self.ip, self.port)
-                    self.socket_dobot.send(str.encode(string, 'utf-8'))
-                    break
-                except Exception:
-                    sleep(1)
+    def __connect(self):
+        sock = socket.create_connection((self.ip, self.port), timeout=self.connectTimeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 144000)
+        # 连接后恢复阻塞模式，收发时再按截止时间设置超时 Back to blocking, send/recv set their own timeouts
+        sock.settimeout(None)
+        return sock
 
-    def wait_reply(self):
+    def adopt(self, sock):
         """
-        Read the return value
+        使用外部已建立的连接（如 connectRobot 并行建立的连接），通常配合 connect=False
+        Use a connection opened elsewhere (e.g. by connectRobot in parallel), usually together with connect=False
         """
-        data = ""
-        try:
-            data = self.socket_dobot.recv(1024)
-        except Exception as e:
-            print(e)
-            self.socket_dobot = self.reConnect(self.ip, self.port)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 144000)
+        sock.settimeout(None)
+        self.socket_dobot = sock
+        self.__setConnected()
+
+    def __setConnected(self):
+        with self.__stateLock:
+            if self.state == "closed":
+                return
+            self.state = "connected"
+            self.__connected.set()
+
+    def backoff(self, attempt):
+        """
+        第 attempt 次重连前的等待时间：指数退避，上限 backoffMax，乘以 [0.5, 1) 的随机抖动
+        Delay before reconnect attempt number attempt: exponential backoff capped at backoffMax,
+        multiplied by a random jitter in [0.5, 1)
+        """
+        return min(self.backoffMax, self.backoffBase * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def startReconnect(self):
+        """
+        丢弃当前连接并在后台线程中重连，重连完成前的指令等待至各自的截止时间
+        Drop the current connection and reconnect in a background thread.
+        Commands issued meanwhile wait until their own deadline
+        """
+        with self.__stateLock:
+            if self.state in ("reconnecting", "closed"):
+                return
+            self.state = "reconnecting"
+            self.__connected.clear()
+            old, self.socket_dobot = self.socket_dobot, 0
+        if old != 0:
+            try:
+                old.close()
+            except socket.error:
+                pass
+        threading.Thread(target=self.__reconnectLoop, daemon=True).start()
 
+    def __reconnectLoop(self):
+        attempt = 0
+        while self.state == "reconnecting":
+            try:
+                sock = self.__connect()
+            except socket.error:
+                if self.__closed.wait(self.backoff(attempt)):
+                    return
+                attempt += 1
+                continue
+            with self.__stateLock:
+                if self.state != "reconnecting":
+                    sock.close()
+                    return
+                self.socket_dobot = sock
+                self.state = "restoring"
+            print(f"Reconnected to {self.ip}:{self.port} after {attempt + 1} attempt(s)")
+            # 恢复期间本线程的指令不等待 connected，其他线程的指令仍在等待
+            # Commands from this thread skip the connection wait while restoring, other threads keep waiting
+            self.__local.restoring = True
+            try:
+                self.onReconnect()
+            except Exception as e:
+                print(f"Session restore failed: {e}")
+            finally:
+                self.__local.restoring = False
+            with self.__stateLock:
+                # 恢复过程中连接再次断开时已启动新的重连 A failure during restore already started a new reconnect
+                if self.state != "restoring":
+                    return
+                self.state = "connected"
+                self.__connected.set()
+            return
+
+    def onReconnect(self):
+        """
+        重连成功后、其他线程恢复发送之前调用；子类在此恢复会话状态，随后依次调用 reconnectCallbacks 中的 callback(self)
+        Called after a reconnect, before other threads may send again. Subclasses restore the session state here,
+        then every callback(self) in reconnectCallbacks is called
+        """
+        for callback in list(self.reconnectCallbacks):
+            callback(self)
+
+    def isConnected(self):
+        return self.__connected.is_set()
+
+    @contextlib.contextmanager
+    def timeoutScope(self, timeout):
+        """
+        在 with 块内，本线程发出的指令使用 timeout 作为超时
+        Commands issued by this thread inside the with block use timeout as their timeout
+
+            with dashboard.timeoutScope(0.5):
+                dashboard.MovJ(...)
+        """
+        previous = getattr(self.__local, 'timeout', None)
+        self.__local.timeout = timeout
+        try:
+            yield
         finally:
-            if len(data) == 0:
-                data_str = data
-            else:
-                data_str = str(data, encoding="utf-8")
-            # self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
-            return data_str
+            self.__local.timeout = previous
+
+    def deadline(self, timeout=None):
+        """
+        计算截止时间（time.monotonic），优先级：参数 > timeoutScope > 默认超时
+        Compute a deadline on time.monotonic(), from the argument, else timeoutScope, else the default timeout
+        """
+        if timeout is None:
+            timeout = getattr(self.__local, 'timeout', None)
+        if timeout is None:
+            timeout = self.timeout
+        return time.monotonic() + timeout
+
+    @staticmethod
+    def __text(string):
+        return string if isinstance(string, str) else bytes(string).decode('utf-8', 'replace')
+
+    def __remaining(self, deadline, string, stage):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DobotTimeoutError(f"{self.ip}:{self.port} timed out while {stage}", self.__text(string))
+        return remaining
+
+    def __waitConnected(self, deadline, string):
+        if self.state == "closed":
+            raise DobotConnectionError(f"{self.ip}:{self.port} is closed")
+        if not self.__connected.wait(max(0.0, deadline - time.monotonic())):
+            raise DobotTimeoutError(f"{self.ip}:{self.port} timed out while waiting for the connection",
+                                    self.__text(string))
+
+    def send_data(self, string, deadline=None):
+       # self.log(f"Send to {self.ip}:{self.port}: {string}")
+        # 编码器输出的 bytes 直接发送 Bytes from CommandEncoder are sent as they are
+        data = string if isinstance(string, (bytes, bytearray)) else str.encode(string, 'utf-8')
+        if deadline is None:
+            deadline = self.deadline()
+        remaining = self.__remaining(deadline, string, "sending")
+        sock = self.socket_dobot
+        try:
+            sock.settimeout(remaining)
+            sock.sendall(data)
+        except socket.timeout:
+            # 可能只发出了一部分，连接状态不可知，需要重连 Part of the data may be out, the stream is unusable
+            self.startReconnect()
+            raise DobotTimeoutError(f"{self.ip}:{self.port} timed out while sending", self.__text(string))
+        except (socket.error, AttributeError) as e:
+            self.startReconnect()
+            raise DobotConnectionError(f"{self.ip}:{self.port} send failed: {e}") from e
+
+    def recv_data(self, size, deadline=None):
+        """
+        在截止时间内读取最多 size 字节；重连期间先等待连接。超时抛出 DobotTimeoutError，
+        连接断开抛出 DobotConnectionError，二者都会丢弃该连接并启动后台重连
+        Read up to size bytes before the deadline, waiting for the connection while reconnecting.
+        Raises DobotTimeoutError on expiry and DobotConnectionError when the connection drops,
+        both drop the connection and start a background reconnect
+        """
+        if deadline is None:
+            deadline = self.deadline()
+        if self.socket_dobot == 0:
+            self.__waitConnected(deadline, "")
+        remaining = self.__remaining(deadline, "", "receiving")
+        sock = self.socket_dobot
+        try:
+            sock.settimeout(remaining)
+            data = sock.recv(size)
+        except socket.timeout:
+            # 迟到的返回值会被下一条指令读到，因此丢弃该连接 A late reply would be read by the next command
+            self.startReconnect()
+            raise DobotTimeoutError(f"{self.ip}:{self.port} timed out while receiving")
+        except (socket.error, AttributeError) as e:
+            self.startReconnect()
+            raise DobotConnectionError(f"{self.ip}:{self.port} receive failed: {e}") from e
+        if len(data) == 0:
+            self.startReconnect()
+            raise DobotConnectionError(f"{self.ip}:{self.port} closed the connection")
+        return data
+
+    def wait_reply(self, deadline=None):
+        """
+        Read the return value
+        """
+        data = self.recv_data(1024, deadline)
+        data_str = str(data, encoding="utf-8")
+        # self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
+        return data_str
 
     def close(self):
         """
         Close the port
         """
+        with self.__stateLock:
+            self.state = "closed"
+            self.__closed.set()
+            self.__connected.clear()
         if (self.socket_dobot != 0):
             try:
                 self.socket_dobot.shutdown(socket.SHUT_RDWR)
@@ -183,28 +456,101 @@ class DobotApi:
             except socket.error as e:
                 print(f"Error while closing socket: {e}")
 
-    def sendRecvMsg(self, string):
+    def __acquire(self, deadline, string):
+        restoring = getattr(self.__local, 'restoring', False)
+        while True:
+            if not restoring:
+                self.__waitConnected(deadline, string)
+            if not self.__globalLock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise DobotTimeoutError(f"{self.ip}:{self.port} timed out while waiting for the channel",
+                                        self.__text(string))
+            # 等待通道期间连接可能已断开并进入恢复，此时只有恢复线程可以发送
+            # The link may have dropped while waiting for the channel; while restoring only the restore thread sends
+            if restoring or self.state == "connected":
+                return
+            self.__globalLock.release()
+
+    def sendRecvMsg(self, string, timeout=None):
         """
         send-recv Sync
+        超时（秒）依次取自参数、timeoutScope 和默认值，超时抛出 DobotTimeoutError
+        The timeout in seconds comes from the argument, else timeoutScope, else the default.
+        Raises DobotTimeoutError when it expires
         """
-        with self.__globalLock:
-            self.send_data(string)
-            recvData = self.wait_reply()
-            self.ParseResultId(recvData)
-            return recvData
+        deadline = self.deadline(timeout)
+        self.__acquire(deadline, string)
+        try:
+            self.send_data(self.rewriteCommand(string), deadline)
+            recvData = self.wait_reply(deadline)
+        except DobotTimeoutError as e:
+            if e.command is None:
+                e.command = self.__text(string)
+            raise
+        finally:
+            self.__globalLock.release()
+        self.ParseResultId(recvData)
+        return recvData
+
+    def rewriteCommand(self, string):
+        """
+        发送前（已取得通道）改写指令，默认不改写
+        Rewrite a command right before it is sent (with the channel held), unchanged by default
+        """
+        return string
+
+    def sendRecvMsgBatch(self, strings, timeout=None):
+        """
+        一次写入多条指令，再按 ';' 拆分读取对应数量的返回值；连接断开时返回已收到的部分。
+        timeout 为整批的超时
+        Send several commands with a single write, then read until one reply per command has arrived
+        (replies are split on ';'). Returns the replies received so far if the connection drops.
+        timeout applies to the whole batch
+        """
+        replies = []
+        if not strings:
+            return replies
+        deadline = self.deadline(timeout)
+        self.__acquire(deadline, strings[0])
+        try:
+            # 取得通道后再改写（如 Modbus 索引），与 sendRecvMsg 一致 Rewrite with the channel held, as sendRecvMsg does
+            data = b''.join(s if isinstance(s, (bytes, bytearray)) else self.rewriteCommand(s).encode('utf-8')
+                            for s in strings)
+            self.send_data(data, deadline)
+            pending = ""
+            while len(replies) < len(strings):
+                try:
+                    recvData = self.wait_reply(deadline)
+                except DobotConnectionError:
+                    break
+                pending += recvData
+                *complete, pending = pending.split(';')
+                for reply in complete:
+                    reply = reply.strip() + ';'
+                    self.ParseResultId(reply)
+                    replies.append(reply)
+        finally:
+            self.__globalLock.release()
+        return replies
 
     def __del__(self):
         self.close()
 
     def reConnect(self, ip, port):
+        """
+        阻塞式重连，按指数退避（带抖动）重试直到成功，返回新的 socket
+        Blocking reconnect, retries with exponential backoff and jitter until it succeeds, returns the new socket
+        """
+        attempt = 0
         while True:
             try:
-                socket_dobot = socket.socket()
-                socket_dobot.connect((ip, port))
-                break
-            except Exception:
-                sleep(1)
-        return socket_dobot
+                sock = socket.create_connection((ip, port), timeout=self.connectTimeout)
+            except socket.error:
+                sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            # 与 __connect 一致，收发时再按截止时间设置超时 As in __connect, send/recv set their own timeouts
+            sock.settimeout(None)
+            return sock
 
 # 控制及运动指令接口类
 # Control and motion command interface
@@ -212,8 +558,164 @@ class DobotApi:
 
 class DobotApiDashboard(DobotApi):
 
-    def __init__(self, ip, port, *args):
-        super().__init__(ip, port, *args)
+    def __init__(self, ip, port, *args, timeout=None, connect=True):
+        super().__init__(ip, port, *args, timeout=timeout, connect=connect)
+        self.ikCache = None
+        self._frameTable = None
+        self.encoder = CommandEncoder()
+        self.priorityLane = None
+        self.priorityTimeout = 0.5
+        self.priorityLock = threading.Lock()
+        self.priorityLatency = deque(maxlen=100)
+        self.session = SessionState()
+
+    @property
+    def frameTable(self):
+        """
+        坐标系表，首次使用时创建 Frame table, created on first use
+        """
+        if self._frameTable is None:
+            from dobot_frames import FrameTable
+            self._frameTable = FrameTable()
+        return self._frameTable
+
+    def sendRecvMsg(self, string, timeout=None):
+        # 记录会话设置和 Modbus 连接 Record session settings and Modbus connections
+        recvData = super().sendRecvMsg(string, timeout)
+        if isinstance(string, str):
+            self.session.observe(string, recvData)
+        return recvData
+
+    def sendRecvMsgBatch(self, strings, timeout=None):
+        # 批量发送同样记录会话设置 Batched commands are recorded as well
+        replies = super().sendRecvMsgBatch(strings, timeout)
+        for string, recvData in zip(strings, replies):
+            if isinstance(string, str):
+                self.session.observe(string, recvData)
+        return replies
+
+    def rewriteCommand(self, string):
+        # Modbus 索引按重连后的新索引改写 Modbus indexes are rewritten to the ones after a reconnect
+        if isinstance(string, str):
+            return self.session.translate(string)
+        return string
+
+    def onReconnect(self):
+        """
+        重连后重放 SpeedFactor、User/Tool、速度/加速度、负载和 Modbus 连接，并用 GetCurrentCommandID 同步队列位置
+        After a reconnect, replay SpeedFactor, User/Tool, velocity/acceleration, payload and the Modbus connections,
+        then read the queue position with GetCurrentCommandID
+        """
+        failed = self.session.replay(lambda string: DobotApi.sendRecvMsg(self, string))
+        for string, valueRecv in failed:
+            print(f"Session restore: {string} -> {valueRecv}")
+        super().onReconnect()
+
+    def EnablePriorityLane(self, timeout=0.5):
+        """
+        为 Stop/Pause/EmergencyStop 建立一条独立的 Dashboard 连接，不经过主通道的全局锁，
+        主通道上有指令阻塞时也能在 timeout 内送达。连接失败时返回 False，这些指令继续走主通道
+        Open a dedicated dashboard connection for Stop/Pause/EmergencyStop. It bypasses the global lock of the
+        main channel, so these commands arrive within timeout even when the main channel is blocked.
+        Returns False when the connection fails, the commands then keep using the main channel
+        """
+        self.priorityTimeout = timeout
+        try:
+            lane = socket.create_connection((self.ip, self.port), timeout=timeout)
+            lane.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except socket.error as e:
+            print(f"Priority lane connect failed: {e}")
+            return False
+        self.DisablePriorityLane()
+        self.priorityLane = lane
+        return True
+
+    def DisablePriorityLane(self):
+        """
+        关闭独立连接
+        Close the dedicated connection
+        """
+        lane, self.priorityLane = getattr(self, 'priorityLane', None), None
+        if lane is not None:
+            try:
+                lane.close()
+            except socket.error:
+                pass
+
+    def sendPriority(self, string):
+        """
+        经独立连接发送并等待返回值，超时或出错时重连一次再发；记录往返时间。
+        独立连接不可用或两次都失败时改走主通道，指令不会被丢弃
+        Send over the dedicated connection and wait for the reply. On timeout or error reconnect once and resend.
+        The round trip time is recorded. When the connection is missing or both attempts fail, the command is
+        sent over the main channel instead, so it is never dropped
+        """
+        with self.priorityLock:
+            for attempt in range(2):
+                lane = self.priorityLane
+                if lane is None:
+                    break
+                start = time.perf_counter()
+                try:
+                    lane.sendall(string.encode('utf-8'))
+                    data = lane.recv(1024)
+                    if not data:
+                        raise socket.error("connection closed")
+                except socket.error as e:
+                    # 超时后迟到的返回值会与下一条指令错位，因此必须换一条连接
+                    # A late reply would be read by the next command, so the connection is replaced
+                    print(f"Priority lane error: {e}")
+                    if attempt == 0 and self.EnablePriorityLane(self.priorityTimeout):
+                        continue
+                    self.DisablePriorityLane()
+                    break
+                self.priorityLatency.append(time.perf_counter() - start)
+                recvData = str(data, encoding="utf-8")
+                self.ParseResultId(recvData)
+                return recvData
+        print(f"Priority lane unavailable, sending {string} over the main channel")
+        return self.sendRecvMsg(string)
+
+    def GetPriorityLatency(self):
+        """
+        独立连接最近 100 次往返时间统计（毫秒）
+        Round trip statistics of the last 100 priority commands, in milliseconds
+        """
+        import numpy as np
+        samples = np.array(self.priorityLatency) * 1000.0
+        if len(samples) == 0:
+            return {'count': 0}
+        return {'count': len(samples), 'last': float(samples[-1]), 'mean': float(samples.mean()),
+                'max': float(samples.max())}
+
+    def close(self):
+        self.DisablePriorityLane()
+        super().close()
+
+    def SetFloatPrecision(self, precision):
+        """
+        设置运动指令中浮点数的小数位数（默认 6 位），位数越少报文越短
+        Set the number of decimals of floats in motion commands (default 6), fewer digits give shorter packets
+        """
+        self.encoder.set_precision(precision)
+
+    def EnableIKCache(self, maxsize=1024, pos_step=0.01, rot_step=0.001, joint_step=10.0):
+        """
+        启用逆解缓存。InverseKin 的结果按量化位姿、user/tool 和 JointNear 分支缓存，
+        SetUser/SetTool/SetPayload/User/Tool 调用后相关缓存项自动失效。
+        Enable the inverse kinematics cache. InverseKin results are cached by quantized pose, user/tool and JointNear branch.
+        Affected entries are dropped automatically after SetUser/SetTool/SetPayload/User/Tool.
+        """
+        from dobot_kinematics import IKCache
+        self.ikCache = IKCache(maxsize, pos_step, rot_step, joint_step)
+        return self.ikCache
+
+    def DisableIKCache(self):
+        """
+        关闭逆解缓存
+        Disable the inverse kinematics cache
+        """
+        self.ikCache = None
 
     def EnableRobot(self, load=0.0, centerX=0.0, centerY=0.0, centerZ=0.0, isCheck=-1,):
         """
@@ -299,6 +801,8 @@ class DobotApiDashboard(DobotApi):
        Stop the delivered motion command queue or the RunScript command from running.
         """
         string = "Stop()"
+        if self.priorityLane is not None:
+            return self.sendPriority(string)
         return self.sendRecvMsg(string)
 
     def Pause(self):
@@ -307,6 +811,8 @@ class DobotApiDashboard(DobotApi):
        Pause the delivered motion command queue or the RunScript command from running.
         """
         string = "Pause()"
+        if self.priorityLane is not None:
+            return self.sendPriority(string)
         return self.sendRecvMsg(string)
 
     def Continue(self):
@@ -329,6 +835,8 @@ class DobotApiDashboard(DobotApi):
         mode     int     E-Stop operation mode. 1: press the E-Stop, 0: release the E-Stop.
         """
         string = "EmergencyStop({:d})".format(mode)
+        if self.priorityLane is not None:
+            return self.sendPriority(string)
         return self.sendRecvMsg(string)
 
     def BrakeControl(self, axisID, value):
@@ -390,7 +898,12 @@ class DobotApiDashboard(DobotApi):
         If it is not set, the default global user coordinate system is User coordinate system 0.
         """
         string = "User({:d})".format(index)
-        return self.sendRecvMsg(string)
+        if self.ikCache is not None:
+            self.ikCache.invalidate_frame(user=-1)
+        recvData = self.sendRecvMsg(string)
+        if replyOk(recvData):
+            self.frameTable.select(user=index)
+        return recvData
 
     def SetUser(self, index, table):
         """
@@ -407,7 +920,12 @@ class DobotApiDashboard(DobotApi):
         table    string     user coordinate system after modification (format: {x, y, z, rx, ry, rz}), which is recommended to obtain through "CalcUser" command.
         """
         string = "SetUser({:d},{:s})".format(index, table)
-        return self.sendRecvMsg(string)
+        if self.ikCache is not None:
+            self.ikCache.invalidate_frame(user=index)
+        recvData = self.sendRecvMsg(string)
+        if replyOk(recvData):
+            self.frameTable.set_user(index, table)
+        return recvData
 
     def CalcUser(self, index, matrix_direction, table):
         """
@@ -438,7 +956,12 @@ class DobotApiDashboard(DobotApi):
         If it is not set, the default global tool coordinate system is Tool coordinate system 0.
         """
         string = "Tool({:d})".format(index)
-        return self.sendRecvMsg(string)
+        if self.ikCache is not None:
+            self.ikCache.invalidate_frame(tool=-1)
+        recvData = self.sendRecvMsg(string)
+        if replyOk(recvData):
+            self.frameTable.select(tool=index)
+        return recvData
 
     def SetTool(self, index, table):
         """
@@ -455,7 +978,12 @@ class DobotApiDashboard(DobotApi):
         table    string     tool coordinate system after modification (format: {x, y, z, rx, ry, rz})
         """
         string = "SetTool({:d},{:s})".format(index, table)
-        return self.sendRecvMsg(string)
+        if self.ikCache is not None:
+            self.ikCache.invalidate_frame(tool=index)
+        recvData = self.sendRecvMsg(string)
+        if replyOk(recvData):
+            self.frameTable.set_tool(index, table)
+        return recvData
 
     def CalcTool(self, index, matrix_direction, table):
         """
@@ -525,6 +1053,8 @@ class DobotApiDashboard(DobotApi):
                 if X != 0 or Y != 0 or Z != 0:
                     string = string + ",{:f},{:f},{:f}".format(X, Y, Z)
         string = string + ')'
+        if self.ikCache is not None:
+            self.ikCache.invalidate()
         return self.sendRecvMsg(string)
 
     def AccJ(self, speed):
@@ -864,7 +1394,22 @@ class DobotApiDashboard(DobotApi):
         for ii in params:
             string = string + ','+ii
         string = string + ')'
-        return self.sendRecvMsg(string)
+        # 不使用 JointNear 时控制器按当前关节角就近选解，结果随机械臂位置变化，不能缓存
+        # Without JointNear the controller picks the branch nearest the current joints, which is not cacheable
+        if self.ikCache is None or useJointNear != 1 or JointNear == '':
+            return self.sendRecvMsg(string)
+        key = self.ikCache.make_key((X, Y, Z, Rx, Ry, Rz), user, tool, JointNear)
+        value = self.ikCache.get(key)
+        if value is None:
+            recvData = self.sendRecvMsg(string)
+            # 只缓存 "ErrorID,{关节}" 部分，回复中回显的指令文本按本次指令重新生成
+            # Only cache the "ErrorID,{joints}" part, the echoed command is rebuilt from this call
+            match = re.match(r'\s*(0\s*,\s*\{[^}]*\})', recvData) if replyOk(recvData) else None
+            if match is None:
+                return recvData
+            value = match.group(1)
+            self.ikCache.put(key, value)
+        return "{},{};".format(value, string)
 
     def GetAngle(self):
         """
@@ -1847,31 +2392,11 @@ class DobotApiDashboard(DobotApi):
         v     int     velocity rate of the robot arm when executing this command. Range: (0,100].
         cp     int     continuous path rate. Range: [0,100].
         """
-        string = ""
-        if coordinateMode == 0:
-            string = "MovJ(pose={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1)
-        elif coordinateMode == 1:
-            string = "MovJ(joint={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1)
-        else:
+        if coordinateMode not in (0, 1):
             print("coordinateMode param is wrong")
             return ""
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ','+ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('MovJ', (a1, b1, c1, d1, e1, f1), coordinateMode,
+                                                    user=user, tool=tool, a=a, v=v, cp=cp))
 
     def MovL(self, a1, b1, c1, d1, e1, f1, coordinateMode, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
         """
@@ -1907,39 +2432,11 @@ class DobotApiDashboard(DobotApi):
         cp     int     continuous path rate, incompatible with “r”. Range: [0,100].
         r     int     continuous path radius, incompatible with “cp”. If both "r" and "cp” exist, r takes precedence. Unit: mm.
         """
-        string = ""
-        if coordinateMode == 0:
-            string = "MovL(pose={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1)
-        elif coordinateMode == 1:
-            string = "MovL(joint={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1)
-        else:
-            print("coordinateMode  param  is wrong")
+        if coordinateMode not in (0, 1):
+            print("coordinateMode param is wrong")
             return ""
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1 and speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1 and r != -1:
-            params.append('r={:d}'.format(r))
-        elif r != -1:
-            params.append('r={:d}'.format(r))
-        elif cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('MovL', (a1, b1, c1, d1, e1, f1), coordinateMode,
+                                                    user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
 
     def ServoJ(self, J1, J2, J3, J4, J5, J6, t=-1.0,aheadtime=-1.0, gain=-1.0):
         """
@@ -1959,19 +2456,8 @@ class DobotApiDashboard(DobotApi):
         aheadtime float Optional parameter.Advanced time, similar to the D in PID control. Scalar, no unit, valuerange: [20.0,100.0], default value: 50.
         gain float Optional parameter.Proportional gain of the target position, similar to the P in PID control.Scalar, no unit, value range: [200.0,1000.0], default value: 500.
         """
-        string = ""
-        string = "ServoJ({:f},{:f},{:f},{:f},{:f},{:f}".format(J1, J2, J3, J4, J5, J6)
-        params = []
-        if t != -1:
-            params.append('t={:f}'.format(t))
-        if aheadtime != -1:
-            params.append('aheadtime={:f}'.format(aheadtime))
-        if gain != -1:
-            params.append('gain={:f}'.format(gain))
-        for ii in params:
-            string = string + ','+ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('ServoJ', (J1, J2, J3, J4, J5, J6),
+                                                    t=t, aheadtime=aheadtime, gain=gain))
     def ServoP(self, X, Y, Z, RX, RY, RZ, t=-1.0,aheadtime=-1.0, gain=-1.0):
         """
         参数名 类型 含义 是否必填 参数范围
@@ -1989,19 +2475,8 @@ class DobotApiDashboard(DobotApi):
         aheadtime float Optional parameter.Advanced time, similar to the D in PID control. Scalar, no unit, valuerange: [20.0,100.0], default value: 50.
         gain float Optional parameter.Proportional gain of the target position, similar to the P in PID control.Scalar, no unit, value range: [200.0,1000.0], default value: 500.
         """
-        string = ""
-        string = "ServoP({:f},{:f},{:f},{:f},{:f},{:f}".format(X, Y, Z, RX, RY, RZ)
-        params = []
-        if t != -1:
-            params.append('t={:f}'.format(t))
-        if aheadtime != -1:
-            params.append('aheadtime={:f}'.format(aheadtime))
-        if gain != -1:
-            params.append('gain={:f}'.format(gain))
-        for ii in params:
-            string = string + ','+ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('ServoP', (X, Y, Z, RX, RY, RZ),
+                                                    t=t, aheadtime=aheadtime, gain=gain))
 
     def MovLIO(self, a1, b1, c1, d1, e1, f1, coordinateMode, Mode, Distance, Index, Status, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
         """
@@ -2209,39 +2684,11 @@ class DobotApiDashboard(DobotApi):
         cp     int     continuous path rate, incompatible with “r”. Range: [0,100].
         r     int     continuous path radius, incompatible with “cp”. If both "r" and "cp” exist, r takes precedence. Unit: mm.
         """
-        string = ""
-        if coordinateMode == 0:
-            string = "Arc(pose={{{:f},{:f},{:f},{:f},{:f},{:f}}},pose={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1,  a2, b2, c2, d2, e2, f2)
-        elif coordinateMode == 1:
-            string = "Arc(joint={{{:f},{:f},{:f},{:f},{:f},{:f}}},joint={{{:f},{:f},{:f},{:f},{:f},{:f}}}".format(
-                a1, b1, c1, d1, e1, f1,  a2, b2, c2, d2, e2, f2)
-        else:
-            print("coordinateMode  param  is wrong")
+        if coordinateMode not in (0, 1):
+            print("coordinateMode param is wrong")
             return ""
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1 and speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1 and r != -1:
-            params.append('r={:d}'.format(r))
-        elif r != -1:
-            params.append('r={:d}'.format(r))
-        elif cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('Arc', (a1, b1, c1, d1, e1, f1, a2, b2, c2, d2, e2, f2), coordinateMode,
+                                                    user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
 
     def Circle(self, a1, b1, c1, d1, e1, f1,  a2, b2, c2, d2, e2, f2, coordinateMode, count, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
         """
@@ -2284,39 +2731,11 @@ class DobotApiDashboard(DobotApi):
         cp     int     continuous path rate, incompatible with “r”. Range: [0,100].
         r     int     continuous path radius, incompatible with “cp”. If both "r" and "cp” exist, r takes precedence. Unit: mm.
         """
-        string = ""
-        if coordinateMode == 0:
-            string = "Circle(pose={{{:f},{:f},{:f},{:f},{:f},{:f}}},pose={{{:f},{:f},{:f},{:f},{:f},{:f}}},{:d}".format(
-                a1, b1, c1, d1, e1, f1,  a2, b2, c2, d2, e2, f2, count)
-        elif coordinateMode == 1:
-            string = "Circle(joint={{{:f},{:f},{:f},{:f},{:f},{:f}}},joint={{{:f},{:f},{:f},{:f},{:f},{:f}}},{:d}".format(
-                a1, b1, c1, d1, e1, f1,  a2, b2, c2, d2, e2, f2, count)
-        else:
-            print("coordinateMode  param  is wrong")
+        if coordinateMode not in (0, 1):
+            print("coordinateMode param is wrong")
             return ""
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1 and speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1 and r != -1:
-            params.append('r={:d}'.format(r))
-        elif r != -1:
-            params.append('r={:d}'.format(r))
-        elif cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('Circle', (a1, b1, c1, d1, e1, f1, a2, b2, c2, d2, e2, f2), coordinateMode, extra=(count,),
+                                                    user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
 
     def MoveJog(self, axis_id='', coordtype=-1, user=-1, tool=-1):
         """
@@ -2458,23 +2877,8 @@ class DobotApiDashboard(DobotApi):
         v     int     velocity rate of the robot arm when executing this command. Range: (0,100].
         cp     int     continuous path rate. Range: [0,100].
         """
-        string = "RelMovJTool({:f},{:f},{:f},{:f},{:f},{:f}".format(
-            offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz)
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('RelMovJTool', (offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),
+                                                    user=user, tool=tool, a=a, v=v, cp=cp))
 
     def RelMovLTool(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
         """
@@ -2520,31 +2924,8 @@ class DobotApiDashboard(DobotApi):
         cp     int     continuous path rate, incompatible with “r”. Range: [0,100].
         r     int     continuous path radius, incompatible with “cp”. If both "r" and "cp” exist, r takes precedence. Unit: mm.
         """
-        string = "RelMovLTool({:f},{:f},{:f},{:f},{:f},{:f}".format(
-            offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz)
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1 and speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1 and r != -1:
-            params.append('r={:d}'.format(r))
-        elif r != -1:
-            params.append('r={:d}'.format(r))
-        elif cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('RelMovLTool', (offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),
+                                                    user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
 
     def RelMovJUser(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1, a=-1, v=-1, cp=-1):
         """
@@ -2583,23 +2964,8 @@ class DobotApiDashboard(DobotApi):
         v     int     velocity rate of the robot arm when executing this command. Range: (0,100].
         cp     int     continuous path rate. Range: [0,100].
         """
-        string = "RelMovJUser({:f},{:f},{:f},{:f},{:f},{:f}".format(
-            offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz)
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('RelMovJUser', (offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),
+                                                    user=user, tool=tool, a=a, v=v, cp=cp))
 
     def RelMovLUser(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
         """
@@ -2643,31 +3009,8 @@ class DobotApiDashboard(DobotApi):
         cp     int     continuous path rate, incompatible with “r”. Range: [0,100].
         r     int     continuous path radius, incompatible with “cp”. If both "r" and "cp” exist, r takes precedence. Unit: mm.
         """
-        string = "RelMovLUser({:f},{:f},{:f},{:f},{:f},{:f}".format(
-            offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz)
-        params = []
-        if user != -1:
-            params.append('user={:d}'.format(user))
-        if tool != -1:
-            params.append('tool={:d}'.format(tool))
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1 and speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif speed != -1:
-            params.append('speed={:d}'.format(speed))
-        elif v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1 and r != -1:
-            params.append('r={:d}'.format(r))
-        elif r != -1:
-            params.append('r={:d}'.format(r))
-        elif cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('RelMovLUser', (offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),
+                                                    user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
 
     def RelJointMovJ(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, a=-1, v=-1, cp=-1):
         """
@@ -2702,19 +3045,8 @@ class DobotApiDashboard(DobotApi):
         v     int     velocity rate of the robot arm when executing this command. Range: (0,100].
         cp     int     continuous path rate. Range: [0,100].
         """
-        string = "RelMovJUser({:f},{:f},{:f},{:f},{:f},{:f}".format(
-            offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz)
-        params = []
-        if a != -1:
-            params.append('a={:d}'.format(a))
-        if v != -1:
-            params.append('v={:d}'.format(v))
-        if cp != -1:
-            params.append('cp={:d}'.format(cp))
-        for ii in params:
-            string = string + ',' + ii
-        string = string + ')'
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(self.encoder.encode('RelJointMovJ', (offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),
+                                                    a=a, v=v, cp=cp))
 
     def GetCurrentCommandID(self):
         """
@@ -3032,9 +3364,12 @@ class DobotApiDashboard(DobotApi):
 
 
 class DobotApiFeedBack(DobotApi):
-    def __init__(self, ip, port, *args):
-        super().__init__(ip, port, *args)
+    def __init__(self, ip, port, *args, timeout=None, connect=True):
+        super().__init__(ip, port, *args, timeout=timeout, connect=connect)
         self.__MyType = []
+        self.frameTable = None
+        self.conditions = None
+        self.__readLock = threading.Lock()
         self.last_recv_time = time.perf_counter()
         
 
@@ -3043,18 +3378,38 @@ class DobotApiFeedBack(DobotApi):
         返回机械臂状态
         Return the robot status
         """
-        self.socket_dobot.setblocking(True)  # 设置为阻塞模式
+        # 多个线程（包括 wait_until 的等待者）轮流读取 Threads (including wait_until waiters) read in turn
+        with self.__readLock:
+            return self.__readFrame()
+
+    def wait_until(self, condition, timeout=None):
+        """
+        等待反馈满足条件（如 "DI3 and RobotMode == 5"、"Z < 100"，语法见 dobot_conditions），
+        返回满足条件的那一帧，超时返回 None。等待者之一与其它调用 feedBackData() 的线程轮流读取，读到的每一帧都参与求值
+        Wait until the feedback meets a condition (e.g. "DI3 and RobotMode == 5", "Z < 100", syntax in
+        dobot_conditions) and return the frame that met it, None on timeout. One of the waiters takes turns
+        reading with the other threads calling feedBackData(), every frame read by anyone is evaluated
+        """
+        from dobot_conditions import FrameConditions
+        with self.__readLock:
+            if self.conditions is None:
+                self.conditions = FrameConditions()
+        return self.conditions.wait_until(condition, timeout, self.feedBackData)
+
+    def __readFrame(self):
+        # 整帧共用一个截止时间，超时抛出 DobotTimeoutError 并重连 One deadline per frame, DobotTimeoutError on expiry
+        deadline = self.deadline()
         data = bytes()
         current_recv_time = time.perf_counter() #计时，获取当前时间
-        temp = self.socket_dobot.recv(144000) #缓冲区
+        temp = self.recv_data(144000, deadline) #缓冲区
         if len(temp) > 1440:    
-            temp = self.socket_dobot.recv(144000)
+            temp = self.recv_data(144000, deadline)
         #print("get:",len(temp))
         i=0
         if len(temp) < 1440:
             while i < 5 :
                 #print("重新接收")
-                temp = self.socket_dobot.recv(144000)
+                temp = self.recv_data(144000, deadline)
                 if len(temp) > 1440:
                     break
                 i+=1
@@ -3071,7 +3426,12 @@ class DobotApiFeedBack(DobotApi):
         self.__MyType = None   
 
         if len(data) == 1440:        
-            self.__MyType = np.frombuffer(data, dtype=MyType)
+            import numpy as np
+            self.__MyType = np.frombuffer(data, dtype=_feedbackType())
+            if self.frameTable is not None:
+                self.frameTable.update_from_feedback(self.__MyType)
+            if self.conditions is not None:
+                self.conditions.update(self.__MyType)
 
         return self.__MyType
         
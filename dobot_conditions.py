@@ -0,0 +1,331 @@
+import ast
+import time
+import threading
+import numpy as np
+from dobot_api import MyType, FEEDBACK_TEST_VALUE
+
+# 基于反馈流的条件等待
+# Condition waits on the feedback stream
+#
+# wait_until("DI3 and RobotMode == 5") 把条件编译为比较原子（字段, 运算符, 常数）的析取范式，
+# 每收到一帧反馈求值一次，在条件成立的那一帧唤醒等待者。所有等待者的原子合并为一张表：
+# 每帧按字节偏移一次性提取全部用到的字段，每种运算符一次向量化比较，再用矩阵乘法判断各子句，
+# 等待者再多也不会为每个等待者执行一次 Python 循环。
+# wait_until("DI3 and RobotMode == 5") compiles the condition into the disjunctive normal form of comparison
+# atoms (field, operator, constant). It is evaluated once per feedback frame and wakes the waiter on the frame
+# where it becomes true. The atoms of all waiters share one table: every frame, all fields in use are gathered
+# by byte offset at once, each operator is one vectorized comparison, and a matrix product decides every clause,
+# so many waiters never mean one Python loop per waiter.
+#
+# 条件语法 Condition syntax:
+#   RobotMode == 5 and CurrentCommandId >= 12      字段比较 Field comparisons, and/or/not, a < X < b
+#   ToolVectorActual[2] < 100, QActual[0] > 30     数组字段元素 Elements of array fields
+#   X Y Z Rx Ry Rz, J1 .. J6                       ToolVectorActual / QActual 的别名 Aliases
+#   DI3, not DO1, DI5 == 0                         DigitalInputs/DigitalOutputs 的位（DI_n 为第 n-1 位）Bits
+#   EnableStatus                                   单独的字段表示 != 0 A bare field means != 0
+
+ALIASES = {name: ('ToolVectorActual', i) for i, name in enumerate(['X', 'Y', 'Z', 'Rx', 'Ry', 'Rz'])}
+ALIASES.update({'J{}'.format(i + 1): ('QActual', i) for i in range(6)})
+BITS = {'DI': 'DigitalInputs', 'DO': 'DigitalOutputs'}
+
+OPERATORS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+NEGATE = {'==': '!=', '!=': '==', '<': '>=', '<=': '>', '>': '<=', '>=': '<'}
+FLIP = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+COMPARE = {'==': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal, '>': np.greater,
+           '>=': np.greater_equal}
+
+MAX_CLAUSES = 64
+
+
+def _path(node):
+    """
+    把名称或下标节点解析为 (字段, 元素下标, 位)，元素下标和位不适用时为 -1
+    Resolve a name or subscript node to (field, element index, bit), -1 where not applicable
+    """
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in ALIASES:
+            return ALIASES[name] + (-1,)
+        if name[:2] in BITS and name[2:].isdigit() and 1 <= int(name[2:]) <= 64:
+            return BITS[name[:2]], -1, int(name[2:]) - 1
+        if name in MyType.names and MyType.fields[name][0].shape == ():
+            return name, -1, -1
+    elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+        name = node.value.id
+        index = node.slice.value if isinstance(node.slice, ast.Constant) else None
+        if name in MyType.names and isinstance(index, int):
+            shape = MyType.fields[name][0].shape
+            if len(shape) == 1 and 0 <= index < shape[0]:
+                return name, index, -1
+    raise ValueError("unknown feedback field: {}".format(ast.unparse(node)))
+
+
+def _constant(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_constant(node.operand)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return float(node.value)
+    raise ValueError("expected a number: {}".format(ast.unparse(node)))
+
+
+def _compare(left, op, right):
+    try:
+        return _path(left), op, _constant(right)
+    except ValueError:
+        return _path(right), FLIP[op], _constant(left)
+
+
+def _dnf(node, negate=False):
+    """
+    把表达式转换为析取范式：子句列表，每个子句是原子 (路径, 运算符, 常数) 的列表
+    Convert an expression to disjunctive normal form: a list of clauses, each a list of atoms
+    (path, operator, constant)
+    """
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _dnf(node.operand, not negate)
+    if isinstance(node, ast.BoolOp):
+        parts = [_dnf(value, negate) for value in node.values]
+        # not (a and b) == not a or not b
+        if isinstance(node.op, ast.Or) != negate:
+            return [clause for part in parts for clause in part]
+        clauses = [[]]
+        for part in parts:
+            clauses = [clause + other for clause in clauses for other in part]
+            if len(clauses) > MAX_CLAUSES:
+                raise ValueError("condition too complex")
+        return clauses
+    if isinstance(node, ast.Compare):
+        atoms = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            if type(op) not in OPERATORS:
+                raise ValueError("unsupported operator: {}".format(type(op).__name__))
+            atoms.append(_compare(left, OPERATORS[type(op)], right))
+            left = right
+        if not negate:
+            return [atoms]
+        return [[(path, NEGATE[op], value)] for path, op, value in atoms]
+    return [[(_path(node), '==' if negate else '!=', 0.0)]]
+
+
+def compile_condition(text):
+    """
+    编译条件字符串，返回析取范式的子句列表
+    Compile a condition string, returns the clauses of its disjunctive normal form
+    """
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        raise ValueError("invalid condition {!r}: {}".format(text, e.msg)) from e
+    return _dnf(tree.body)
+
+
+class Waiter:
+    """
+    一个等待中的条件；成立时 frame 为满足条件的那一帧（形状 (1,) 的 MyType 数组），stamp 为其主机时间
+    One waiting condition. Once true, frame is the frame that satisfied it ((1,) MyType array) and stamp its
+    host time
+    """
+
+    def __init__(self, condition, clauses):
+        self.condition = condition
+        self.clauses = clauses
+        self.since = time.monotonic()   # 更早的帧不参与求值 Earlier frames are not evaluated
+        self.event = threading.Event()
+        self.frame = None
+        self.stamp = None
+
+    def __repr__(self):
+        return "Waiter({!r}, {})".format(self.condition, 'done' if self.event.is_set() else 'waiting')
+
+
+class FrameConditions:
+    """
+    一组条件等待者，update() 每收到一帧（或一批帧）调用一次
+    A set of condition waiters, update() is called for every frame (or batch of frames) received
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self._waiters = []
+        self._tables = None             # 编译后的原子表，等待者变化时重建 Compiled tables, rebuilt on changes
+        self._lock = threading.Lock()
+        self._pump = threading.Lock()
+
+    def add(self, condition):
+        waiter = Waiter(condition, compile_condition(condition))
+        with self._lock:
+            self._waiters.append(waiter)
+            self._tables = None
+        return waiter
+
+    def remove(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._tables = None
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def _build(self, waiters):
+        """
+        合并所有等待者的原子：字段按类型分组的字节偏移、各原子的路径/运算符/常数、子句-原子矩阵
+        Merge the atoms of every waiter: byte offsets of the fields grouped by type, the path/operator/constant
+        of every atom, and the clause-atom matrix
+        """
+        paths = {}
+        atoms = {}
+        clauseAtoms = []
+        owners = []
+        for number, waiter in enumerate(waiters):
+            for clause in waiter.clauses:
+                row = set()
+                for path, op, value in clause:
+                    column = paths.setdefault(path, len(paths))
+                    row.add(atoms.setdefault((column, op, value), len(atoms)))
+                clauseAtoms.append(sorted(row))
+                owners.append(number)
+        groups = {}
+        for (field, index, bit), column in paths.items():
+            dtype, offset = MyType.fields[field][:2]
+            base = dtype.base if dtype.shape else dtype
+            groups.setdefault(base.str, ([], [], []))
+            group = groups[base.str]
+            group[0].append(column)
+            group[1].append(offset + max(index, 0) * base.itemsize)
+            group[2].append(bit)
+        groups = [(np.dtype(dtype), np.array(columns), np.array(offsets), np.array(bits))
+                  for dtype, (columns, offsets, bits) in groups.items()]
+        keys = list(atoms)
+        matrix = np.zeros((len(clauseAtoms), len(keys)), dtype=np.float32)
+        for row, columns in enumerate(clauseAtoms):
+            matrix[row, columns] = 1
+        ops = {op: np.array([i for i, key in enumerate(keys) if key[1] == op]) for op in COMPARE}
+        return {
+            'waiters': waiters,
+            'paths': len(paths),
+            'groups': groups,
+            'atomPath': np.array([key[0] for key in keys], dtype=np.intp),
+            'atomValue': np.array([key[2] for key in keys], dtype=np.float64),
+            'ops': {op: atoms for op, atoms in ops.items() if atoms.size},
+            'matrix': matrix,
+            'sizes': matrix.sum(axis=1),
+            'starts': np.flatnonzero(np.r_[True, np.diff(owners) != 0]),
+            'since': np.array([waiter.since for waiter in waiters]),
+        }
+
+    def evaluate(self, frames, tables):
+        """
+        返回 (帧数, 等待者数) 的布尔矩阵 Return an (frames, waiters) bool matrix
+        """
+        raw = np.ascontiguousarray(frames).view(np.uint8).reshape(len(frames), MyType.itemsize)
+        values = np.empty((len(frames), tables['paths']), dtype=np.float64)
+        for dtype, columns, offsets, bits in tables['groups']:
+            gathered = raw[:, offsets[:, None] + np.arange(dtype.itemsize)]
+            fields = np.ascontiguousarray(gathered).view(dtype).reshape(len(frames), len(columns))
+            isBit = bits >= 0
+            if isBit.any():
+                # 位只出现在 uint64 掩码字段 Bits only come from the uint64 mask fields
+                fields = fields.copy()
+                fields[:, isBit] = (fields[:, isBit] >> bits[isBit].astype(np.uint64)) & np.uint64(1)
+            values[:, columns] = fields
+        atoms = np.empty((len(frames), len(tables['atomPath'])), dtype=np.float32)
+        for op, columns in tables['ops'].items():
+            atoms[:, columns] = COMPARE[op](values[:, tables['atomPath'][columns]], tables['atomValue'][columns])
+        clauses = atoms @ tables['matrix'].T == tables['sizes']
+        return np.logical_or.reduceat(clauses, tables['starts'], axis=1)
+
+    def update(self, frames, stamps=None):
+        """
+        用一帧或多帧反馈（MyType 数组，按时间先后）求值全部条件，唤醒成立的等待者并返回它们。
+        TestValue 不正确的帧以及早于等待者的帧被忽略
+        Evaluate every condition on one or more feedback frames (MyType array, oldest first), wake the waiters that
+        became true and return them. Frames with a wrong TestValue, and frames older than a waiter, are ignored
+        """
+        if frames is None or len(frames) == 0:
+            return []
+        count = len(frames)
+        stamps = np.broadcast_to(time.monotonic() if stamps is None else np.asarray(stamps, dtype=np.float64),
+                                 (count,))
+        valid = frames['TestValue'] == FEEDBACK_TEST_VALUE
+        if not valid.all():
+            frames, stamps = frames[valid], stamps[valid]
+        self.frames += len(frames)
+        with self._lock:
+            if not self._waiters or len(frames) == 0:
+                return []
+            if self._tables is None:
+                self._tables = self._build(list(self._waiters))
+            tables = self._tables
+        truth = self.evaluate(frames, tables) & (stamps[:, None] >= tables['since'])
+        hits = np.flatnonzero(truth.any(axis=0))
+        if not hits.size:
+            return []
+        first = truth[:, hits].argmax(axis=0)
+        woken = []
+        for number, row in zip(hits, first):
+            waiter = tables['waiters'][number]
+            if waiter.event.is_set():
+                continue
+            waiter.frame = frames[row:row + 1].copy()
+            waiter.stamp = float(stamps[row])
+            waiter.event.set()
+            woken.append(waiter)
+        for waiter in woken:
+            self.remove(waiter)
+        return woken
+
+    def wait_until(self, condition, timeout=None, pump=None):
+        """
+        等待条件成立，返回满足条件的那一帧，超时返回 None。条件从调用之后收到的帧开始求值。
+        pump 为读取一帧并调用 update() 的函数：没有其它线程读取反馈时，等待者之一轮流调用它
+        Wait for the condition and return the frame that satisfied it, None on timeout. The condition is evaluated
+        from the frames received after the call. pump reads one frame and calls update(): when no other thread
+        reads the feedback, one of the waiters calls it in turn
+        """
+        waiter = self.add(condition)
+        end = None if timeout is None else time.monotonic() + timeout
+        try:
+            while not waiter.event.is_set():
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                if pump is not None and self._pump.acquire(blocking=False):
+                    try:
+                        if not waiter.event.is_set():
+                            pump()
+                    finally:
+                        self._pump.release()
+                else:
+                    waiter.event.wait(0.05 if remaining is None else min(remaining, 0.05))
+            return waiter.frame
+        finally:
+            self.remove(waiter)
+
+
+# 测试代码
+if __name__ == "__main__":
+    print(compile_condition("DI3 and RobotMode == 5"))
+    print(compile_condition("not (Z < 100 or 0 < J1 <= 30)"))
+
+    frames = np.zeros(5, dtype=MyType)
+    frames['TestValue'] = FEEDBACK_TEST_VALUE
+    frames['RobotMode'] = [5, 5, 7, 5, 5]
+    frames['DigitalInputs'] = [0, 0, 0b100, 0b100, 0b100]
+    frames['ToolVectorActual'][:, 2] = [300, 200, 150, 120, 90]
+    conditions = FrameConditions()
+    waiters = [conditions.add(text) for text in ("DI3 and RobotMode == 5", "Z < 100", "RobotMode != 5",
+                                                 "DI4", "DO1 or Z <= 200")]
+    woken = conditions.update(frames, stamps=time.monotonic() + np.arange(5) * 0.008)
+    for waiter in waiters:
+        print(waiter, None if waiter.frame is None else waiter.frame['ToolVectorActual'][0][2])
+    print("pending", len(conditions))
+
+    many = FrameConditions()
+    for i in range(1000):
+        many.add("RobotMode == 5 and Z < {}".format(i))
+    start = time.perf_counter()
+    for _ in range(100):
+        many.update(frames[:1])
+    print("1000 waiters: {:.3f} ms/frame".format((time.perf_counter() - start) * 10))
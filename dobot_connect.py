@@ -0,0 +1,227 @@
+import errno
+import socket
+import selectors
+import time
+from dobot_api import (FEEDBACK_TEST_BYTES, DobotApiDashboard, DobotApiFeedBack, DobotTimeoutError,
+                       DobotConnectionError)
+
+# 并行建立连接
+# Parallel connection setup
+#
+# connectRobot 同时打开 Dashboard 和反馈端口：每个端口按 happy eyeballs 方式错开发起多次短超时的连接尝试，
+# 在 getaddrinfo 返回的地址间轮换，最先成功的连接胜出，其余关闭；随后等待第一帧有效反馈，返回可直接使用的会话。
+# 不可达的 IP 在 timeout 内以 DobotTimeoutError 失败，而不是一直阻塞。
+# connectRobot opens the dashboard and feedback ports at the same time. Each port gets several short connection
+# attempts, staggered happy-eyeballs style and rotating over the getaddrinfo addresses. The first one to succeed
+# wins and the others are closed. It then waits for the first valid feedback frame and returns a ready session.
+# An unreachable IP fails with DobotTimeoutError within timeout instead of blocking.
+
+class RobotSession:
+    """
+    connectRobot 的结果：dashboard、feedback（未请求时为 None）、第一帧反馈 frame 和各阶段耗时 timings（秒）
+    Result of connectRobot: dashboard, feedback (None when not requested), the first feedback frame and the
+    time of each stage in seconds
+    """
+
+    def __init__(self, dashboard, feedback, frame, timings):
+        self.dashboard = dashboard
+        self.feedback = feedback
+        self.frame = frame
+        self.timings = timings
+
+    def close(self):
+        for client in (self.dashboard, self.feedback):
+            if client is not None:
+                client.close()
+
+
+def _addresses(ip, port):
+    try:
+        infos = socket.getaddrinfo(ip, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise DobotConnectionError(f"cannot resolve {ip}: {e}") from e
+    # IPv6/IPv4 交替排列 Interleave IPv6 and IPv4
+    v6 = [info for info in infos if info[0] == socket.AF_INET6]
+    v4 = [info for info in infos if info[0] != socket.AF_INET6]
+    ordered = []
+    for i in range(max(len(v6), len(v4))):
+        ordered.extend(group[i] for group in (v6, v4) if i < len(group))
+    return ordered
+
+
+def openConnections(ip, ports, timeout=3.0, attemptTimeout=1.0, stagger=0.25):
+    """
+    并行打开多个端口，返回 {端口: socket}。每个端口每隔 stagger 秒发起一次新尝试（单次最长 attemptTimeout），
+    最先成功者胜出；timeout 内仍有端口未连上时关闭全部连接并抛出 DobotTimeoutError
+    Open several ports in parallel and return {port: socket}. Every port starts a new attempt each stagger seconds
+    (each attempt lasting at most attemptTimeout) and the first success wins. If a port is still not connected
+    after timeout, every connection is closed and DobotTimeoutError is raised
+    """
+    deadline = time.monotonic() + timeout
+    addresses = {port: _addresses(ip, port) for port in ports}
+    tried = dict.fromkeys(ports, 0)
+    nextStart = dict.fromkeys(ports, 0.0)
+    errors = {port: None for port in ports}
+    attempts = {}                   # socket -> (端口, 截止时间) socket -> (port, attempt deadline)
+    opened = {}
+    selector = selectors.DefaultSelector()
+    try:
+        while len(opened) < len(ports):
+            now = time.monotonic()
+            if now >= deadline:
+                missing = [port for port in ports if port not in opened]
+                raise DobotTimeoutError(f"{ip}:{missing} not reachable within {timeout:.1f}s "
+                                        f"(last errors: {[errors[port] for port in missing]})")
+            for port in ports:
+                if port in opened or now < nextStart[port]:
+                    continue
+                family, kind, proto, _, address = addresses[port][tried[port] % len(addresses[port])]
+                tried[port] += 1
+                nextStart[port] = now + stagger
+                sock = socket.socket(family, kind, proto)
+                sock.setblocking(False)
+                sock.connect_ex(address)
+                attempts[sock] = (port, min(deadline, now + attemptTimeout))
+                selector.register(sock, selectors.EVENT_WRITE)
+            for sock, (port, end) in list(attempts.items()):
+                if now >= end:
+                    errors[port] = "timed out"
+                    selector.unregister(sock)
+                    sock.close()
+                    del attempts[sock]
+            wake = min([deadline] + [end for _, end in attempts.values()] +
+                       [nextStart[port] for port in ports if port not in opened])
+            for key, _ in selector.select(max(0.0, wake - time.monotonic())):
+                sock = key.fileobj
+                entry = attempts.pop(sock, None)
+                if entry is None:
+                    # 同一次 select 中先就绪的尝试已胜出并关闭了本连接 A sibling in this select already won and closed it
+                    continue
+                port = entry[0]
+                selector.unregister(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error != 0 or port in opened:
+                    errors[port] = errno.errorcode.get(error, error) if error else "duplicate"
+                    sock.close()
+                    continue
+                sock.setblocking(True)
+                opened[port] = sock
+                # 该端口其余尝试作废 Drop the other attempts of this port
+                for other, (otherPort, _) in list(attempts.items()):
+                    if otherPort == port:
+                        selector.unregister(other)
+                        other.close()
+                        del attempts[other]
+        return opened
+    except BaseException:
+        for sock in opened.values():
+            sock.close()
+        raise
+    finally:
+        for sock in attempts:
+            sock.close()
+        selector.close()
+
+
+def waitFirstFrame(sock, deadline):
+    """
+    读取第一帧有效反馈（TestValue 正确），必要时按 TestValue 重新对齐，返回时数据流位于帧边界
+    Read the first valid feedback frame (correct TestValue), realigning on TestValue when needed.
+    On return the stream is at a frame boundary
+    """
+    import numpy as np
+    from dobot_api import MyType
+    size = MyType.itemsize
+    offset = MyType.fields['TestValue'][1]
+    buffer = bytearray()
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DobotTimeoutError("no valid feedback frame before the deadline")
+            sock.settimeout(remaining)
+            data = sock.recv(size - len(buffer))
+            if not data:
+                raise DobotConnectionError("feedback connection closed")
+            buffer += data
+            if len(buffer) < size:
+                continue
+            if buffer[offset:offset + 8] == FEEDBACK_TEST_BYTES:
+                return np.frombuffer(bytes(buffer), dtype=MyType)
+            found = buffer.find(FEEDBACK_TEST_BYTES)
+            # 丢弃到下一帧起点为止的字节 Drop the bytes up to the start of the next frame
+            del buffer[:(found - offset) % size if found >= 0 else size - 7]
+    except socket.timeout:
+        raise DobotTimeoutError("no valid feedback frame before the deadline")
+    finally:
+        sock.settimeout(None)
+
+
+def connectRobot(ip, dashboard_port=29999, feed_port=30004, timeout=3.0, attemptTimeout=1.0, stagger=0.25,
+                 text_log=None):
+    """
+    并行连接 Dashboard 与反馈端口并等待第一帧有效反馈，返回 RobotSession；feed_port=None 时只连接 Dashboard。
+    timeout 为整个过程的上限，超时抛出 DobotTimeoutError
+    Connect the dashboard and feedback ports in parallel and wait for the first valid feedback frame, returns a
+    RobotSession. With feed_port=None only the dashboard is connected. timeout bounds the whole process,
+    DobotTimeoutError is raised when it expires
+
+        session = connectRobot("192.168.5.1")
+        session.dashboard.EnableRobot()
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    ports = [dashboard_port] if feed_port is None else [dashboard_port, feed_port]
+    sockets = openConnections(ip, ports, timeout, attemptTimeout, stagger)
+    timings = {'connect': time.monotonic() - start}
+    frame = None
+    try:
+        if feed_port is not None:
+            frame = waitFirstFrame(sockets[feed_port], deadline)
+            timings['first_frame'] = time.monotonic() - start
+    except BaseException:
+        for sock in sockets.values():
+            sock.close()
+        raise
+    args = () if text_log is None else (text_log,)
+    dashboard = DobotApiDashboard(ip, dashboard_port, *args, connect=False)
+    dashboard.adopt(sockets[dashboard_port])
+    feedback = None
+    if feed_port is not None:
+        feedback = DobotApiFeedBack(ip, feed_port, *args, connect=False)
+        feedback.adopt(sockets[feed_port])
+    timings['total'] = time.monotonic() - start
+    return RobotSession(dashboard, feedback, frame, timings)
+
+
+# 测试代码
+if __name__ == "__main__":
+    # 同一端口的两次尝试在同一次 select 中就绪：只保留一个连接，不抛出 KeyError
+    # Two attempts on one port ready in the same select: one connection is kept, no KeyError
+    class PairedSelector(selectors.DefaultSelector):
+        def select(self, timeout=None):
+            if len(self.get_map()) < 2:
+                time.sleep(timeout or 0.0)
+                return []
+            time.sleep(0.05)
+            return super().select(timeout)
+
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    defaultSelector, selectors.DefaultSelector = selectors.DefaultSelector, PairedSelector
+    try:
+        sockets = openConnections("127.0.0.1", [port], timeout=2.0, stagger=0.01)
+    finally:
+        selectors.DefaultSelector = defaultSelector
+    print("same select:", list(sockets) == [port])
+    sockets[port].close()
+    server.close()
+
+    try:
+        session = connectRobot("192.168.5.1", timeout=2.0)
+    except (DobotTimeoutError, DobotConnectionError) as e:
+        print("connect failed:", e)
+    else:
+        print("timings:", session.timings, "RobotMode:", session.frame['RobotMode'][0])
+        print(session.dashboard.RobotMode())
+        session.close()
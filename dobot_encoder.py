@@ -0,0 +1,106 @@
+# 表驱动指令编码器
+# Table-driven command encoder
+#
+# 每条指令按（坐标模式, 实际给出的可选参数）编译一次完整的字节模板，编码时只做一次 % 格式化，得到的 bytes
+# 直接交给 socket 发送。模板集中了指令格式和参数校验；Python 中格式化浮点数本身就要生成新对象，
+# 因此这里不追求零分配，每条指令仍产生一个 bytes，只是省去了逐段拼接的中间字符串。
+# Each command gets one full byte template per (coordinate mode, optional parameters actually given), compiled on
+# first use. Encoding is a single % format and the resulting bytes go straight to the socket. The templates keep
+# the command formats and the parameter checks in one place. Formatting floats in Python always creates new
+# objects, so this is not zero-allocation: every command still produces one bytes object, only the intermediate
+# strings of piecewise concatenation are gone.
+
+# 指令表：(目标点个数, 末尾整数参数个数, 可选参数)。目标点个数为 0 表示 6 个不带 pose=/joint= 的数值
+# Command table: (target points, trailing integer arguments, optional parameters).
+# 0 target points means six bare values without pose=/joint=
+COMMANDS = {
+    'MovJ': (1, 0, ('user', 'tool', 'a', 'v', 'cp')),
+    'MovL': (1, 0, ('user', 'tool', 'a', 'speed', 'v', 'r', 'cp')),
+    'Arc': (2, 0, ('user', 'tool', 'a', 'speed', 'v', 'r', 'cp')),
+    'Circle': (2, 1, ('user', 'tool', 'a', 'speed', 'v', 'r', 'cp')),
+    'ServoJ': (0, 0, ('t', 'aheadtime', 'gain')),
+    'ServoP': (0, 0, ('t', 'aheadtime', 'gain')),
+    'RelMovJTool': (0, 0, ('user', 'tool', 'a', 'v', 'cp')),
+    'RelMovLTool': (0, 0, ('user', 'tool', 'a', 'speed', 'v', 'r', 'cp')),
+    'RelMovJUser': (0, 0, ('user', 'tool', 'a', 'v', 'cp')),
+    'RelMovLUser': (0, 0, ('user', 'tool', 'a', 'speed', 'v', 'r', 'cp')),
+    'RelJointMovJ': (0, 0, ('a', 'v', 'cp')),
+}
+
+# 互斥参数：同时给出时只发送前者 Mutually exclusive parameters: only the first one is sent when both are given
+PRECEDENCE = {'v': 'speed', 'cp': 'r'}
+
+FLOAT_OPTIONS = ('t', 'aheadtime', 'gain')
+
+
+class CommandEncoder:
+    """
+    运动指令编码器，precision 为浮点数小数位数（默认 6 位，与 "{:f}" 相同）
+    Motion command encoder, precision is the number of decimals of floats (default 6, the same as "{:f}")
+    """
+
+    def __init__(self, precision=6):
+        self.set_precision(precision)
+
+    def set_precision(self, precision):
+        """
+        设置浮点数小数位数并清空已编译的模板，位数越少报文越短
+        Set the number of decimals and drop the compiled templates, fewer digits give shorter packets
+        """
+        if not 0 <= int(precision) <= 10:
+            raise ValueError("precision must be in [0, 10]")
+        self.precision = int(precision)
+        self._templates = {}
+
+    def _compile(self, name, coordinateMode, present):
+        """
+        编译一条指令在给定坐标模式和可选参数组合下的完整模板
+        Compile the full template of a command for one coordinate mode and set of optional parameters
+        """
+        points, extra, _ = COMMANDS[name]
+        number = '%.{:d}f'.format(self.precision)
+        values = ','.join([number] * 6)
+        if points == 0:
+            if coordinateMode is not None:
+                raise ValueError("{:s} does not take a coordinateMode".format(name))
+            body = values
+        elif coordinateMode in (0, 1):
+            body = ','.join(['{:s}={{{:s}}}'.format('joint' if coordinateMode == 1 else 'pose', values)] * points)
+        else:
+            raise ValueError("coordinateMode must be 0 or 1")
+        body += ',%d' * extra
+        for key in present:
+            body += ',{:s}={:s}'.format(key, number if key in FLOAT_OPTIONS else '%d')
+        template = '{:s}({:s})'.format(name, body).encode()
+        self._templates[(name, coordinateMode, present)] = template
+        return template
+
+    def encode(self, name, values, coordinateMode=None, extra=(), **options):
+        """
+        编码一条指令，values 为 6 个（或两个目标点的 12 个）数值，值为 -1 的可选参数不发送。
+        返回 bytes
+        Encode one command. values holds 6 numbers (12 for two target points), optional parameters equal to -1
+        are skipped. Returns bytes
+        """
+        spec = COMMANDS.get(name)
+        if spec is None:
+            raise ValueError("unknown command {:s}".format(name))
+        args = [*values, *extra]
+        present = []
+        for key in spec[2]:
+            value = options.get(key, -1)
+            if value != -1 and options.get(PRECEDENCE.get(key), -1) == -1:
+                present.append(key)
+                args.append(value)
+        present = tuple(present)
+        template = self._templates.get((name, coordinateMode, present))
+        if template is None:
+            template = self._compile(name, coordinateMode, present)
+        return template % tuple(args)
+
+    def encode_str(self, name, values, coordinateMode=None, extra=(), **options):
+        """
+        编码为字符串（用于日志、批量程序等需要保存结果的场合）
+        Encode into a str, for logging, batch programs and other places that keep the result
+        """
+        return self.encode(name, values, coordinateMode, extra, **options).decode()
@@ -0,0 +1,564 @@
+import socket
+import selectors
+import threading
+import time
+import random
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dobot_api import MyType, takeLatestFrame, DobotApiDashboard, DobotTimeoutError, DobotConnectionError
+
+# 多机器人连接复用
+# Multi-robot connection multiplexing
+#
+# Fleet 用一个 selectors I/O 线程承载所有机器人的 Dashboard(29999) 和实时反馈(30004) 非阻塞连接。
+# 每台机器人得到一个 FleetRobot 句柄，它就是一个 DobotApiDashboard，全部指令方法照常使用，
+# 但指令经 Fleet 排队发送，返回值按 ';' 拆分后依次交给对应的 Future，各机器人之间互不阻塞。
+# 反馈帧写入一个合并的 MyType 数组（每台机器人一行），可按字段一次取出所有机器人的数据。
+# Fleet serves the non-blocking dashboard (29999) and realtime feedback (30004) connections of every robot from
+# a single selectors I/O thread. Each robot gets a FleetRobot handle, which is a DobotApiDashboard so every
+# command method works as usual, but commands are queued through the Fleet and the replies, split on ';', complete
+# the matching Futures in order. Robots never block each other. Feedback frames are written to one merged MyType
+# array (one row per robot), so a field can be read for every robot at once.
+
+# 等待 Future 时在截止时间之外多等的秒数，正常情况下由 I/O 线程先让超时的指令失败
+# Extra seconds to wait on a Future past its deadline; normally the I/O thread fails expired commands first
+RESULT_GRACE = 1.0
+
+
+def _result(future, deadline, string):
+    """
+    等待 Future 至截止时间（加 RESULT_GRACE），I/O 线程无响应时也不会无限等待
+    Wait for a Future until its deadline (plus RESULT_GRACE), so a stalled I/O thread cannot block forever
+    """
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()) + RESULT_GRACE)
+    except FutureTimeout:
+        future.cancel()
+        text = string if isinstance(string, str) else bytes(string).decode('utf-8', 'replace')
+        raise DobotTimeoutError("fleet I/O thread did not answer before the deadline", text) from None
+
+
+class _Link:
+    """
+    一条非阻塞连接及其收发缓冲区
+    One non-blocking connection and its buffers
+    """
+
+    def __init__(self, robot, kind, address, port):
+        self.robot = robot
+        self.kind = kind            # 'dashboard' 或 'feedback'
+        self.address = address      # add() 中已解析的 IP Address resolved in add()
+        self.port = port
+        self.sock = None
+        self.generation = 0         # 每次连接成功加一，用于识别过期的恢复线程 Bumped per connect, spots stale restores
+        self.state = "down"         # down -> connecting -> (restoring ->) connected
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.attempt = 0
+        self.retryAt = 0.0
+        self.everConnected = False
+        self.pending = deque()      # 未发送 [string, future, deadline, restore]
+        self.waiting = deque()      # 已发送待返回 (future, deadline)
+
+
+class FleetRobot(DobotApiDashboard):
+    """
+    Fleet 中一台机器人的句柄，指令方法与 DobotApiDashboard 相同
+    Handle of one robot in a Fleet, with the same command methods as DobotApiDashboard
+    """
+
+    def __init__(self, fleet, name, ip, port=29999, timeout=None):
+        super().__init__(ip, port, timeout=timeout, connect=False)
+        self.fleet = fleet
+        self.name = name
+        self.text_log = False
+
+    def sendRecvMsg(self, string, timeout=None):
+        """
+        经 Fleet 发送并等待返回值，超时抛出 DobotTimeoutError，连接断开抛出 DobotConnectionError
+        Send through the Fleet and wait for the reply. Raises DobotTimeoutError on timeout and
+        DobotConnectionError when the connection drops
+        """
+        deadline = self.deadline(timeout)
+        recvData = _result(self.fleet.submit(self.name, string, deadline), deadline, string)
+        self.ParseResultId(recvData)
+        if isinstance(string, str):
+            self.session.observe(string, recvData)
+        return recvData
+
+    def sendRecvMsgBatch(self, strings, timeout=None):
+        """
+        全部指令一次入队，返回已收到的返回值；连接断开时返回已收到的部分
+        Queue every command at once and return the replies, or the replies received so far if the connection drops
+        """
+        deadline = self.deadline(timeout)
+        futures = [self.fleet.submit(self.name, string, deadline) for string in strings]
+        replies = []
+        for string, future in zip(strings, futures):
+            try:
+                reply = _result(future, deadline, string)
+            except DobotConnectionError:
+                break
+            self.ParseResultId(reply)
+            if isinstance(string, str):
+                self.session.observe(string, reply)
+            replies.append(reply)
+        return replies
+
+    def submit(self, string, timeout=None):
+        """
+        异步发送，返回 concurrent.futures.Future
+        Send without waiting, returns a concurrent.futures.Future
+        """
+        return self.fleet.submit(self.name, string, self.deadline(timeout))
+
+    def onReconnect(self):
+        # 在 Fleet 的恢复线程中调用，恢复指令排在其他指令之前 Called from the Fleet restore thread, ahead of other commands
+        def send(string):
+            deadline = self.deadline()
+            return _result(self.fleet.submit(self.name, string, deadline, restore=True), deadline, string)
+
+        failed = self.session.replay(send)
+        for string, valueRecv in failed:
+            print(f"Session restore: {string} -> {valueRecv}")
+        for callback in list(self.reconnectCallbacks):
+            callback(self)
+
+    def isConnected(self):
+        return self.fleet.isConnected(self.name)
+
+    def EnablePriorityLane(self, timeout=0.5):
+        # Fleet 中指令互不阻塞，Stop/Pause/EmergencyStop 直接排队发送 Commands never block each other in a Fleet
+        return False
+
+    def feedBackData(self):
+        """
+        该机器人最新的反馈帧（形状为 (1,) 的 MyType 数组），尚未收到时返回 None
+        Latest feedback frame of this robot as a (1,) MyType array, None before the first frame
+        """
+        return self.fleet.feedback(self.name)
+
+    def close(self):
+        if self.fleet.robots.get(self.name) is self:
+            self.fleet.remove(self.name)
+
+
+class Fleet:
+    """
+    多机器人连接管理器
+    Multi-robot connection manager
+
+        fleet = Fleet()
+        arm1 = fleet.add('arm1', '192.168.5.1')
+        fleet.add('arm2', '192.168.5.2')
+        fleet.wait_connected(5.0)
+        fleet.broadcast("SpeedFactor(50)")
+        arm1.MovJ(...)
+        fleet.field('QActual')
+    """
+    connectTimeout = 2.0
+    backoffBase = 0.1
+    backoffMax = 5.0
+
+    def __init__(self):
+        self.robots = {}
+        self._links = {}            # name -> (dashboard link, feedback link)
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._feedLock = threading.Lock()
+        self._names = []
+        self._frames = np.zeros(0, dtype=MyType)
+        self._frameTimes = np.zeros(0)
+        self._wakeRecv, self._wakeSend = socket.socketpair()
+        self._wakeRecv.setblocking(False)
+        self._wakeSend.setblocking(False)
+        self._selector.register(self._wakeRecv, selectors.EVENT_READ, None)
+        self._removed = []
+        self._restored = []         # 恢复线程完成后登记的 (link, generation) (link, generation) of finished restores
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="DobotFleet", daemon=True)
+        self._thread.start()
+
+    def __getitem__(self, name):
+        return self.robots[name]
+
+    def __iter__(self):
+        return iter(list(self.robots.values()))
+
+    def __len__(self):
+        return len(self.robots)
+
+    def add(self, name, ip, dashboard_port=29999, feed_port=30004, timeout=None):
+        """
+        加入一台机器人并在后台连接，返回其 FleetRobot 句柄；feed_port=None 表示不接收反馈
+        Add a robot and connect in the background, returns its FleetRobot handle. feed_port=None skips the feedback.
+        域名在这里解析（无法解析时抛出 socket.gaierror），I/O 线程不做阻塞的 DNS 查询
+        Host names are resolved here (socket.gaierror if that fails), the I/O thread never blocks on DNS
+        """
+        address = socket.gethostbyname(ip)
+        robot = FleetRobot(self, name, ip, dashboard_port, timeout)
+        with self._lock:
+            if name in self.robots:
+                raise ValueError(f"robot {name} already in the fleet")
+            self.robots[name] = robot
+            self._links[name] = (_Link(robot, 'dashboard', address, dashboard_port),
+                                 _Link(robot, 'feedback', address, feed_port) if feed_port is not None else None)
+            with self._feedLock:
+                self._names.append(name)
+                self._frames = np.concatenate([self._frames, np.zeros(1, dtype=MyType)])
+                self._frameTimes = np.append(self._frameTimes, np.nan)
+        self._wake()
+        return robot
+
+    def remove(self, name):
+        """
+        断开并移除一台机器人，未完成的指令得到 DobotConnectionError
+        Disconnect and remove a robot, unfinished commands get DobotConnectionError
+        """
+        with self._lock:
+            if self.robots.pop(name, None) is None:
+                return
+            links = self._links.pop(name)
+            with self._feedLock:
+                index = self._names.index(name)
+                del self._names[index]
+                self._frames = np.delete(self._frames, index)
+                self._frameTimes = np.delete(self._frameTimes, index)
+            # 连接由 I/O 线程关闭，selector 不能跨线程修改 The I/O thread closes the sockets, the selector is not thread-safe
+            self._removed.extend(link for link in links if link is not None)
+        self._wake()
+
+    def submit(self, name, string, deadline, restore=False):
+        """
+        把一条指令加入 name 的发送队列，返回 Future；deadline 为 time.monotonic() 截止时间
+        Queue a command for robot name and return a Future. deadline is on time.monotonic()
+        """
+        future = Future()
+        with self._lock:
+            links = self._links.get(name)
+            if links is None or self._closed:
+                future.set_exception(DobotConnectionError(f"{name} is not in the fleet"))
+                return future
+            if restore:
+                links[0].pending.appendleft([string, future, deadline, restore])
+            else:
+                links[0].pending.append([string, future, deadline, restore])
+        self._wake()
+        return future
+
+    def broadcast(self, string, timeout=None, names=None):
+        """
+        向所有（或 names 中的）机器人同时发送同一条指令，返回 {名称: 返回值}，失败的项为对应的异常
+        Send one command to every robot (or those in names) at once. Returns {name: reply}, failed entries hold
+        the exception
+        """
+        futures = {}
+        for name, robot in list(self.robots.items()):
+            if names is None or name in names:
+                deadline = robot.deadline(timeout)
+                futures[name] = (self.submit(name, string, deadline), deadline)
+        results = {}
+        for name, (future, deadline) in futures.items():
+            try:
+                results[name] = _result(future, deadline, string)
+                robot = self.robots.get(name)
+                if robot is not None and isinstance(string, str):
+                    robot.session.observe(string, results[name])
+            except (DobotTimeoutError, DobotConnectionError) as e:
+                results[name] = e
+        return results
+
+    def isConnected(self, name):
+        links = self._links.get(name)
+        return links is not None and links[0].state == "connected"
+
+    def wait_connected(self, timeout=None):
+        """
+        等待所有机器人的 Dashboard 连接就绪，返回是否全部就绪
+        Wait until every dashboard connection is up, returns whether all of them are
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while not all(self.isConnected(name) for name in list(self.robots)):
+            if end is not None and time.monotonic() >= end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def feedback(self, name):
+        """
+        name 最新的反馈帧（形状为 (1,) 的 MyType 数组），尚未收到时返回 None
+        Latest feedback frame of robot name as a (1,) MyType array, None before the first frame
+        """
+        with self._feedLock:
+            index = self._names.index(name)
+            if np.isnan(self._frameTimes[index]):
+                return None
+            return self._frames[index:index + 1].copy()
+
+    def snapshot(self):
+        """
+        所有机器人的最新反馈：(名称列表, MyType 数组, 帧龄秒数数组)，未收到反馈的行帧龄为 nan
+        Latest feedback of every robot: (names, MyType array, frame age in seconds), rows without a frame have
+        nan age
+        """
+        with self._feedLock:
+            return list(self._names), self._frames.copy(), time.monotonic() - self._frameTimes
+
+    def field(self, key):
+        """
+        所有机器人某个反馈字段的数组，行顺序与 snapshot() 的名称列表相同，如 field('QActual') 为 (n, 6)
+        One feedback field for every robot, rows in the order of the snapshot() names, e.g. field('QActual') is
+        (n, 6)
+        """
+        with self._feedLock:
+            return self._frames[key].copy()
+
+    def close(self):
+        """
+        关闭所有连接并结束 I/O 线程
+        Close every connection and stop the I/O thread
+        """
+        for name in list(self.robots):
+            self.remove(name)
+        self._closed = True
+        self._wake()
+        self._thread.join(timeout=1.0)
+        self._wakeSend.close()
+
+    # ---------------------------------------------------------------- I/O 线程 I/O thread
+
+    def _wake(self):
+        try:
+            self._wakeSend.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def backoff(self, attempt):
+        return min(self.backoffMax, self.backoffBase * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _fail(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            timeout = 0.05
+            with self._lock:
+                links = [link for pair in self._links.values() for link in pair if link is not None]
+                removed, self._removed = self._removed, []
+                restored, self._restored = self._restored, []
+            for link in removed:
+                error = DobotConnectionError(f"{link.robot.name} removed from the fleet")
+                self._guard(link, self._drop, link, error)
+                while link.pending:
+                    self._fail(link.pending.popleft()[1], error)
+            for link, generation in restored:
+                # 连接在恢复期间又断开过时，旧的恢复结果作废 A restore is stale if the link reconnected meanwhile
+                if link.state == "restoring" and link.generation == generation:
+                    link.state = "connected"
+            for link in links:
+                self._guard(link, self._service, link, now)
+            for key, mask in self._selector.select(timeout):
+                link = key.data
+                if link is None:
+                    try:
+                        self._wakeRecv.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._guard(link, self._event, link, mask)
+            if self._closed and not self._removed:
+                break
+        self._selector.close()
+        self._wakeRecv.close()
+
+    def _guard(self, link, method, *args):
+        """
+        在 I/O 线程中处理一条连接，出现意外异常时只断开这条连接，不影响其它机器人
+        Handle one link on the I/O thread. An unexpected error drops only that link, other robots keep running
+        """
+        try:
+            method(*args)
+        except Exception as e:
+            print(f"Fleet link {link.robot.name}/{link.kind} failed: {e!r}")
+            try:
+                self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} I/O error: {e}"))
+            except Exception as e:
+                print(f"Fleet link {link.robot.name}/{link.kind} could not be dropped: {e!r}")
+
+    def _service(self, link, now):
+        if link.state == "down" and now >= link.retryAt:
+            self._open(link, now)
+        elif link.state == "connecting" and now >= link.retryAt:
+            self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} connect timed out"))
+        if link.kind == 'dashboard':
+            self._expire(link, now)
+            self._flush(link)
+
+    def _event(self, link, mask):
+        if link.state == "connecting":
+            self._finishConnect(link)
+            return
+        if mask & selectors.EVENT_READ:
+            self._read(link)
+        if mask & selectors.EVENT_WRITE and link.sock is not None:
+            self._write(link)
+
+    def _open(self, link, now):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        link.sock = sock
+        link.state = "connecting"
+        link.retryAt = now + self.connectTimeout
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if link.kind == 'feedback':
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 144000)
+        sock.connect_ex((link.address, link.port))
+        self._selector.register(sock, selectors.EVENT_WRITE, link)
+
+    def _finishConnect(self, link):
+        error = link.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error != 0:
+            self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} connect failed: errno {error}"))
+            return
+        link.attempt = 0
+        link.generation += 1
+        link.rx.clear()
+        link.tx.clear()
+        self._selector.modify(link.sock, selectors.EVENT_READ, link)
+        if link.kind == 'dashboard' and link.everConnected:
+            # 重连后先在独立线程中恢复会话，期间只发送恢复指令 Restore the session first, only restore commands are sent
+            print(f"Reconnected to {link.robot.ip}:{link.port}")
+            link.state = "restoring"
+            threading.Thread(target=self._restore, args=(link, link.generation), daemon=True).start()
+        else:
+            link.state = "connected"
+        link.everConnected = True
+
+    def _restore(self, link, generation):
+        try:
+            link.robot.onReconnect()
+        except Exception as e:
+            print(f"Session restore failed: {e}")
+        # 连接状态只由 I/O 线程修改 Only the I/O thread changes the link state
+        with self._lock:
+            self._restored.append((link, generation))
+        self._wake()
+
+    def _drop(self, link, error):
+        """
+        关闭连接并安排带抖动的指数退避重连，已发送未返回的指令得到 error
+        Close the connection and schedule a reconnect with jittered exponential backoff, sent commands without a
+        reply get error
+        """
+        if link.sock is not None:
+            try:
+                self._selector.unregister(link.sock)
+            except (KeyError, ValueError):
+                pass
+            link.sock.close()
+            link.sock = None
+        link.state = "down"
+        link.retryAt = time.monotonic() + self.backoff(link.attempt)
+        link.attempt += 1
+        while link.waiting:
+            self._fail(link.waiting.popleft()[0], error)
+        link.tx.clear()
+        link.rx.clear()
+
+    def _expire(self, link, now):
+        # 已发送的指令超时后迟到的返回值会错位，因此丢弃该连接 A late reply would be misaligned, so drop the connection
+        if link.waiting and link.waiting[0][1] <= now:
+            future = link.waiting.popleft()[0]
+            self._fail(future, DobotTimeoutError(f"{link.robot.ip}:{link.port} timed out while receiving"))
+            self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} reset after a timeout"))
+        with self._lock:
+            expired = [entry for entry in link.pending if entry[2] <= now]
+            for entry in expired:
+                link.pending.remove(entry)
+        for string, future, _, _ in expired:
+            text = string if isinstance(string, str) else bytes(string).decode('utf-8', 'replace')
+            self._fail(future, DobotTimeoutError(
+                f"{link.robot.ip}:{link.port} timed out while waiting for the connection", text))
+
+    def _flush(self, link):
+        if link.state not in ("connected", "restoring") or not link.pending:
+            return
+        with self._lock:
+            while link.pending and (link.state == "connected" or link.pending[0][3]):
+                string, future, deadline, _ = link.pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                string = link.robot.rewriteCommand(string)
+                link.tx += string if isinstance(string, (bytes, bytearray)) else string.encode('utf-8')
+                link.waiting.append((future, deadline))
+        self._write(link)
+
+    def _write(self, link):
+        if link.tx:
+            try:
+                sent = link.sock.send(link.tx)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} send failed: {e}"))
+                return
+            del link.tx[:sent]
+        self._selector.modify(link.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if link.tx else 0), link)
+
+    def _read(self, link):
+        try:
+            data = link.sock.recv(144000)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} receive failed: {e}"))
+            return
+        if not data:
+            self._drop(link, DobotConnectionError(f"{link.robot.ip}:{link.port} closed the connection"))
+            return
+        link.rx += data
+        if link.kind == 'dashboard':
+            self._replies(link)
+        else:
+            self._frame(link)
+
+    def _replies(self, link):
+        *complete, rest = link.rx.split(b';')
+        link.rx[:] = rest
+        for reply in complete:
+            reply = reply.decode('utf-8', 'replace').strip() + ';'
+            if link.waiting:
+                future = link.waiting.popleft()[0]
+                if not future.done():
+                    future.set_result(reply)
+
+    def _frame(self, link):
+        # 只保留最新的完整帧 Only the newest complete frame is kept
+        frame = takeLatestFrame(link.rx)
+        if frame is None:
+            return
+        name = link.robot.name
+        with self._feedLock:
+            if link.robot.fleet is not self or name not in self._names:
+                return
+            index = self._names.index(name)
+            self._frames[index] = frame[0]
+            self._frameTimes[index] = time.monotonic()
+        link.robot.frameTable.update_from_feedback(frame)
+
+
+# 测试代码
+if __name__ == "__main__":
+    fleet = Fleet()
+    for i in range(3):
+        fleet.add(f"arm{i + 1}", f"192.168.5.{i + 1}")
+    print("connected:", fleet.wait_connected(5.0))
+    print(fleet.broadcast("SpeedFactor(50)"))
+    names, frames, ages = fleet.snapshot()
+    for name, mode, age in zip(names, frames['RobotMode'], ages):
+        print(name, mode, age)
+    fleet.close()
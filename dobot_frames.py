@@ -0,0 +1,206 @@
+import re
+import threading
+import numpy as np
+from dobot_rotations import euler_to_matrix, matrix_to_euler
+
+# 本地用户/工具坐标系计算
+# Local user/tool frame math
+#
+# 位姿格式与控制器一致：[x, y, z, rx, ry, rz]，单位 mm 和度，
+# 姿态为绕固定轴 X-Y-Z 依次旋转，即 R = Rz(rz) * Ry(ry) * Rx(rx)。
+# Poses use the controller format [x, y, z, rx, ry, rz] in mm and degrees,
+# the orientation is fixed-axis X-Y-Z, i.e. R = Rz(rz) * Ry(ry) * Rx(rx).
+
+FRAME_COUNT = 10
+
+
+def _as_poses(poses):
+    poses = np.asarray(poses, dtype=np.float64)
+    if poses.shape[-1] != 6:
+        raise ValueError("pose must have 6 values [x, y, z, rx, ry, rz]")
+    return poses
+
+
+def parse_table(table):
+    """
+    解析 "{x, y, z, rx, ry, rz}" 格式的坐标系字符串，或直接转换数值序列
+    Parse a "{x, y, z, rx, ry, rz}" frame string, or convert a numeric sequence
+    """
+    if isinstance(table, str):
+        table = [float(v) for v in re.findall(r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?', table)]
+    return _as_poses(table).reshape(6)
+
+
+def pose_to_matrix(poses):
+    """
+    位姿转换为齐次变换矩阵，(6,) -> (4, 4)，(n, 6) -> (n, 4, 4)
+    Convert poses to homogeneous transforms, (6,) -> (4, 4), (n, 6) -> (n, 4, 4)
+    """
+    poses = _as_poses(poses)
+    T = np.zeros(poses.shape[:-1] + (4, 4))
+    T[..., :3, :3] = euler_to_matrix(poses[..., 3:])
+    T[..., :3, 3] = poses[..., :3]
+    T[..., 3, 3] = 1.0
+    return T
+
+
+def matrix_to_pose(T):
+    """
+    齐次变换矩阵转换为位姿，(4, 4) -> (6,)，(n, 4, 4) -> (n, 6)
+    Convert homogeneous transforms to poses, (4, 4) -> (6,), (n, 4, 4) -> (n, 6)
+    """
+    T = np.asarray(T, dtype=np.float64)
+    return np.concatenate([T[..., :3, 3], matrix_to_euler(T[..., :3, :3])], axis=-1)
+
+
+def invert_transform(T):
+    """
+    齐次变换矩阵求逆（利用旋转矩阵正交性）
+    Invert homogeneous transforms using the orthogonality of the rotation block
+    """
+    T = np.asarray(T, dtype=np.float64)
+    Rt = np.swapaxes(T[..., :3, :3], -1, -2)
+    inv = np.zeros_like(T)
+    inv[..., :3, :3] = Rt
+    inv[..., :3, 3] = -np.einsum('...ij,...j->...i', Rt, T[..., :3, 3])
+    inv[..., 3, 3] = 1.0
+    return inv
+
+
+class FrameTable:
+    """
+    用户/工具坐标系表的本地副本，用于在主机侧完成 CalcUser/CalcTool/RelPointTool/RelPointUser
+    以及 GetPose(user, tool) 的坐标变换，所有方法均支持 (n, 6) 位姿数组的批量计算。
+    坐标系 0 初始为基坐标系/法兰坐标系。
+    Local copy of the user/tool frame tables. It computes CalcUser/CalcTool/RelPointTool/RelPointUser
+    and GetPose(user, tool) conversions on the host. Every method accepts (n, 6) pose arrays.
+    Frame 0 starts as the base/flange frame.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.user = np.zeros((FRAME_COUNT, 6))
+        self.tool = np.zeros((FRAME_COUNT, 6))
+        self.userIndex = 0
+        self.toolIndex = 0
+        self.__userT = pose_to_matrix(self.user)
+        self.__toolT = pose_to_matrix(self.tool)
+
+    def set_user(self, index, table):
+        """
+        记录用户坐标系，table 可以是 SetUser 使用的字符串
+        Record a user frame, table may be the string passed to SetUser
+        """
+        value = parse_table(table)
+        with self.__lock:
+            self.user[index] = value
+            self.__userT[index] = pose_to_matrix(value)
+
+    def set_tool(self, index, table):
+        """
+        记录工具坐标系，table 可以是 SetTool 使用的字符串
+        Record a tool frame, table may be the string passed to SetTool
+        """
+        value = parse_table(table)
+        with self.__lock:
+            self.tool[index] = value
+            self.__toolT[index] = pose_to_matrix(value)
+
+    def select(self, user=None, tool=None):
+        """
+        记录全局用户/工具坐标系索引（对应 User()/Tool() 指令）
+        Record the global user/tool index (matches the User()/Tool() commands)
+        """
+        if user is not None:
+            self.userIndex = int(user)
+        if tool is not None:
+            self.toolIndex = int(tool)
+
+    def update_from_feedback(self, feed):
+        """
+        从实时反馈数据中更新当前全局坐标系索引及其数值
+        Update the current global indices and their values from a feedback frame
+        """
+        userIndex = int(feed['User'][0])
+        toolIndex = int(feed['Tool'][0])
+        userValue = np.array(feed['UserValue[6]'][0], dtype=np.float64)
+        toolValue = np.array(feed['ToolValue[6]'][0], dtype=np.float64)
+        with self.__lock:
+            self.userIndex = userIndex
+            self.toolIndex = toolIndex
+            if not np.array_equal(self.user[userIndex], userValue):
+                self.user[userIndex] = userValue
+                self.__userT[userIndex] = pose_to_matrix(userValue)
+            if not np.array_equal(self.tool[toolIndex], toolValue):
+                self.tool[toolIndex] = toolValue
+                self.__toolT[toolIndex] = pose_to_matrix(toolValue)
+
+    def user_matrix(self, index=-1):
+        """
+        用户坐标系相对基坐标系的变换，index=-1 表示全局用户坐标系
+        Transform of a user frame in the base frame, index=-1 means the global user frame
+        """
+        with self.__lock:
+            return self.__userT[self.userIndex if index == -1 else index].copy()
+
+    def tool_matrix(self, index=-1):
+        """
+        工具坐标系相对法兰坐标系的变换，index=-1 表示全局工具坐标系
+        Transform of a tool frame in the flange frame, index=-1 means the global tool frame
+        """
+        with self.__lock:
+            return self.__toolT[self.toolIndex if index == -1 else index].copy()
+
+    def calc_user(self, index, matrix_direction, offsets):
+        """
+        本地 CalcUser：1 为左乘（沿基坐标系偏转），0 为右乘（沿自身偏转）
+        Local CalcUser: 1 left-multiplies (offset along the base frame), 0 right-multiplies (offset along itself)
+        """
+        frame = self.user_matrix(index)
+        T = pose_to_matrix(offsets)
+        return matrix_to_pose(T @ frame if matrix_direction == 1 else frame @ T)
+
+    def calc_tool(self, index, matrix_direction, offsets):
+        """
+        本地 CalcTool：1 为左乘（沿法兰坐标系偏转），0 为右乘（沿自身偏转）
+        Local CalcTool: 1 left-multiplies (offset along the flange frame), 0 right-multiplies (offset along itself)
+        """
+        frame = self.tool_matrix(index)
+        T = pose_to_matrix(offsets)
+        return matrix_to_pose(T @ frame if matrix_direction == 1 else frame @ T)
+
+    def rel_point_tool(self, poses, offsets):
+        """
+        本地 RelPointTool：沿各点自身工具坐标系偏移
+        Local RelPointTool: offset each pose along its own tool frame
+        """
+        return matrix_to_pose(pose_to_matrix(poses) @ pose_to_matrix(offsets))
+
+    def rel_point_user(self, poses, offsets):
+        """
+        本地 RelPointUser：沿用户坐标系平移，姿态绕用户坐标系轴旋转
+        Local RelPointUser: translate along the user frame and rotate about the user frame axes
+        """
+        poses = _as_poses(poses)
+        offsets = _as_poses(offsets)
+        T = pose_to_matrix(poses)
+        off = pose_to_matrix(offsets)
+        T[..., :3, :3] = off[..., :3, :3] @ T[..., :3, :3]
+        T[..., :3, 3] = T[..., :3, 3] + offsets[..., :3]
+        return matrix_to_pose(T)
+
+    def convert_pose(self, poses, from_user=-1, from_tool=-1, to_user=-1, to_tool=-1):
+        """
+        将位姿从一组用户/工具坐标系转换到另一组，-1 表示全局坐标系
+        Convert poses from one user/tool pair to another, -1 means the global frame
+        """
+        flange = self.user_matrix(from_user) @ pose_to_matrix(poses) @ invert_transform(self.tool_matrix(from_tool))
+        return matrix_to_pose(invert_transform(self.user_matrix(to_user)) @ flange @ self.tool_matrix(to_tool))
+
+    def get_pose(self, feed, user=-1, tool=-1):
+        """
+        本地 GetPose(user, tool)：将反馈中的 ToolVectorActual 转换到指定坐标系
+        Local GetPose(user, tool): convert ToolVectorActual from a feedback frame into the requested frames
+        """
+        self.update_from_feedback(feed)
+        return self.convert_pose(feed['ToolVectorActual'][0], -1, -1, user, tool)
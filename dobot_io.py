@@ -0,0 +1,340 @@
+import time
+import threading
+import numpy as np
+
+# 反馈位掩码的数字 I/O 视图
+# Digital I/O view of the feedback bit masks
+#
+# 实时反馈每 8 ms 带来 64 位的 DigitalInputs/DigitalOutputs 掩码。DigitalIO 用向量化的位运算展开这些掩码，
+# 在本地回答 DI/DO 查询（无需 DI()/GetDO()/GetDOGroup() 往返），并逐帧比较相邻掩码检测上升沿/下降沿，
+# 带主机时间戳分发边沿回调，输入反应时间为一个反馈周期而不必轮询。
+# 端口编号与 Dashboard 指令一致：DI_n/DO_n 对应掩码的第 n-1 位。
+# The realtime feedback carries the 64-bit DigitalInputs/DigitalOutputs masks every 8 ms. DigitalIO unpacks them
+# with vectorized bit operations and answers DI/DO queries locally (no DI()/GetDO()/GetDOGroup() round trip).
+# It compares consecutive masks frame by frame to detect rising and falling edges and dispatches edge callbacks
+# with host timestamps, so inputs are seen within one feedback period without polling.
+# Port numbers match the dashboard commands: DI_n/DO_n is bit n-1 of the mask.
+
+KINDS = {'DI': 'DigitalInputs', 'DO': 'DigitalOutputs'}
+EDGES = ('rising', 'falling', 'both')
+
+
+def unpackMasks(masks):
+    """
+    把 uint64 掩码展开为 (n, 64) 的布尔数组，第 i 列为第 i 位
+    Unpack uint64 masks into an (n, 64) bool array, column i is bit i
+    """
+    masks = np.ascontiguousarray(masks, dtype='<u8').reshape(-1)
+    return np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little').view(np.bool_)
+
+
+def maskText(mask):
+    """
+    64 位掩码的二进制文本，高位在前（与 bin(mask)[2:].rjust(64, '0') 相同）
+    Binary text of a 64-bit mask, highest bit first (same as bin(mask)[2:].rjust(64, '0'))
+    """
+    return (unpackMasks(mask)[0, ::-1] + np.uint8(ord('0'))).tobytes().decode('ascii')
+
+
+class IOEdge:
+    """
+    一次边沿：类型（'DI'/'DO'）、端口编号、新状态（1 上升沿，0 下降沿）和主机时间戳 time.monotonic()
+    One edge: kind ('DI'/'DO'), port number, new state (1 rising, 0 falling) and host timestamp time.monotonic()
+    """
+
+    def __init__(self, kind, index, value, stamp):
+        self.kind = kind
+        self.index = index
+        self.value = value
+        self.stamp = stamp
+
+    @property
+    def rising(self):
+        return self.value == 1
+
+    def __repr__(self):
+        return "IOEdge({}{}, {}, {:.3f})".format(self.kind, self.index, 'rising' if self.value else 'falling',
+                                                self.stamp)
+
+
+class DigitalIO:
+    """
+    由反馈帧更新的数字 I/O 状态，update() 由读取反馈的线程调用，查询可在任意线程进行
+    Digital I/O state updated from feedback frames. update() is called by the thread reading the feedback,
+    queries can come from any thread
+
+        io = DigitalIO()
+        io.on('DI', 3, lambda edge: print(edge), edge='rising')
+        io.update(client_feed.feedBackData())
+        io.DI(3), io.GetDOGroup(1, 2, 3)
+    """
+
+    def __init__(self):
+        self.masks = {kind: None for kind in KINDS}     # 最新掩码，尚无帧时为 None Newest masks
+        self.stamp = None                               # 最新帧的主机时间 Host time of the newest frame
+        self.frames = 0                                 # 已处理的帧数 Frames processed
+        self._bits = {kind: np.zeros(64, dtype=np.bool_) for kind in KINDS}
+        self._texts = {kind: '0' * 64 for kind in KINDS}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def on(self, kind, index, callback, edge='both'):
+        """
+        注册边沿回调 callback(IOEdge)，index 为 None 时监听该类型的全部端口，返回用于 off() 的句柄
+        Register an edge callback callback(IOEdge). With index None every port of the kind is watched.
+        Returns a handle for off()
+        """
+        if kind not in KINDS:
+            raise ValueError("kind must be 'DI' or 'DO'")
+        if edge not in EDGES:
+            raise ValueError("edge must be one of {}".format(', '.join(EDGES)))
+        handle = (kind, index, edge, callback)
+        with self._lock:
+            self._listeners.append(handle)
+        return handle
+
+    def off(self, handle):
+        with self._lock:
+            if handle in self._listeners:
+                self._listeners.remove(handle)
+
+    def update(self, frames, stamps=None):
+        """
+        处理一帧或多帧反馈（MyType 数组，按时间先后），返回检测到的边沿列表并分发回调。
+        stamps 为各帧的主机时间，默认取当前 time.monotonic()
+        Process one or more feedback frames (MyType array, oldest first), return the detected edges and dispatch
+        the callbacks. stamps holds the host time of each frame, the current time.monotonic() by default
+        """
+        if frames is None or len(frames) == 0:
+            return []
+        count = len(frames)
+        stamps = np.broadcast_to(time.monotonic() if stamps is None else np.asarray(stamps, dtype=np.float64),
+                                 (count,))
+        edges = []
+        for kind, field in KINDS.items():
+            masks = np.asarray(frames[field], dtype=np.uint64).reshape(-1)
+            if count == 1 and self.masks[kind] == int(masks[0]):
+                continue                                # 单帧且未变化 One unchanged frame
+            previous = masks[0] if self.masks[kind] is None else np.uint64(self.masks[kind])
+            changed = masks ^ np.concatenate(([previous], masks[:-1]))
+            rows = np.flatnonzero(changed)
+            if rows.size:
+                flips = unpackMasks(changed[rows])
+                states = unpackMasks(masks[rows])
+                for row, bit in zip(*np.nonzero(flips)):
+                    edges.append(IOEdge(kind, int(bit) + 1, int(states[row, bit]), float(stamps[rows[row]])))
+            if self.masks[kind] is None or rows.size:
+                self._bits[kind] = unpackMasks(masks[-1])[0]
+                self._texts[kind] = None
+            self.masks[kind] = int(masks[-1])
+        self.stamp = float(stamps[-1])
+        self.frames += count
+        if edges:
+            edges.sort(key=lambda edge: edge.stamp)
+            self._dispatch(edges)
+        return edges
+
+    def _dispatch(self, edges):
+        with self._lock:
+            listeners = list(self._listeners)
+        for edge in edges:
+            for kind, index, which, callback in listeners:
+                if kind != edge.kind or (index is not None and index != edge.index):
+                    continue
+                if which == 'both' or (which == 'rising') == edge.rising:
+                    callback(edge)
+
+    def bits(self, kind):
+        """
+        64 个端口的状态数组，第 i 个元素为端口 i+1
+        State array of the 64 ports, element i is port i+1
+        """
+        return self._bits[kind].copy()
+
+    def text(self, kind):
+        """
+        掩码的二进制文本（高位在前），掩码变化时才重新生成
+        Binary text of the mask, highest bit first. Only rebuilt when the mask changed
+        """
+        text = self._texts[kind]
+        if text is None:
+            text = (self._bits[kind][::-1] + np.uint8(ord('0'))).tobytes().decode('ascii')
+            self._texts[kind] = text
+        return text
+
+    def DI(self, index):
+        """
+        DI_index 的状态，1：ON；0：OFF Status of DI_index, 1: ON, 0: OFF
+        """
+        return int(self._bits['DI'][index - 1])
+
+    def DIGroup(self, *index):
+        return self._bits['DI'][np.asarray(index) - 1].astype(int).tolist()
+
+    def GetDO(self, index):
+        """
+        DO_index 的状态，1：ON；0：OFF Status of DO_index, 1: ON, 0: OFF
+        """
+        return int(self._bits['DO'][index - 1])
+
+    def GetDOGroup(self, *index):
+        return self._bits['DO'][np.asarray(index) - 1].astype(int).tolist()
+
+
+class OutputBatcher:
+    """
+    合并一个周期内的 DO/ToolDO/AO 写入：同一端口只保留最后一次写入，跳过与当前状态相同的写入，
+    flush() 时把其余写入合并为尽量少的指令（DO 合并为一条 DOGroup，立即模式下为 DOInstant），一次写入发送。
+    DO 的当前状态取自 io 的反馈掩码；反馈尚未体现的已发送值优先。ToolDO/AO 在反馈中没有对应字段，与上次发送的值比较
+    Coalesces the DO/ToolDO/AO writes of one cycle: only the last write of each port is kept, writes equal to the
+    current state are skipped, and flush() sends the rest as the fewest commands possible (the DOs as one DOGroup,
+    or DOInstant in instant mode) in a single write. The current DO state comes from the feedback mask of io,
+    values sent but not yet seen in the feedback take precedence. ToolDO/AO have no feedback field and are compared
+    with the last value sent
+
+        batcher = OutputBatcher(dashboard, io)
+        with batcher:
+            batcher.DO(1, 1)
+            batcher.DO(2, 0)
+            batcher.AO(1, 2.5)
+    """
+
+    def __init__(self, dashboard, io=None, instant=False):
+        """
+        instant: True 时使用立即指令（DOInstant/ToolDOInstant/AOInstant），否则使用队列指令（DOGroup/ToolDO/AO）
+        instant: use the immediate commands (DOInstant/ToolDOInstant/AOInstant) when True, the queue commands
+        (DOGroup/ToolDO/AO) otherwise
+        """
+        self.dashboard = dashboard
+        self.io = io
+        self.instant = instant
+        self.writes = 0                 # 累计收到的写入 Writes received so far
+        self.sent = 0                   # 累计发送的指令数 Commands sent so far
+        self._pending = {}              # (类型, 端口) -> 值 (kind, port) -> value
+        self._last = {}                 # 已发送但未被反馈确认的值 Values sent and not confirmed by feedback yet
+        self._lock = threading.Lock()
+
+    def DO(self, index, status):
+        self._write('DO', index, 1 if status else 0)
+
+    def ToolDO(self, index, status):
+        self._write('ToolDO', index, 1 if status else 0)
+
+    def AO(self, index, value):
+        self._write('AO', index, float(value))
+
+    def _write(self, kind, index, value):
+        with self._lock:
+            self._pending[(kind, index)] = value
+            self.writes += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def _current(self, kind, index):
+        """
+        端口的当前值：已发送未确认的值，其次为反馈掩码，未知时为 None
+        Current value of a port: the value sent and not confirmed yet, then the feedback mask, None when unknown
+        """
+        if (kind, index) in self._last:
+            return self._last[(kind, index)]
+        if kind == 'DO' and self.io is not None and self.io.masks['DO'] is not None:
+            return self.io.GetDO(index)
+        return None
+
+    def plan(self):
+        """
+        取出本周期的写入并生成指令列表（不发送）
+        Take the writes of this cycle and build the command list without sending it
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # 反馈已体现的 DO 不再需要记住 Forget the DOs the feedback already shows
+            if self.io is not None and self.io.masks['DO'] is not None:
+                for kind, index in [key for key in self._last if key[0] == 'DO']:
+                    if self.io.GetDO(index) == self._last[(kind, index)]:
+                        del self._last[(kind, index)]
+            changes = [(kind, index, value) for (kind, index), value in sorted(pending.items())
+                       if self._current(kind, index) != value]
+            for kind, index, value in changes:
+                self._last[(kind, index)] = value
+        strings = []
+        outputs = [(index, value) for kind, index, value in changes if kind == 'DO']
+        if outputs and self.instant:
+            strings.extend("DOInstant({:d},{:d})".format(index, value) for index, value in outputs)
+        elif outputs:
+            strings.append("DOGroup({:s})".format(','.join("{:d},{:d}".format(*output) for output in outputs)))
+        suffix = 'Instant' if self.instant else ''
+        for kind, index, value in changes:
+            if kind == 'ToolDO':
+                strings.append("ToolDO{:s}({:d},{:d})".format(suffix, index, value))
+            elif kind == 'AO':
+                strings.append("AO{:s}({:d},{:f})".format(suffix, index, value))
+        return strings
+
+    def flush(self, timeout=None):
+        """
+        发送本周期的写入，返回各指令的返回值；没有需要发送的写入时返回空列表。
+        发送失败的写入不会被记为已发送
+        Send the writes of this cycle and return the reply of each command, an empty list when nothing needs to be
+        sent. Failed writes are not remembered as sent
+        """
+        strings = self.plan()
+        if not strings:
+            return []
+        try:
+            replies = self.dashboard.sendRecvMsgBatch(strings, timeout)
+        except Exception:
+            self.forget()
+            raise
+        self.sent += len(strings)
+        if len(replies) < len(strings) or any(not reply.startswith('0,') for reply in replies):
+            self.forget()
+        return replies
+
+    def forget(self):
+        """
+        忘记已发送的值，下次写入一律与反馈比较（或重新发送）
+        Forget the values sent, the next writes are compared with the feedback (or sent again)
+        """
+        with self._lock:
+            self._last.clear()
+
+
+# 测试代码
+if __name__ == "__main__":
+    from dobot_api import MyType
+
+    frames = np.zeros(4, dtype=MyType)
+    frames['DigitalInputs'] = [0b0000, 0b0101, 0b0100, 0b1100]
+    frames['DigitalOutputs'] = [0, 0, 1 << 63, 1 << 63]
+    io = DigitalIO()
+    io.on('DI', 3, lambda edge: print("DI3 rising", edge), edge='rising')
+    io.on('DO', None, lambda edge: print("DO edge", edge))
+    print(io.update(frames, stamps=[0.000, 0.008, 0.016, 0.024]))
+    print(io.DI(1), io.DI(3), io.DIGroup(1, 2, 3, 4), io.GetDO(64), io.GetDOGroup(1, 64))
+    print(io.text('DI'))
+    assert io.text('DO') == bin(1 << 63)[2:].rjust(64, '0') == maskText(1 << 63)
+
+    class FakeDashboard:
+        def sendRecvMsgBatch(self, strings, timeout=None):
+            print("send", strings)
+            return ["0,{},%s;" % string for string in strings]
+
+    batcher = OutputBatcher(FakeDashboard(), io)
+    with batcher:
+        batcher.DO(64, 1)           # 与反馈相同，跳过 Same as the feedback, skipped
+        batcher.DO(5, 1)
+        batcher.DO(6, 1)
+        batcher.DO(6, 0)            # 覆盖前一次写入且与反馈相同 Overrides the previous write, same as the feedback
+        batcher.DO(7, 1)
+        batcher.AO(1, 2.5)
+        batcher.ToolDO(1, 1)
+    with batcher:
+        batcher.DO(5, 0)            # 反馈尚未体现上次的 DO5=1，仍需发送 The feedback does not show DO5=1 yet
+        batcher.AO(1, 2.5)          # 与上次发送相同 Same as last sent
+    print("writes", batcher.writes, "commands", batcher.sent)
@@ -0,0 +1,372 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from dobot_frames import pose_to_matrix, matrix_to_pose
+
+# 逆解缓存与本地运动学
+# Inverse kinematics memoization and local kinematics
+
+
+def _wrap_angle(angle):
+    """
+    将角度归一化到 (-180, 180]
+    Normalize an angle in degrees to (-180, 180]
+    """
+    angle = (angle + 180.0) % 360.0 - 180.0
+    return 180.0 if angle == -180.0 else angle
+
+
+def parse_joint_near(joint_near):
+    """
+    解析 "{j1,j2,j3,j4,j5,j6}" 格式的关节字符串，或直接返回关节序列
+    Parse a "{j1,j2,j3,j4,j5,j6}" joint string, or pass a joint sequence through
+    """
+    if joint_near is None:
+        return None
+    if isinstance(joint_near, str):
+        values = [float(v) for v in re.findall(r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?', joint_near)]
+        return values if len(values) == 6 else None
+    return [float(v) for v in joint_near]
+
+
+class IKCache:
+    """
+    以量化位姿为键的逆解LRU缓存。
+    键由量化后的位姿、user/tool 坐标系索引以及 JointNear 所在的分支组成，
+    JointNear 按 joint_step 粗量化，因此同一分支附近的种子关节共享同一缓存项。
+    既可以包装控制器的 InverseKin 调用，也可以包装本地逆解函数。
+    没有 JointNear 时控制器按机械臂当前关节角就近选解，结果与位姿无一一对应关系，因此不缓存。
+    LRU cache of inverse kinematics results keyed on the quantized pose.
+    The key is made of the quantized pose, the user/tool frame indices and the JointNear branch.
+    JointNear is quantized coarsely by joint_step, so seeds around the same branch share one entry.
+    It can wrap the controller InverseKin call as well as any local solver.
+    Without JointNear the controller picks the branch nearest the current joint angles, so such calls are not cached.
+    """
+
+    def __init__(self, maxsize=1024, pos_step=0.01, rot_step=0.001, joint_step=10.0):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.pos_step = pos_step
+        self.rot_step = rot_step
+        self.joint_step = joint_step
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, pose, user=-1, tool=-1, joint_near=None):
+        """
+        生成缓存键
+        Build the cache key
+        """
+        x, y, z, rx, ry, rz = [float(v) for v in pose]
+        key_pose = (round(x / self.pos_step), round(y / self.pos_step), round(z / self.pos_step),
+                    round(_wrap_angle(rx) / self.rot_step), round(_wrap_angle(ry) / self.rot_step),
+                    round(_wrap_angle(rz) / self.rot_step))
+        joints = parse_joint_near(joint_near)
+        branch = None
+        if joints is not None:
+            branch = tuple(int(round(j / self.joint_step)) for j in joints)
+        return (int(user), int(tool), branch, key_pose)
+
+    def get(self, key):
+        """
+        查找缓存，未命中返回 None
+        Look up a key, returns None on a miss
+        """
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        写入缓存，超出容量时淘汰最久未使用的项
+        Store a value, evicting the least recently used entry when full
+        """
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def solve(self, solver, pose, user=-1, tool=-1, joint_near=None):
+        """
+        带缓存地调用 solver(pose, user, tool, joint_near)，solver 返回 None 表示无解且不缓存
+        Call solver(pose, user, tool, joint_near) through the cache. A None result means no solution and is not cached
+        """
+        if parse_joint_near(joint_near) is None:
+            return solver(pose, user, tool, joint_near)
+        key = self.make_key(pose, user, tool, joint_near)
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = solver(pose, user, tool, joint_near)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def cached(self, solver):
+        """
+        返回包装后的逆解函数
+        Return a memoized version of a solver(pose, user=-1, tool=-1, joint_near=None)
+        """
+        def wrapper(pose, user=-1, tool=-1, joint_near=None):
+            return self.solve(solver, pose, user, tool, joint_near)
+        wrapper.cache = self
+        return wrapper
+
+    def invalidate(self):
+        """
+        清空全部缓存项
+        Drop every entry
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.invalidations += 1
+
+    def invalidate_frame(self, user=None, tool=None):
+        """
+        清除使用指定坐标系的缓存项，使用全局坐标系(-1)的项一并清除
+        Drop entries that use the given user/tool index. Entries that rely on the global frame (-1) are dropped too
+        """
+        with self.__lock:
+            stale = [key for key in self.__entries
+                     if (user is not None and key[0] in (user, -1))
+                     or (tool is not None and key[1] in (tool, -1))]
+            for key in stale:
+                del self.__entries[key]
+            self.invalidations += 1
+
+    def stats(self):
+        """
+        返回命中统计
+        Return hit/miss statistics
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self.__entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+# 本地运动学模型
+# Local kinematic model
+
+# Nova 2 名义 DH 参数（标准 DH，单位 mm/度），使用前应通过 PositiveKin 对比校验
+# Nominal Nova 2 standard DH parameters (mm/degrees). Verify against PositiveKin before relying on them
+NOVA2_DH = {
+    'd': [223.4, 0.0, 0.0, 117.5, 120.0, 88.0],
+    'a': [0.0, -280.0, -225.0, 0.0, 0.0, 0.0],
+    'alpha': [90.0, 0.0, 0.0, 90.0, -90.0, 0.0],
+    'offset': [0.0, -90.0, 0.0, -90.0, 0.0, 0.0],
+}
+
+# Nova 2 关节限位（单位：度）
+# Nova 2 joint limits (degrees)
+NOVA2_JOINT_LIMITS = np.array([
+    [-360, 360],
+    [-180, 180],
+    [-156, 156],
+    [-360, 360],
+    [-360, 360],
+    [-360, 360],
+], dtype=np.float64)
+
+
+def parse_joint_reply(valueRecv):
+    """
+    解析 InverseKin/GetAngle 返回值 "0,{j1,...,j6},..." 中的关节角，失败返回 None
+    Parse the joints out of an InverseKin/GetAngle reply "0,{j1,...,j6},...", returns None on failure
+    """
+    if not isinstance(valueRecv, str) or not re.match(r'\s*0\s*,', valueRecv):
+        return None
+    start = valueRecv.find('{')
+    end = valueRecv.find('}', start)
+    if start == -1 or end == -1:
+        return None
+    return parse_joint_near(valueRecv[start:end + 1])
+
+
+class ControllerIKSolver:
+    """
+    通过控制器 InverseKin 求逆解，以 joint_near 作为 JointNear 就近选解。
+    若控制器开启了 IKCache，结果会被缓存。
+    Inverse kinematics through the controller InverseKin call, using joint_near as JointNear.
+    Results are cached when the dashboard has an IKCache enabled.
+    """
+
+    def __init__(self, dashboard):
+        self.dashboard = dashboard
+
+    def __call__(self, pose, user=-1, tool=-1, joint_near=None):
+        x, y, z, rx, ry, rz = [float(v) for v in pose]
+        if joint_near is None:
+            recvData = self.dashboard.InverseKin(x, y, z, rx, ry, rz, user, tool)
+        else:
+            near = "{" + ",".join("{:f}".format(float(j)) for j in joint_near) + "}"
+            recvData = self.dashboard.InverseKin(x, y, z, rx, ry, rz, user, tool, 1, near)
+        return parse_joint_reply(recvData)
+
+
+class SerialArm:
+    """
+    标准 DH 六轴机械臂的本地正逆解。正解对 (n, 6) 关节数组向量化，
+    逆解使用阻尼最小二乘法，并支持以分块方式批量求解整条路径。
+    若提供 FrameTable，则逆解输入的位姿可以在任意 user/tool 坐标系下。
+    逆解结果取各关节离初值最近的等价角，超出 joint_limits 的解视为无解。
+    Local forward/inverse kinematics of a 6-axis arm with standard DH parameters.
+    Forward kinematics is vectorized over (n, 6) joint arrays.
+    Inverse kinematics uses damped least squares and can solve a whole path in chunks.
+    With a FrameTable, IK poses may be given in any user/tool frame.
+    Each IK joint is the equivalent angle nearest its seed, solutions outside joint_limits count as unsolved.
+    """
+
+    def __init__(self, dh=None, frame_table=None, damping=0.05, rot_weight=200.0,
+                 max_iterations=50, pos_tolerance=0.01, rot_tolerance=1e-4, joint_limits=None):
+        dh = dh or NOVA2_DH
+        self.joint_limits = np.asarray(NOVA2_JOINT_LIMITS if joint_limits is None else joint_limits,
+                                       dtype=np.float64)
+        self.d = np.asarray(dh['d'], dtype=np.float64)
+        self.a = np.asarray(dh['a'], dtype=np.float64)
+        self.alpha = np.radians(np.asarray(dh['alpha'], dtype=np.float64))
+        self.offset = np.asarray(dh.get('offset', [0.0] * 6), dtype=np.float64)
+        self.frame_table = frame_table
+        self.damping = damping
+        self.rot_weight = rot_weight
+        self.max_iterations = max_iterations
+        self.pos_tolerance = pos_tolerance
+        self.rot_tolerance = rot_tolerance
+
+    def _frames(self, joints):
+        theta = np.radians(joints + self.offset)
+        ct, st = np.cos(theta), np.sin(theta)
+        ca, sa = np.cos(self.alpha), np.sin(self.alpha)
+        n = joints.shape[0]
+        frames = np.empty((n, 7, 4, 4))
+        frames[:, 0] = np.eye(4)
+        A = np.zeros((n, 6, 4, 4))
+        A[..., 0, 0] = ct
+        A[..., 0, 1] = -st * ca
+        A[..., 0, 2] = st * sa
+        A[..., 0, 3] = self.a * ct
+        A[..., 1, 0] = st
+        A[..., 1, 1] = ct * ca
+        A[..., 1, 2] = -ct * sa
+        A[..., 1, 3] = self.a * st
+        A[..., 2, 1] = sa
+        A[..., 2, 2] = ca
+        A[..., 2, 3] = self.d
+        A[..., 3, 3] = 1.0
+        for i in range(6):
+            frames[:, i + 1] = frames[:, i] @ A[:, i]
+        return frames
+
+    def forward_matrix(self, joints):
+        """
+        正解，返回法兰在基坐标系下的齐次矩阵，(6,) -> (4, 4)，(n, 6) -> (n, 4, 4)
+        Forward kinematics as flange transforms in the base frame, (6,) -> (4, 4), (n, 6) -> (n, 4, 4)
+        """
+        joints = np.asarray(joints, dtype=np.float64)
+        return self._frames(joints.reshape(-1, 6))[:, 6].reshape(joints.shape[:-1] + (4, 4))
+
+    def forward(self, joints, user=-1, tool=-1):
+        """
+        正解，返回位姿 [x, y, z, rx, ry, rz]；有 FrameTable 时按 user/tool 坐标系表示
+        Forward kinematics as poses; expressed in the user/tool frames when a FrameTable is attached
+        """
+        poses = matrix_to_pose(self.forward_matrix(joints))
+        if self.frame_table is not None:
+            poses = self.frame_table.convert_pose(poses, 0, 0, user, tool)
+        return poses
+
+    def _jacobian(self, frames):
+        z = frames[:, :6, :3, 2]
+        p = frames[:, :6, :3, 3]
+        pe = frames[:, 6, None, :3, 3]
+        J = np.empty((frames.shape[0], 6, 6))
+        J[:, :3, :] = np.swapaxes(np.cross(z, pe - p), 1, 2)
+        J[:, 3:, :] = np.swapaxes(z, 1, 2) * self.rot_weight
+        # 关节单位为度 Joints are in degrees
+        return J * (np.pi / 180.0)
+
+    def _error(self, current, target):
+        pos = target[:, :3, 3] - current[:, :3, 3]
+        rot = 0.5 * (np.cross(current[:, :3, 0], target[:, :3, 0])
+                     + np.cross(current[:, :3, 1], target[:, :3, 1])
+                     + np.cross(current[:, :3, 2], target[:, :3, 2]))
+        return pos, rot
+
+    def inverse_batch(self, poses, seeds, user=-1, tool=-1):
+        """
+        对一组位姿同时迭代求逆解，seeds 为每个位姿的初值 (n, 6)。
+        返回 (joints, converged)，未收敛或超出关节限位的行 converged 为 False
+        Iterate IK for a batch of poses at once, seeds are the (n, 6) initial joints.
+        Returns (joints, converged); rows that did not converge or break the joint limits are flagged False
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+        if self.frame_table is not None:
+            poses = self.frame_table.convert_pose(poses, user, tool, 0, 0)
+        target = pose_to_matrix(poses)
+        seeds = np.array(seeds, dtype=np.float64).reshape(-1, 6)
+        joints = seeds.copy()
+        eye = np.eye(6) * self.damping ** 2
+        converged = np.zeros(len(joints), dtype=bool)
+        for _ in range(self.max_iterations):
+            frames = self._frames(joints)
+            pos, rot = self._error(frames[:, 6], target)
+            converged = ((np.linalg.norm(pos, axis=1) < self.pos_tolerance)
+                         & (np.linalg.norm(rot, axis=1) < self.rot_tolerance))
+            if converged.all():
+                break
+            J = self._jacobian(frames)
+            e = np.concatenate([pos, rot * self.rot_weight], axis=1)
+            step = np.swapaxes(J, 1, 2) @ np.linalg.solve(J @ np.swapaxes(J, 1, 2) + eye, e[..., None])
+            joints = np.where(converged[:, None], joints, joints + step[..., 0])
+        joints = self._wrap_joints(joints, seeds)
+        low, high = self.joint_limits[:, 0], self.joint_limits[:, 1]
+        converged = converged & ((joints >= low) & (joints <= high)).all(axis=1)
+        return joints, converged
+
+    def _wrap_joints(self, joints, seeds):
+        """
+        迭代可能绕过整圈，各关节取离初值最近的等价角；仍超出限位时再尝试 ±360° 的等价角
+        Iteration can wind through full turns. Take the equivalent angle nearest the seed, then try ±360° if
+        that is still outside the joint limits
+        """
+        joints = seeds + (joints - seeds + 180.0) % 360.0 - 180.0
+        low, high = self.joint_limits[:, 0], self.joint_limits[:, 1]
+        for turn in (360.0, -360.0):
+            shifted = joints + turn
+            fix = ((joints < low) | (joints > high)) & (shifted >= low) & (shifted <= high)
+            joints = np.where(fix, shifted, joints)
+        return joints
+
+    def __call__(self, pose, user=-1, tool=-1, joint_near=None):
+        """
+        逆解单个位姿，接口与 ControllerIKSolver 一致，可被 IKCache.cached 包装
+        Solve one pose with the same interface as ControllerIKSolver, so IKCache.cached can wrap it
+        """
+        seed = parse_joint_near(joint_near)
+        if seed is None:
+            seed = [0.0] * 6
+        joints, converged = self.inverse_batch([pose], [seed], user, tool)
+        return joints[0].tolist() if converged[0] else None
@@ -0,0 +1,285 @@
+import re
+import time
+import threading
+import numpy as np
+
+# Modbus 寄存器轮询
+# Modbus register polling
+#
+# ModbusPoller 按各标签自己的周期轮询 Modbus 从站。每个周期把到期标签的地址按（寄存器表, 主站索引）合并：
+# 相邻、重叠或间隔不超过 max_gap 的地址合并为一段，再按单次读取上限切块，全部读取指令一次写入（sendRecvMsgBatch）。
+# 寄存器一律按 U16 原始值读取，在本地按 valType 解码为带类型的 NumPy 数组，因此不同类型的标签也能共用一次读取。
+# ModbusPoller polls Modbus slaves with a period of its own for every tag. Each cycle the addresses of the due tags
+# are merged per (register table, master index): adjacent, overlapping or at most max_gap apart addresses form one
+# range, which is then cut into blocks of the largest single read, and every read goes out in one write
+# (sendRecvMsgBatch). Registers are always read as raw U16 and decoded locally into typed NumPy arrays by valType,
+# so tags of different types can share one read.
+
+# 寄存器表：读取指令与单次读取数量上限 Register tables: read command and largest count of one read
+TABLES = {
+    'hold': ('GetHoldRegs', 4),
+    'input': ('GetInRegs', 4),
+    'coil': ('GetCoils', 16),
+    'inbit': ('GetInBits', 16),
+}
+
+# 数据类型：(占用寄存器数, 大端 NumPy 类型) Data types: (registers per value, big-endian NumPy type)
+VALUE_TYPES = {
+    'U16': (1, '>u2'),
+    'S16': (1, '>i2'),
+    'U32': (2, '>u4'),
+    'S32': (2, '>i4'),
+    'F32': (2, '>f4'),
+    'F64': (4, '>f8'),
+}
+
+_VALUES = re.compile(r'\s*(-?\d+)\s*,\s*\{([^}]*)\}')
+
+
+def merge_ranges(ranges, max_gap=0):
+    """
+    合并地址区间 [(起始, 结束), ...]（结束不含），间隔不超过 max_gap 的区间合并为一段
+    Merge address ranges [(start, end), ...] (end exclusive), ranges at most max_gap apart become one
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + max_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def split_blocks(ranges, max_count):
+    """
+    把区间切成不超过 max_count 的读取块
+    Cut ranges into read blocks of at most max_count
+    """
+    return [(addr, min(max_count, end - addr)) for start, end in ranges for addr in range(start, end, max_count)]
+
+
+class ModbusTag:
+    """
+    轮询标签：寄存器表、主站索引、起始地址、数据类型、数量和轮询周期（秒）
+    A polled tag: register table, master index, start address, data type, count and polling period in seconds
+    """
+
+    def __init__(self, name, table, index, addr, valType='U16', count=1, period=1.0, wordOrder='big'):
+        if table not in TABLES:
+            raise ValueError("table must be one of {}".format(', '.join(TABLES)))
+        if table in ('hold', 'input') and valType not in VALUE_TYPES:
+            raise ValueError("valType must be one of {}".format(', '.join(VALUE_TYPES)))
+        if wordOrder not in ('big', 'little'):
+            raise ValueError("wordOrder must be 'big' or 'little'")
+        self.name = name
+        self.table = table
+        self.index = index
+        self.addr = addr
+        self.valType = valType
+        self.count = count
+        self.period = period
+        self.wordOrder = wordOrder      # 多寄存器数值的字序，'big' 为高字在前 Word order of multi-register values
+        self.callbacks = []
+        self.value = None
+        self.stamp = None               # 最近一次成功读取的 time.monotonic() Last successful read
+        self.error = None               # 最近一次失败的返回值 Reply of the last failure
+        self.nextDue = 0.0
+
+    @property
+    def size(self):
+        """
+        占用的寄存器（或位）数量 Registers (or bits) covered
+        """
+        if self.table in ('coil', 'inbit'):
+            return self.count
+        return VALUE_TYPES[self.valType][0] * self.count
+
+    def decode(self, raw):
+        """
+        把该标签覆盖的原始 U16 寄存器（或位）解码为带类型的数组
+        Decode the raw U16 registers (or bits) covered by this tag into a typed array
+        """
+        if self.table in ('coil', 'inbit'):
+            return raw.astype(np.bool_)
+        registers, dtype = VALUE_TYPES[self.valType]
+        words = raw.astype('>u2').reshape(self.count, registers)
+        if self.wordOrder == 'little':
+            words = words[:, ::-1]
+        return np.frombuffer(np.ascontiguousarray(words).tobytes(), dtype=dtype).astype(dtype[1:])
+
+
+class ModbusPoller:
+    """
+    合并读取的 Modbus 轮询器
+    Modbus poller with coalesced reads
+
+        poller = ModbusPoller(dashboard)
+        poller.add('pressure', 'hold', 0, 100, 'F32', period=0.1)
+        poller.add('counter', 'hold', 0, 102, 'U32', period=1.0)
+        poller.subscribe('pressure', lambda tag: print(tag.value))
+        poller.start()
+    """
+
+    def __init__(self, dashboard, max_gap=2, max_counts=None):
+        """
+        max_gap: 相距不超过该数量的地址合并读取（多读的寄存器被丢弃）
+        max_counts: 各寄存器表单次读取数量上限，默认取 TABLES 中的值
+        max_gap: addresses at most this far apart are read together (the extra registers are dropped)
+        max_counts: largest count of one read per register table, TABLES by default
+        """
+        self.dashboard = dashboard
+        self.max_gap = max_gap
+        self.max_counts = {table: count for table, (_, count) in TABLES.items()}
+        self.max_counts.update(max_counts or {})
+        self.tags = {}
+        self.reads = 0                  # 累计读取指令数 Read commands sent so far
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name, table, index, addr, valType='U16', count=1, period=1.0, callback=None, wordOrder='big'):
+        """
+        添加标签，返回 ModbusTag；callback(tag) 在每次读取成功后调用
+        Add a tag and return its ModbusTag. callback(tag) is called after every successful read
+        """
+        tag = ModbusTag(name, table, index, addr, valType, count, period, wordOrder)
+        if callback is not None:
+            tag.callbacks.append(callback)
+        with self._lock:
+            self.tags[name] = tag
+        return tag
+
+    def remove(self, name):
+        with self._lock:
+            self.tags.pop(name, None)
+
+    def subscribe(self, name, callback):
+        self.tags[name].callbacks.append(callback)
+
+    def get(self, name):
+        """
+        标签的最新值（NumPy 数组），尚未读到时为 None
+        Latest value of a tag as a NumPy array, None before the first read
+        """
+        return self.tags[name].value
+
+    def values(self):
+        return {name: tag.value for name, tag in list(self.tags.items())}
+
+    def plan(self, tags):
+        """
+        为一组标签生成读取计划 [(表, 主站索引, 合并区间, [(地址, 数量), ...]), ...]
+        Build the read plan of a set of tags: [(table, master index, merged range, [(addr, count), ...]), ...]
+        """
+        groups = {}
+        for tag in tags:
+            groups.setdefault((tag.table, tag.index), []).append((tag.addr, tag.addr + tag.size))
+        plan = []
+        for (table, index), ranges in sorted(groups.items()):
+            for merged in merge_ranges(ranges, self.max_gap):
+                plan.append((table, index, merged, split_blocks([merged], self.max_counts[table])))
+        return plan
+
+    def poll(self, now=None):
+        """
+        读取所有到期的标签一次，返回本次读取指令数
+        Read every due tag once, returns the number of read commands sent
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [tag for tag in self.tags.values() if tag.nextDue <= now]
+        if not due:
+            return 0
+        plan = self.plan(due)
+        strings = []
+        for table, index, _, blocks in plan:
+            command = TABLES[table][0]
+            strings.extend("{:s}({:d},{:d},{:d})".format(command, index, addr, count) for addr, count in blocks)
+        replies = self.dashboard.sendRecvMsgBatch(strings)
+        self.reads += len(strings)
+
+        # 拼回每个合并区间的原始值 Reassemble the raw values of every merged range
+        ranges = []
+        position = 0
+        for table, index, (start, end), blocks in plan:
+            raw = np.zeros(end - start, dtype=np.uint16)
+            error = None
+            for addr, count in blocks:
+                reply = replies[position] if position < len(replies) else ""
+                position += 1
+                match = _VALUES.match(reply)
+                values = match.group(2).split(',') if match and int(match.group(1)) == 0 else []
+                if len(values) != count:
+                    error = reply or "no reply"
+                    continue
+                raw[addr - start:addr - start + count] = [int(v) for v in values]
+            ranges.append((table, index, start, end, raw, error))
+
+        stamp = time.monotonic()
+        for tag in due:
+            tag.nextDue = now + tag.period
+            start, raw, error = next((start, raw, error) for table, index, start, end, raw, error in ranges
+                                     if (table, index) == (tag.table, tag.index) and
+                                     start <= tag.addr and tag.addr + tag.size <= end)
+            if error is not None:
+                tag.error = error
+                continue
+            tag.value = tag.decode(raw[tag.addr - start:tag.addr - start + tag.size])
+            tag.stamp = stamp
+            tag.error = None
+            for callback in list(tag.callbacks):
+                callback(tag)
+        return len(strings)
+
+    def start(self):
+        """
+        在后台线程中按各标签的周期轮询
+        Poll in a background thread at the period of every tag
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ModbusPoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Modbus poll failed: {e}")
+            with self._lock:
+                nextDue = min((tag.nextDue for tag in self.tags.values()), default=time.monotonic() + 0.1)
+            self._stop.wait(max(0.001, nextDue - time.monotonic()))
+
+
+# 测试代码
+if __name__ == "__main__":
+    class FakeDashboard:
+        def __init__(self):
+            self.registers = np.arange(200, dtype=np.uint16)
+            self.registers[10:12] = np.frombuffer(np.array([3.5], dtype='>f4').tobytes(), dtype='>u2')
+
+        def sendRecvMsgBatch(self, strings):
+            replies = []
+            for string in strings:
+                name, args = string[:-1].split('(')
+                index, addr, count = (int(a) for a in args.split(','))
+                values = ','.join(str(v) for v in self.registers[addr:addr + count])
+                replies.append("0,{%s},%s;" % (values, string))
+            print(strings)
+            return replies
+
+    poller = ModbusPoller(FakeDashboard())
+    poller.add('level', 'hold', 0, 10, 'F32')
+    poller.add('status', 'hold', 0, 12, 'U16', count=2)
+    poller.add('counter', 'hold', 0, 20, 'U32', period=0.5)
+    poller.add('doors', 'coil', 0, 0, count=8)
+    print("reads:", poller.poll())
+    print(poller.values())
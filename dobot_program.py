@@ -0,0 +1,210 @@
+import re
+import numpy as np
+from dobot_encoder import COMMANDS, CommandEncoder
+
+# 批量运动程序
+# Batch motion program
+#
+# MotionProgram 的运动方法与 DobotApiDashboard 同名同参，但只记录指令而不立即下发。
+# validate() 一次性检查全部参数，send() 将指令按块合并为一次写入，并收集每条指令的队列 ID。
+# MotionProgram motion methods have the same names and parameters as DobotApiDashboard, but only record the commands.
+# validate() checks every argument in one pass, send() writes the commands in chunks with one write per chunk
+# and collects the queue id of every command.
+
+# 各指令支持的可选参数 Optional parameters of each command
+MOTION_OPTIONS = {name: options for name, (_, _, options) in COMMANDS.items() if not name.startswith('Servo')}
+
+# 可选参数取值范围（闭区间），a/v 为 (0,100] Ranges of the optional parameters (closed), a/v are (0,100]
+OPTION_RANGES = {
+    'user': (0, 9),
+    'tool': (0, 9),
+    'a': (1, 100),
+    'v': (1, 100),
+    'cp': (0, 100),
+    'speed': (1, 1 << 31),
+    'r': (0, 1 << 31),
+}
+
+
+def parse_queue_id(valueRecv):
+    """
+    从运动指令返回值 "0,{id},MovJ(...);" 中取出队列 ID，失败返回 None
+    Extract the queue id from a motion reply "0,{id},MovJ(...);", returns None on failure
+    """
+    match = re.match(r'\s*(-?\d+)\s*,\s*\{\s*(-?\d+)\s*\}', valueRecv)
+    if match is None or int(match.group(1)) != 0:
+        return None
+    return int(match.group(2))
+
+
+class MotionProgram:
+    """
+    运动指令程序：收集、校验并批量下发
+    Motion command program: collect, validate and send in bulk
+    """
+
+    def __init__(self, precision=6):
+        self.commands = []
+        self.encoder = CommandEncoder(precision)
+
+    def __len__(self):
+        return len(self.commands)
+
+    def clear(self):
+        self.commands = []
+
+    def _add(self, name, points, coordinateMode, extra, options):
+        opts = {}
+        for key in MOTION_OPTIONS[name]:
+            value = options.get(key, -1)
+            if value != -1:
+                opts[key] = value
+        self.commands.append((name, points, coordinateMode, extra, opts))
+        return self
+
+    def MovJ(self, a1, b1, c1, d1, e1, f1, coordinateMode, user=-1, tool=-1, a=-1, v=-1, cp=-1):
+        return self._add('MovJ', ((a1, b1, c1, d1, e1, f1),), coordinateMode, (),
+                         dict(user=user, tool=tool, a=a, v=v, cp=cp))
+
+    def MovL(self, a1, b1, c1, d1, e1, f1, coordinateMode, user=-1, tool=-1, a=-1, v=-1, speed=-1, cp=-1, r=-1):
+        return self._add('MovL', ((a1, b1, c1, d1, e1, f1),), coordinateMode, (),
+                         dict(user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
+
+    def Arc(self, a1, b1, c1, d1, e1, f1, a2, b2, c2, d2, e2, f2, coordinateMode, user=-1, tool=-1, a=-1, v=-1,
+            speed=-1, cp=-1, r=-1):
+        return self._add('Arc', ((a1, b1, c1, d1, e1, f1), (a2, b2, c2, d2, e2, f2)), coordinateMode, (),
+                         dict(user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
+
+    def Circle(self, a1, b1, c1, d1, e1, f1, a2, b2, c2, d2, e2, f2, coordinateMode, count, user=-1, tool=-1,
+               a=-1, v=-1, speed=-1, cp=-1, r=-1):
+        return self._add('Circle', ((a1, b1, c1, d1, e1, f1), (a2, b2, c2, d2, e2, f2)), coordinateMode, (count,),
+                         dict(user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
+
+    def RelMovJTool(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1,
+                    a=-1, v=-1, cp=-1):
+        return self._add('RelMovJTool', ((offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),), None, (),
+                         dict(user=user, tool=tool, a=a, v=v, cp=cp))
+
+    def RelMovLTool(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1,
+                    a=-1, v=-1, speed=-1, cp=-1, r=-1):
+        return self._add('RelMovLTool', ((offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),), None, (),
+                         dict(user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
+
+    def RelMovJUser(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1,
+                    a=-1, v=-1, cp=-1):
+        return self._add('RelMovJUser', ((offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),), None, (),
+                         dict(user=user, tool=tool, a=a, v=v, cp=cp))
+
+    def RelMovLUser(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, user=-1, tool=-1,
+                    a=-1, v=-1, speed=-1, cp=-1, r=-1):
+        return self._add('RelMovLUser', ((offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),), None, (),
+                         dict(user=user, tool=tool, a=a, v=v, speed=speed, cp=cp, r=r))
+
+    def RelJointMovJ(self, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, a=-1, v=-1, cp=-1):
+        return self._add('RelJointMovJ', ((offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz),), None, (),
+                         dict(a=a, v=v, cp=cp))
+
+    def extend(self, name, points, coordinateMode=0, **options):
+        """
+        批量追加同一种单点运动指令，points 为 (n, 6) 数组，options 对所有点生效
+        Append many single-target commands of one kind, points is an (n, 6) array and options apply to every point
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 6)
+        if name not in MOTION_OPTIONS or name in ('Arc', 'Circle'):
+            raise ValueError("extend does not support {:s}".format(name))
+        mode = coordinateMode if name in ('MovJ', 'MovL') else None
+        opts = {key: options[key] for key in MOTION_OPTIONS[name] if options.get(key, -1) != -1}
+        self.commands.extend((name, (tuple(p),), mode, (), opts) for p in points.tolist())
+        return self
+
+    def validate(self):
+        """
+        一次性校验全部指令，返回错误列表 [(序号, 说明), ...]，为空表示全部合法
+        Validate every command in one pass, returns [(index, message), ...], empty when all are valid
+        """
+        errors = []
+        if not self.commands:
+            return errors
+        values = np.array([sum(cmd[1], ()) + (0.0,) * (12 - 6 * len(cmd[1])) for cmd in self.commands])
+        bad = np.flatnonzero(~np.isfinite(values).all(axis=1))
+        for i in bad:
+            errors.append((int(i), "non-finite coordinate"))
+        for i, (name, points, coordinateMode, extra, opts) in enumerate(self.commands):
+            if name in ('MovJ', 'MovL', 'Arc', 'Circle') and coordinateMode not in (0, 1):
+                errors.append((i, "coordinateMode must be 0 or 1"))
+            if name == 'Circle' and not 1 <= extra[0] <= 999:
+                errors.append((i, "count must be in [1, 999]"))
+            for key, value in opts.items():
+                low, high = OPTION_RANGES[key]
+                if not isinstance(value, (int, np.integer)) or not low <= value <= high:
+                    errors.append((i, "{:s}={} out of range [{:d}, {:d}]".format(key, value, low, high)))
+        errors.sort(key=lambda e: e[0])
+        return errors
+
+    def encode(self):
+        """
+        生成全部指令的字节串
+        Build the encoded commands as bytes
+        """
+        encode = self.encoder.encode
+        return [encode(name, sum(points, ()), coordinateMode, extra, **opts)
+                for name, points, coordinateMode, extra, opts in self.commands]
+
+    def send(self, dashboard, chunk_size=50):
+        """
+        校验后按块下发，每块一次写入，返回每条指令的 (返回值, 队列ID)，与 commands 一一对应；校验失败时抛出 ValueError。
+        连接中途断开时停止下发，未确认的指令（含未发送的）为 (None, None)
+        Validate and send in chunks with one write per chunk. Returns (reply, queue id) for every command, in the
+        order of commands. Raises ValueError when validation fails. If the connection drops, sending stops and every
+        unconfirmed (or unsent) command gets (None, None)
+        """
+        errors = self.validate()
+        if errors:
+            raise ValueError("invalid motion program: " + "; ".join(
+                "#{:d} {:s}".format(i, msg) for i, msg in errors[:10]))
+        strings = self.encode()
+        results = []
+        for start in range(0, len(strings), chunk_size):
+            chunk = strings[start:start + chunk_size]
+            replies = dashboard.sendRecvMsgBatch(chunk)
+            results.extend((reply, parse_queue_id(reply)) for reply in replies)
+            if len(replies) < len(chunk):
+                break
+        results.extend((None, None) for _ in range(len(strings) - len(results)))
+        return results
+
+
+# 测试代码
+if __name__ == "__main__":
+    import socket
+    import threading
+    from dobot_api import DobotApiDashboard
+
+    # 第二块发送到一半时断开的 Dashboard：前 5 条有返回值 A dashboard that drops halfway through the second chunk
+    def serve(server, count):
+        conn, _ = server.accept()
+        with conn:
+            buffer = b''
+            while count > 0:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                buffer += data
+                while count > 0 and b')' in buffer:
+                    command, buffer = buffer.split(b')', 1)
+                    conn.sendall(b'0,{%d},%s);' % (count, command))
+                    count -= 1
+
+    server = socket.create_server(("127.0.0.1", 0))
+    threading.Thread(target=serve, args=(server, 5), daemon=True).start()
+    dashboard = DobotApiDashboard("127.0.0.1", server.getsockname()[1], connect=False)
+    dashboard.adopt(socket.create_connection(server.getsockname()))
+    program = MotionProgram()
+    for i in range(8):
+        program.MovJ(100 + i, 0, 200, 0, 0, 0, 0)
+    results = program.send(dashboard, chunk_size=3)
+    print(results)
+    print("aligned:", len(results) == len(program) and all(r == (None, None) for r in results[5:]) and
+          [qid for _, qid in results[:5]] == [5, 4, 3, 2, 1])
+    dashboard.close()
+    server.close()
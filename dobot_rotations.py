@@ -0,0 +1,230 @@
+import numpy as np
+
+# 批量姿态转换：欧拉角 / 四元数 / 旋转矩阵
+# Batch orientation conversion: Euler angles / quaternions / rotation matrices
+#
+# 欧拉角与控制器一致：[rx, ry, rz]，单位度，绕固定轴 X-Y-Z 依次旋转，即 R = Rz * Ry * Rx。
+# 四元数默认标量在前 [w, x, y, z]，scalar_first=False 时为 [x, y, z, w]。
+# 所有函数接受单个值或 (n, 3)/(n, 4)/(n, 3, 3) 数组，可直接用于 MyType 记录切片的字段。
+# Euler angles follow the controller: [rx, ry, rz] in degrees, fixed-axis X-Y-Z, i.e. R = Rz * Ry * Rx.
+# Quaternions are scalar-first [w, x, y, z] by default, [x, y, z, w] with scalar_first=False.
+# Every function accepts a single value or (n, 3)/(n, 4)/(n, 3, 3) arrays, e.g. fields of a MyType recording slice.
+
+
+def _as_array(value, size):
+    value = np.asarray(value, dtype=np.float64)
+    if value.shape[-1] != size:
+        raise ValueError("expected {:d} values in the last dimension".format(size))
+    return value
+
+
+def _to_wxyz(quat, scalar_first):
+    quat = _as_array(quat, 4)
+    return quat if scalar_first else np.roll(quat, 1, axis=-1)
+
+
+def _from_wxyz(quat, scalar_first):
+    return quat if scalar_first else np.roll(quat, -1, axis=-1)
+
+
+def euler_to_matrix(euler):
+    """
+    欧拉角转换为旋转矩阵，(3,) -> (3, 3)，(n, 3) -> (n, 3, 3)
+    Euler angles to rotation matrices, (3,) -> (3, 3), (n, 3) -> (n, 3, 3)
+    """
+    euler = _as_array(euler, 3)
+    rx, ry, rz = np.moveaxis(np.radians(euler), -1, 0)
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+    R = np.empty(euler.shape[:-1] + (3, 3))
+    R[..., 0, 0] = cz * cy
+    R[..., 0, 1] = cz * sy * sx - sz * cx
+    R[..., 0, 2] = cz * sy * cx + sz * sx
+    R[..., 1, 0] = sz * cy
+    R[..., 1, 1] = sz * sy * sx + cz * cx
+    R[..., 1, 2] = sz * sy * cx - cz * sx
+    R[..., 2, 0] = -sy
+    R[..., 2, 1] = cy * sx
+    R[..., 2, 2] = cy * cx
+    return R
+
+
+def matrix_to_euler(R):
+    """
+    旋转矩阵转换为欧拉角，ry=±90° 奇异时令 rz=0
+    Rotation matrices to Euler angles, rz is set to 0 at the ry=±90° singularity
+    """
+    R = np.asarray(R, dtype=np.float64)
+    cy = np.hypot(R[..., 0, 0], R[..., 1, 0])
+    singular = cy < 1e-9
+    ry = np.arctan2(-R[..., 2, 0], cy)
+    rx = np.where(singular, np.arctan2(-R[..., 1, 2], R[..., 1, 1]), np.arctan2(R[..., 2, 1], R[..., 2, 2]))
+    rz = np.where(singular, 0.0, np.arctan2(R[..., 1, 0], R[..., 0, 0]))
+    return np.degrees(np.stack([rx, ry, rz], axis=-1))
+
+
+def euler_to_quat(euler, scalar_first=True):
+    """
+    欧拉角转换为单位四元数，(n, 3) -> (n, 4)
+    Euler angles to unit quaternions, (n, 3) -> (n, 4)
+    """
+    half = np.radians(_as_array(euler, 3)) / 2.0
+    cx, cy, cz = np.moveaxis(np.cos(half), -1, 0)
+    sx, sy, sz = np.moveaxis(np.sin(half), -1, 0)
+    quat = np.stack([cx * cy * cz + sx * sy * sz,
+                     sx * cy * cz - cx * sy * sz,
+                     cx * sy * cz + sx * cy * sz,
+                     cx * cy * sz - sx * sy * cz], axis=-1)
+    return _from_wxyz(quat, scalar_first)
+
+
+def quat_to_matrix(quat, scalar_first=True):
+    """
+    四元数转换为旋转矩阵，输入无需归一化，(n, 4) -> (n, 3, 3)
+    Quaternions (not necessarily normalized) to rotation matrices, (n, 4) -> (n, 3, 3)
+    """
+    w, x, y, z = np.moveaxis(quat_normalize(_to_wxyz(quat, scalar_first)), -1, 0)
+    R = np.empty(w.shape + (3, 3))
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - z * w)
+    R[..., 0, 2] = 2 * (x * z + y * w)
+    R[..., 1, 0] = 2 * (x * y + z * w)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - x * w)
+    R[..., 2, 0] = 2 * (x * z - y * w)
+    R[..., 2, 1] = 2 * (y * z + x * w)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def matrix_to_quat(R, scalar_first=True):
+    """
+    旋转矩阵转换为 w >= 0 的单位四元数（Shepperd 方法），(n, 3, 3) -> (n, 4)
+    Rotation matrices to unit quaternions with w >= 0 (Shepperd's method), (n, 3, 3) -> (n, 4)
+    """
+    R = np.asarray(R, dtype=np.float64)
+    m00, m11, m22 = R[..., 0, 0], R[..., 1, 1], R[..., 2, 2]
+    trace = m00 + m11 + m22
+    # 按最大的对角组合选择分支，避免除以接近 0 的数 Pick the branch with the largest diagonal term
+    case = np.argmax(np.stack([trace, m00, m11, m22], axis=-1), axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s0 = np.sqrt(np.maximum(1.0 + trace, 0.0)) * 2
+        s1 = np.sqrt(np.maximum(1.0 + m00 - m11 - m22, 0.0)) * 2
+        s2 = np.sqrt(np.maximum(1.0 - m00 + m11 - m22, 0.0)) * 2
+        s3 = np.sqrt(np.maximum(1.0 - m00 - m11 + m22, 0.0)) * 2
+        candidates = np.stack([
+            np.stack([s0 / 4, (R[..., 2, 1] - R[..., 1, 2]) / s0,
+                      (R[..., 0, 2] - R[..., 2, 0]) / s0, (R[..., 1, 0] - R[..., 0, 1]) / s0], axis=-1),
+            np.stack([(R[..., 2, 1] - R[..., 1, 2]) / s1, s1 / 4,
+                      (R[..., 0, 1] + R[..., 1, 0]) / s1, (R[..., 0, 2] + R[..., 2, 0]) / s1], axis=-1),
+            np.stack([(R[..., 0, 2] - R[..., 2, 0]) / s2, (R[..., 0, 1] + R[..., 1, 0]) / s2,
+                      s2 / 4, (R[..., 1, 2] + R[..., 2, 1]) / s2], axis=-1),
+            np.stack([(R[..., 1, 0] - R[..., 0, 1]) / s3, (R[..., 0, 2] + R[..., 2, 0]) / s3,
+                      (R[..., 1, 2] + R[..., 2, 1]) / s3, s3 / 4], axis=-1),
+        ], axis=-2)
+    quat = np.take_along_axis(candidates, case[..., None, None], axis=-2)[..., 0, :]
+    quat = np.where(quat[..., :1] < 0, -quat, quat)
+    return _from_wxyz(quat_normalize(quat), scalar_first)
+
+
+def quat_to_euler(quat, scalar_first=True):
+    """
+    四元数转换为欧拉角，(n, 4) -> (n, 3)
+    Quaternions to Euler angles, (n, 4) -> (n, 3)
+    """
+    return matrix_to_euler(quat_to_matrix(quat, scalar_first))
+
+
+def quat_normalize(quat):
+    """
+    四元数归一化
+    Normalize quaternions
+    """
+    quat = _as_array(quat, 4)
+    return quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+
+
+def quat_conjugate(quat, scalar_first=True):
+    """
+    四元数共轭（单位四元数的逆）
+    Quaternion conjugate (the inverse of a unit quaternion)
+    """
+    quat = _to_wxyz(quat, scalar_first) * np.array([1.0, -1.0, -1.0, -1.0])
+    return _from_wxyz(quat, scalar_first)
+
+
+def quat_multiply(q1, q2, scalar_first=True):
+    """
+    四元数乘法 q1 * q2，支持广播
+    Quaternion product q1 * q2 with broadcasting
+    """
+    w1, x1, y1, z1 = np.moveaxis(_to_wxyz(q1, scalar_first), -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(_to_wxyz(q2, scalar_first), -1, 0)
+    quat = np.stack([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2], axis=-1)
+    return _from_wxyz(quat, scalar_first)
+
+
+def slerp(q0, q1, t, scalar_first=True):
+    """
+    四元数球面线性插值，q0/q1 为 (4,) 或 (n, 4)，t 为标量或 (m,) 数组；
+    t 为数组且 q0/q1 为单个四元数时返回 (m, 4)
+    Spherical linear interpolation. q0/q1 are (4,) or (n, 4), t is a scalar or an (m,) array.
+    A single q0/q1 pair with an array t returns (m, 4)
+    """
+    q0 = quat_normalize(_to_wxyz(q0, scalar_first))
+    q1 = quat_normalize(_to_wxyz(q1, scalar_first))
+    t = np.asarray(t, dtype=np.float64)
+    if t.ndim and q0.ndim == 1 and q1.ndim == 1:
+        q0 = np.broadcast_to(q0, t.shape + (4,))
+        q1 = np.broadcast_to(q1, t.shape + (4,))
+    t = t[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    # 取最短路径 Take the short way round
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-9
+    safe = np.where(close, 1.0, sin_theta)
+    w0 = np.where(close, 1.0 - t, np.sin((1.0 - t) * theta) / safe)
+    w1 = np.where(close, t, np.sin(t * theta) / safe)
+    return _from_wxyz(quat_normalize(w0 * q0 + w1 * q1), scalar_first)
+
+
+def angular_distance(q0, q1, scalar_first=True):
+    """
+    两组四元数之间的旋转角，单位度
+    Rotation angle between quaternions, in degrees
+    """
+    q0 = quat_normalize(_to_wxyz(q0, scalar_first))
+    q1 = quat_normalize(_to_wxyz(q1, scalar_first))
+    dot = np.abs(np.sum(q0 * q1, axis=-1))
+    return np.degrees(2.0 * np.arccos(np.clip(dot, 0.0, 1.0)))
+
+
+def euler_distance(e0, e1):
+    """
+    两组欧拉角姿态之间的旋转角，单位度
+    Rotation angle between Euler orientations, in degrees
+    """
+    return angular_distance(euler_to_quat(e0), euler_to_quat(e1))
+
+
+def feedback_euler(frames, field='ToolVectorActual'):
+    """
+    从 MyType 反馈记录（单帧或切片）中取出欧拉角，(n, 3)
+    Euler angles of a MyType feedback frame or slice, (n, 3)
+    """
+    return np.asarray(frames[field], dtype=np.float64)[..., 3:6]
+
+
+def feedback_quat(frames, field='ActualQuaternion'):
+    """
+    从 MyType 反馈记录（单帧或切片）中取出四元数，(n, 4)，控制器顺序为 [w, x, y, z]
+    Quaternions of a MyType feedback frame or slice, (n, 4), in the controller's [w, x, y, z] order
+    """
+    return np.asarray(frames[field], dtype=np.float64)
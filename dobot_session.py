@@ -0,0 +1,127 @@
+import re
+import threading
+
+# Dashboard 会话状态记录与恢复
+# Dashboard session state recording and restore
+#
+# 记录最近一次成功应用的会话设置（SpeedFactor、User/Tool、VelJ/AccJ/VelL/AccL、CP、SetPayload）和
+# ModbusCreate/ModbusRTUCreate 建立的连接，重连后按原顺序重放。重建的 Modbus 连接若得到新的索引，
+# 之后使用旧索引的 Modbus 指令会被自动改写为新索引。
+# Records the last successfully applied session settings (SpeedFactor, User/Tool, VelJ/AccJ/VelL/AccL, CP,
+# SetPayload) and the connections opened by ModbusCreate/ModbusRTUCreate, and replays them in order after a
+# reconnect. If a re-created Modbus connection gets a new index, later Modbus commands that use the old index
+# are rewritten to the new one.
+
+SESSION_SETTINGS = ('SpeedFactor', 'User', 'Tool', 'VelJ', 'AccJ', 'VelL', 'AccL', 'CP', 'SetPayload')
+MODBUS_CREATE = ('ModbusCreate', 'ModbusRTUCreate')
+MODBUS_COMMANDS = ('ModbusClose', 'GetInBits', 'GetInRegs', 'GetCoils', 'SetCoils', 'GetHoldRegs', 'SetHoldRegs')
+
+_OK = re.compile(r'\s*0\s*,')
+_NAME = re.compile(r'\s*(\w+)\s*\(')
+_REPLY_INDEX = re.compile(r'\s*0\s*,\s*\{\s*(-?\d+)')
+_FIRST_ARG = re.compile(r'(\s*\w+\s*\(\s*)(-?\d+)')
+
+
+def _ok(valueRecv):
+    return isinstance(valueRecv, str) and _OK.match(valueRecv) is not None
+
+
+def command_name(string):
+    match = _NAME.match(string)
+    return match.group(1) if match else None
+
+
+def reply_index(valueRecv):
+    """
+    ErrorID 为 0 时返回 "0,{value},..." 中的 value，否则返回 None
+    The value of "0,{value},..." when ErrorID is 0, otherwise None
+    """
+    match = _REPLY_INDEX.match(valueRecv) if isinstance(valueRecv, str) else None
+    return int(match.group(1)) if match else None
+
+
+class SessionState:
+    """
+    Dashboard 会话状态
+    Dashboard session state
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.settings = {}       # 指令名 -> 指令文本，按首次设置的顺序 Command name -> command text
+        self.modbus = {}         # 调用方持有的索引 -> [创建指令, 当前索引] Caller's index -> [create command, live index]
+        self.command_id = None   # 最近一次重连后 GetCurrentCommandID 的结果 Result of GetCurrentCommandID after a reconnect
+
+    def observe(self, string, valueRecv):
+        """
+        根据一条已完成的指令及其返回值更新会话状态
+        Update the session state from a completed command and its reply
+        """
+        name = command_name(string)
+        if name is None:
+            return
+        if name in SESSION_SETTINGS:
+            if _ok(valueRecv):
+                with self._lock:
+                    self.settings[name] = string
+        elif name in MODBUS_CREATE:
+            index = reply_index(valueRecv)
+            if index is not None:
+                with self._lock:
+                    self.modbus[index] = [string, index]
+        elif name == 'ModbusClose':
+            match = _FIRST_ARG.match(string)
+            if match and _ok(valueRecv):
+                with self._lock:
+                    self.modbus.pop(int(match.group(2)), None)
+
+    def translate(self, string):
+        """
+        把 Modbus 指令中调用方持有的索引改写为重连后的当前索引
+        Rewrite the caller's index in a Modbus command to the live index after a reconnect
+        """
+        if not self.modbus:
+            return string
+        name = command_name(string)
+        if name not in MODBUS_COMMANDS:
+            return string
+        match = _FIRST_ARG.match(string)
+        if match is None:
+            return string
+        entry = self.modbus.get(int(match.group(2)))
+        if entry is None or entry[1] == int(match.group(2)):
+            return string
+        return '{:s}{:d}{:s}'.format(match.group(1), entry[1], string[match.end():])
+
+    def replay(self, send):
+        """
+        用 send(string) -> reply 重放全部设置和 Modbus 连接，再读取 GetCurrentCommandID。
+        返回失败的指令列表 [(指令, 返回值), ...]
+        Replay every setting and Modbus connection with send(string) -> reply, then read GetCurrentCommandID.
+        Returns the failed commands as [(command, reply), ...]
+        """
+        with self._lock:
+            settings = list(self.settings.values())
+            modbus = [(index, entry[0]) for index, entry in self.modbus.items()]
+        failed = []
+        for string in settings:
+            valueRecv = send(string)
+            if not _ok(valueRecv):
+                failed.append((string, valueRecv))
+        for index, string in modbus:
+            valueRecv = send(string)
+            live = reply_index(valueRecv)
+            if live is None:
+                failed.append((string, valueRecv))
+                continue
+            with self._lock:
+                if index in self.modbus:
+                    self.modbus[index][1] = live
+        self.command_id = reply_index(send("GetCurrentCommandID()"))
+        return failed
+
+    def clear(self):
+        with self._lock:
+            self.settings.clear()
+            self.modbus.clear()
+            self.command_id = None
@@ -0,0 +1,313 @@
+import socket
+import time
+import random
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from dobot_api import MyType, takeLatestFrame
+
+# 进程外实时反馈
+# Out-of-process realtime feedback
+#
+# FeedbackPublisher 在独立进程中持有 30004 连接，把最新反馈帧和最近 history 帧写入共享内存，
+# 不与 GUI、音频分析争用同一个 GIL。任意数量的本机进程用 SharedFeedback 按名称挂接，
+# 通过顺序锁（seqlock）读取一致的快照，无需经管道复制。
+# FeedbackPublisher owns the 30004 connection in a separate process and writes the newest feedback frame plus
+# the last history frames into shared memory, so it never competes with the GUI or audio analysis for one GIL.
+# Any number of local processes attach by name with SharedFeedback and read consistent snapshots under a seqlock,
+# without copying through pipes.
+#
+# 共享内存布局 Shared memory layout:
+#   HEADER | times: float64[capacity] | frames: MyType[capacity]
+# 写入方先把 seq 加 1（奇数表示写入中），写完帧、时间和 count 后再加 1；读取方在 seq 为偶数且前后一致时接受快照。
+# The writer makes seq odd, writes the frame, time and count, then makes it even again. A reader accepts a snapshot
+# when seq was even and unchanged around the copy.
+
+HEADER = np.dtype([('seq', np.uint64),
+                   ('count', np.uint64),      # 已发布的帧数 Frames published so far
+                   ('capacity', np.uint64),
+                   ('stop', np.uint64),       # 非 0 时发布进程退出 The publisher exits when non-zero
+                   ('connected', np.uint64),
+                   ('reserve', np.uint64, (3,))])
+
+
+def _layout(capacity):
+    times = HEADER.itemsize
+    frames = times + 8 * capacity
+    return times, frames, frames + MyType.itemsize * capacity
+
+
+def _views(buf, capacity):
+    times, frames, _ = _layout(capacity)
+    header = np.ndarray((), dtype=HEADER, buffer=buf)
+    return (header, np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=times),
+            np.ndarray((capacity,), dtype=MyType, buffer=buf, offset=frames))
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # 3.13 之前挂接方也会登记到 resource_tracker，退出时误删共享内存
+        # Before 3.13 attaching processes also register with resource_tracker and unlink the segment on exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except (ImportError, AttributeError, KeyError):
+        pass
+    return shm
+
+
+def _publish(name, ip, port, connectTimeout, backoffBase, backoffMax):
+    """
+    发布进程主循环：连接、接收、取最新帧写入共享内存，断开后按指数退避重连
+    Publisher main loop: connect, receive, write the newest frame to shared memory, reconnect with exponential
+    backoff when the connection drops
+    """
+    shm = _attach(name)
+    header, times, frames = _views(shm.buf, int(np.ndarray((), dtype=HEADER, buffer=shm.buf)['capacity']))
+    capacity = len(frames)
+    buffer = bytearray()
+    attempt = 0
+    try:
+        while not header['stop']:
+            try:
+                sock = socket.create_connection((ip, port), timeout=connectTimeout)
+            except OSError:
+                time.sleep(min(backoffMax, backoffBase * (2 ** attempt)) * random.uniform(0.5, 1.0))
+                attempt += 1
+                continue
+            attempt = 0
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 144000)
+            sock.settimeout(0.5)
+            header['connected'] = 1
+            buffer.clear()
+            try:
+                while not header['stop']:
+                    try:
+                        data = sock.recv(144000)
+                    except socket.timeout:
+                        continue
+                    if not data:
+                        break
+                    buffer += data
+                    frame = takeLatestFrame(buffer)
+                    if frame is None:
+                        continue
+                    count = int(header['count'])
+                    slot = count % capacity
+                    header['seq'] += 1
+                    frames[slot] = frame[0]
+                    times[slot] = time.monotonic()
+                    header['count'] = count + 1
+                    header['seq'] += 1
+            except OSError:
+                pass
+            finally:
+                header['connected'] = 0
+                sock.close()
+    finally:
+        del header, times, frames
+        shm.close()
+
+
+class SharedFeedback:
+    """
+    共享内存反馈读取端，feedBackData() 与 DobotApiFeedBack 兼容
+    Shared memory feedback reader, feedBackData() is compatible with DobotApiFeedBack
+    """
+
+    def __init__(self, name, publisher=None):
+        self.name = name
+        self.publisher = publisher
+        self._shm = _attach(name)
+        capacity = int(np.ndarray((), dtype=HEADER, buffer=self._shm.buf)['capacity'])
+        self._header, self._times, self._frames = _views(self._shm.buf, capacity)
+        self.capacity = capacity
+        self.conditions = None
+        self._evaluated = 0             # 已参与条件求值的帧数 Frames already evaluated by the conditions
+
+    @classmethod
+    def spawn(cls, ip, port=30004, history=64):
+        """
+        启动发布进程并返回挂接到它的读取端，close() 时一并停止发布进程
+        Start a publisher process and return a reader attached to it, close() also stops the publisher
+        """
+        publisher = FeedbackPublisher(ip, port, history).start()
+        return cls(publisher.name, publisher)
+
+    @property
+    def count(self):
+        """
+        已发布的帧数 Frames published so far
+        """
+        return int(self._header['count'])
+
+    def isConnected(self):
+        return bool(self._header['connected'])
+
+    def _read(self, copy):
+        while True:
+            seq = int(self._header['seq'])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            result = copy(int(self._header['count']))
+            if int(self._header['seq']) == seq:
+                return result
+
+    def latest(self):
+        """
+        最新一帧：(形状为 (1,) 的 MyType 数组, 帧序号, time.monotonic() 时间)，尚无帧时返回 None
+        The newest frame: ((1,) MyType array, frame number, time.monotonic() time), None before the first frame
+        """
+        def copy(count):
+            if count == 0:
+                return None
+            slot = (count - 1) % self.capacity
+            return self._frames[slot:slot + 1].copy(), count, float(self._times[slot])
+        return self._read(copy)
+
+    def history(self, n=None):
+        """
+        最近 n 帧（默认全部保留帧），按时间先后排列：(MyType 数组, 时间数组)
+        The last n frames (all kept frames by default), oldest first: (MyType array, times)
+        """
+        def copy(count):
+            size = min(count, self.capacity if n is None else min(n, self.capacity))
+            slots = np.arange(count - size, count) % self.capacity
+            return self._frames[slots], self._times[slots]
+        return self._read(copy)
+
+    def wait_frame(self, after, timeout=None):
+        """
+        等待帧序号大于 after 的新帧，返回 latest() 的结果，超时返回 None
+        Wait for a frame numbered above after and return latest(), None on timeout
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while self.count <= after:
+            if end is not None and time.monotonic() >= end:
+                return None
+            time.sleep(0.001)
+        return self.latest()
+
+    def wait_until(self, condition, timeout=None):
+        """
+        等待反馈满足条件（语法见 dobot_conditions），返回满足条件的那一帧，超时返回 None。
+        保留的历史帧全部参与求值，两次检查之间的帧也不会漏掉
+        Wait until the feedback meets a condition (syntax in dobot_conditions) and return the frame that met it,
+        None on timeout. Every kept history frame is evaluated, so frames between two checks are not missed
+        """
+        from dobot_conditions import FrameConditions
+        if self.conditions is None:
+            self.conditions = FrameConditions()
+            self._evaluated = self.count
+        return self.conditions.wait_until(condition, timeout, self._pumpConditions)
+
+    def _pumpConditions(self):
+        if self.wait_frame(self._evaluated, timeout=0.05) is None:
+            return
+
+        def copy(count):
+            size = min(count - self._evaluated, self.capacity)
+            slots = np.arange(count - size, count) % self.capacity
+            return self._frames[slots], self._times[slots], count
+        frames, times, self._evaluated = self._read(copy)
+        self.conditions.update(frames, times)
+
+    def feedBackData(self):
+        """
+        返回最新反馈帧，尚无帧时返回 None
+        Return the newest feedback frame, None before the first frame
+        """
+        latest = self.latest()
+        return None if latest is None else latest[0]
+
+    def close(self):
+        del self._header, self._times, self._frames
+        self._shm.close()
+        if self.publisher is not None:
+            self.publisher.stop()
+            self.publisher = None
+
+
+class FeedbackPublisher:
+    """
+    在独立进程中读取实时反馈并发布到共享内存
+    Reads the realtime feedback in a separate process and publishes it to shared memory
+    """
+    connectTimeout = 2.0
+    backoffBase = 0.1
+    backoffMax = 5.0
+
+    def __init__(self, ip, port=30004, history=64):
+        self.ip = ip
+        self.port = port
+        self.history = max(1, int(history))
+        self._shm = None
+        self._process = None
+
+    @property
+    def name(self):
+        return None if self._shm is None else self._shm.name
+
+    def start(self):
+        """
+        创建共享内存并启动发布进程，返回自身
+        Create the shared memory and start the publisher process, returns self
+        """
+        self._shm = shared_memory.SharedMemory(create=True, size=_layout(self.history)[2])
+        self._shm.buf[:] = bytes(self._shm.size)
+        header = np.ndarray((), dtype=HEADER, buffer=self._shm.buf)
+        header['capacity'] = self.history
+        del header
+        # spawn：不 fork 带有 Tk/套接字线程的进程，避免子进程继承 fork 时被持有的锁
+        # spawn: never fork a process running Tk/socket threads, the child could inherit locks held at fork time
+        self._process = multiprocessing.get_context('spawn').Process(
+            target=_publish, name=f"DobotFeedback-{self.ip}", daemon=True,
+            args=(self._shm.name, self.ip, self.port, self.connectTimeout, self.backoffBase, self.backoffMax))
+        self._process.start()
+        return self
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self, timeout=2.0):
+        """
+        通知发布进程退出并释放共享内存
+        Ask the publisher process to exit and release the shared memory
+        """
+        if self._shm is None:
+            return
+        header = np.ndarray((), dtype=HEADER, buffer=self._shm.buf)
+        header['stop'] = 1
+        del header
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+        try:
+            # 同一 resource_tracker 下的挂接方可能已注销该段，unlink 前重新登记
+            # A reader sharing our resource_tracker may have unregistered the segment, register it again first
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self._shm._name, 'shared_memory')
+        except (ImportError, AttributeError):
+            pass
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+# 测试代码
+if __name__ == "__main__":
+    feed = SharedFeedback.spawn("192.168.5.1")
+    try:
+        latest = feed.wait_frame(0, timeout=5.0)
+        if latest is None:
+            print("no feedback")
+        else:
+            frame, count, stamp = latest
+            print("frame", count, "RobotMode", frame['RobotMode'][0], "QActual", frame['QActual'][0])
+            frames, times = feed.history(10)
+            print("history", len(frames), np.diff(times) * 1000)
+    finally:
+        feed.close()
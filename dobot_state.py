@@ -0,0 +1,223 @@
+import time
+import threading
+from collections import deque
+
+# 由反馈维护的机器人状态
+# Robot state tracked from the feedback
+#
+# RobotState 每收到一帧反馈更新一次 RobotMode、EnableStatus、RunningStatus、PauseCmdFlag、ErrorStatus、
+# CollisionState 等状态字段，由它们得出 enabled/running/paused/error/collision 标志，
+# 并在变化时发出带主机时间戳的转换事件。读取当前状态只是一次字典/属性访问，不必调用 RobotMode() 等指令。
+# 本模块不导入 NumPy，帧字段用下标读取即可。
+# RobotState updates the status fields (RobotMode, EnableStatus, RunningStatus, PauseCmdFlag, ErrorStatus,
+# CollisionState, ...) on every feedback frame, derives the enabled/running/paused/error/collision flags from them
+# and emits transition events with host timestamps when they change. Reading the current state is a dict or
+# attribute access, no RobotMode() call needed. This module does not import NumPy, frame fields are just indexed.
+
+ROBOT_MODE = {
+    1: "ROBOT_MODE_INIT",
+    2: "ROBOT_MODE_BRAKE_OPEN",
+    3: "",
+    4: "ROBOT_MODE_DISABLED",
+    5: "ROBOT_MODE_ENABLE",
+    6: "ROBOT_MODE_BACKDRIVE",
+    7: "ROBOT_MODE_RUNNING",
+    8: "ROBOT_MODE_RECORDING",
+    9: "ROBOT_MODE_ERROR",
+    10: "ROBOT_MODE_PAUSE",
+    11: "ROBOT_MODE_JOG"
+}
+
+# 跟踪的反馈字段 Feedback fields tracked
+STATE_FIELDS = ('RobotMode', 'EnableStatus', 'RunningStatus', 'PauseCmdFlag', 'ErrorStatus', 'CollisionState',
+                'BrakeStatus', 'DragStatus', 'SafetyState', 'AutoManualMode')
+
+# 派生标志及其置位/复位事件名 Derived flags with the names of their set/clear events
+FLAGS = {
+    'enabled': ('enabled', 'disabled'),
+    'running': ('running', 'stopped'),
+    'paused': ('paused', 'resumed'),
+    'error': ('error', 'error_cleared'),
+    'collision': ('collision', 'collision_cleared'),
+}
+EVENTS = STATE_FIELDS + tuple(name for names in FLAGS.values() for name in names)
+
+_TEST_VALUE = 0x0123456789ABCDEF
+
+
+def _flags(values):
+    mode = values['RobotMode']
+    return {
+        'enabled': bool(values['EnableStatus']) or mode in (5, 6, 7, 8, 10, 11),
+        'running': bool(values['RunningStatus']) or mode == 7,
+        'paused': bool(values['PauseCmdFlag']) or mode == 10,
+        'error': bool(values['ErrorStatus']) or mode == 9,
+        'collision': bool(values['CollisionState']),
+    }
+
+
+class StateEvent:
+    """
+    一次状态转换。name 为字段名（字段变化，old/new 为原值/新值）或标志事件名（如 'error'、'error_cleared'）；
+    stamp 为主机时间 time.monotonic()
+    One state transition. name is a field name (field change, old/new are the previous/new values) or a flag event
+    name (e.g. 'error', 'error_cleared'). stamp is the host time time.monotonic()
+    """
+
+    def __init__(self, name, old, new, stamp):
+        self.name = name
+        self.old = old
+        self.new = new
+        self.stamp = stamp
+
+    def __repr__(self):
+        return "StateEvent({}, {!r} -> {!r}, {:.3f})".format(self.name, self.old, self.new, self.stamp)
+
+
+class RobotState:
+    """
+    由反馈帧更新的机器人状态，update() 由读取反馈的线程调用，读取可在任意线程进行
+    Robot state updated from feedback frames. update() is called by the thread reading the feedback, reads can
+    come from any thread
+
+        state = RobotState()
+        state.on('error', lambda event: print("alarm!", event))
+        state.update(client_feed.feedBackData())
+        state.enabled, state.modeName
+    """
+
+    def __init__(self, history=100):
+        self.values = dict.fromkeys(STATE_FIELDS)   # 各字段当前值，尚无帧时为 None Current value of each field
+        self.flags = dict.fromkeys(FLAGS, False)
+        self.changed = {}               # 各字段/标志最近一次变化的主机时间 Host time of the last change
+        self.stamp = None               # 最新帧的主机时间 Host time of the newest frame
+        self.events = deque(maxlen=history)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def known(self):
+        """
+        是否已收到过反馈 Whether any feedback has been received
+        """
+        return self.stamp is not None
+
+    @property
+    def mode(self):
+        return self.values['RobotMode']
+
+    @property
+    def modeName(self):
+        return ROBOT_MODE.get(self.values['RobotMode'], "")
+
+    @property
+    def enabled(self):
+        return self.flags['enabled']
+
+    @property
+    def running(self):
+        return self.flags['running']
+
+    @property
+    def paused(self):
+        return self.flags['paused']
+
+    @property
+    def error(self):
+        return self.flags['error']
+
+    @property
+    def collision(self):
+        return self.flags['collision']
+
+    def age(self, now=None):
+        """
+        距最新帧的秒数，尚无帧时为 None Seconds since the newest frame, None before the first frame
+        """
+        if self.stamp is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.stamp
+
+    def snapshot(self):
+        return dict(self.values, **self.flags, mode_name=self.modeName, known=self.known)
+
+    def on(self, name, callback):
+        """
+        注册事件回调 callback(StateEvent)，name 为 None 时接收全部事件，返回用于 off() 的句柄
+        Register an event callback callback(StateEvent), name None receives every event. Returns a handle for off()
+        """
+        if name is not None and name not in EVENTS:
+            raise ValueError("unknown state event: {}".format(name))
+        handle = (name, callback)
+        with self._lock:
+            self._listeners.append(handle)
+        return handle
+
+    def off(self, handle):
+        with self._lock:
+            if handle in self._listeners:
+                self._listeners.remove(handle)
+
+    def update(self, frame, stamp=None):
+        """
+        用一帧反馈（形状 (1,) 的 MyType 数组）更新状态，返回本帧产生的事件并分发回调；TestValue 不正确的帧被忽略。
+        第一帧把各字段从 None 更新为当前值，因此同样产生事件（如一连接就处于报警时的 'error'）
+        Update the state from one feedback frame ((1,) MyType array), return the events of this frame and dispatch
+        the callbacks. Frames with a wrong TestValue are ignored. The first frame moves every field from None to its
+        current value, so it produces events as well (e.g. 'error' when already in alarm on connect)
+        """
+        if frame is None or len(frame) == 0 or int(frame['TestValue'][0]) != _TEST_VALUE:
+            return []
+        stamp = time.monotonic() if stamp is None else stamp
+        events = []
+        values = {field: int(frame[field][0]) for field in STATE_FIELDS}
+        for field, value in values.items():
+            if self.values[field] != value:
+                events.append(StateEvent(field, self.values[field], value, stamp))
+                self.changed[field] = stamp
+        self.values = values
+        if events:
+            flags = _flags(values)
+            for flag, value in flags.items():
+                if self.flags[flag] != value:
+                    events.append(StateEvent(FLAGS[flag][0 if value else 1], self.flags[flag], value, stamp))
+                    self.changed[flag] = stamp
+            self.flags = flags
+        self.stamp = stamp
+        if events:
+            self.events.extend(events)
+            self._dispatch(events)
+        return events
+
+    def reset(self):
+        """
+        连接断开后清空状态，下一帧重新产生全部事件
+        Clear the state after a disconnect, the next frame produces every event again
+        """
+        self.values = dict.fromkeys(STATE_FIELDS)
+        self.flags = dict.fromkeys(FLAGS, False)
+        self.stamp = None
+
+    def _dispatch(self, events):
+        with self._lock:
+            listeners = list(self._listeners)
+        for event in events:
+            for name, callback in listeners:
+                if name is None or name == event.name:
+                    callback(event)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import numpy as np
+    from dobot_api import MyType
+
+    frame = np.zeros(1, dtype=MyType)
+    frame['TestValue'] = _TEST_VALUE
+    state = RobotState()
+    state.on('error', lambda event: print("alarm raised", event))
+    for mode, enable, error in [(4, 0, 0), (5, 1, 0), (7, 1, 0), (9, 1, 1), (9, 1, 1), (5, 1, 0)]:
+        frame['RobotMode'], frame['EnableStatus'], frame['ErrorStatus'] = mode, enable, error
+        events = state.update(frame)
+        print(state.modeName, [event.name for event in events])
+    print(state.snapshot())
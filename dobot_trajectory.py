@@ -0,0 +1,298 @@
+import numpy as np
+
+# 关节路径时间最优参数化（TOPP-RA 方法，关节速度/加速度盒约束）
+# Time-optimal parameterization of joint paths (TOPP-RA style, box joint velocity/acceleration limits)
+#
+# 路径 q(s) 在给定的路径点上离散，s 为关节空间累计弧长。状态 x = ṡ²，控制 u = s̈，
+# 相邻网格满足 x[i+1] = x[i] + 2 Δs u[i]。先反向计算每个网格的可控集上界，再正向贪心取最大加速度。
+# The path q(s) is discretized on the given points, s is the cumulative joint-space arc length.
+# The state is x = ṡ², the control u = s̈, with x[i+1] = x[i] + 2 Δs u[i].
+# A backward pass computes the upper bound of each controllable set, a forward pass then picks the largest admissible u.
+
+
+# 重采样后允许的相对超限量，以及为此降低速度上界的最多迭代次数
+# Relative excess allowed after resampling, and the maximum number of passes lowering the speed bounds for it
+LIMIT_TOLERANCE = 0.02
+REFINE_ITERATIONS = 20
+
+
+def _drop_repeats(joints, eps=1e-9):
+    """
+    去除与前一点重合的路径点（零长度段会使 ds=0，梯度出现除零）
+    Remove points that coincide with the previous one (zero-length segments give ds=0 and divide by zero)
+    """
+    delta = np.linalg.norm(np.diff(joints, axis=0), axis=1)
+    return joints[np.concatenate([[True], delta > eps])]
+
+
+def _path_derivatives(joints):
+    delta = np.linalg.norm(np.diff(joints, axis=0), axis=1)
+    s = np.concatenate([[0.0], np.cumsum(delta)])
+    if s[-1] <= 0:
+        raise ValueError("path has zero length")
+    if np.any(delta <= 0):
+        raise ValueError("path has repeated points")
+    dq = np.gradient(joints, s, axis=0)
+    ddq = np.gradient(dq, s, axis=0)
+    return s, dq, ddq
+
+
+def _acceleration_bounds(dq, ddq, amax):
+    """
+    每个网格点上 u 关于 x 的线性上下界：lower_j = al + bl x，upper_j = au + bu x
+    Linear bounds of u in x at each grid point: lower_j = al + bl x, upper_j = au + bu x
+    """
+    eps = 1e-9
+    moving = np.abs(dq) > eps
+    safe = np.where(moving, dq, 1.0)
+    hi = amax / safe
+    lo = -amax / safe
+    slope = -ddq / safe
+    # dq > 0: lo <= u <= hi；dq < 0 时上下界交换
+    al = np.where(dq > 0, lo, hi)
+    au = np.where(dq > 0, hi, lo)
+    al = np.where(moving, al, -np.inf)
+    au = np.where(moving, au, np.inf)
+    bl = np.where(moving, slope, 0.0)
+    bu = np.where(moving, slope, 0.0)
+    return al, bl, au, bu
+
+
+def _max_velocity(dq, ddq, vmax, amax, al, bl, au, bu):
+    """
+    每个网格点 x 的上界：速度约束，以及加速度可行（下界 <= 上界）与 dq≈0 时的 |ddq| x <= amax
+    Upper bound of x at each grid point from the velocity limits and from acceleration feasibility
+    """
+    eps = 1e-9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xmax = np.min(np.where(np.abs(dq) > eps, (vmax / np.abs(dq)) ** 2, np.inf), axis=1)
+        still = np.abs(dq) <= eps
+        cap = np.where(still & (np.abs(ddq) > eps), amax / np.abs(ddq), np.inf)
+        xmax = np.minimum(xmax, np.min(cap, axis=1))
+        # 对每对关节 (j, k)：al_j + bl_j x <= au_k + bu_k x
+        da = au[:, None, :] - al[:, :, None]
+        db = bl[:, :, None] - bu[:, None, :]
+        pair = np.where(db > eps, da / db, np.inf)
+        pair = np.where(np.isnan(pair), np.inf, pair)
+    return np.minimum(xmax, np.min(pair, axis=(1, 2)))
+
+
+class TimeParameterization:
+    """
+    时间参数化结果
+    Result of a time parameterization
+    """
+
+    def __init__(self, joints, s, x, times):
+        self.joints = joints
+        self.s = s
+        self.x = x
+        self.times = times
+        self.duration = float(times[-1])
+        _, self.dq, _ = _path_derivatives(joints)
+
+    def velocities(self):
+        """
+        各路径点的关节速度 (n, 6)，单位度/秒
+        Joint velocities at the path points, (n, 6) in degrees/s
+        """
+        return self.dq * np.sqrt(np.maximum(self.x, 0.0))[:, None]
+
+    def path_position(self, times):
+        """
+        各时刻的路径位置 s(t)。每段内 u 为常数，s 是 t 的二次函数：s = s_i + ṡ_i τ + ½ u_i τ²
+        Path position s(t). u is constant on each segment, so s is quadratic in t: s = s_i + ṡ_i τ + ½ u_i τ²
+        """
+        times = np.clip(np.asarray(times, dtype=np.float64), 0.0, self.duration)
+        i = np.clip(np.searchsorted(self.times, times, side='right') - 1, 0, len(self.times) - 2)
+        ds = np.diff(self.s)
+        u = (self.x[1:] - self.x[:-1]) / (2.0 * ds)
+        tau = times - self.times[i]
+        sd = np.sqrt(np.maximum(self.x[i], 0.0))
+        return np.clip(self.s[i] + sd * tau + 0.5 * u[i] * tau ** 2, self.s[i], self.s[i + 1])
+
+    def joints_at(self, s):
+        """
+        路径位置 s 处的关节角，段内按 dq/ds 做三次 Hermite 插值，与参数化时使用的路径导数一致
+        Joints at path position s, cubic Hermite in each segment using dq/ds, consistent with the path
+        derivatives used by the parameterization
+        """
+        s = np.asarray(s, dtype=np.float64)
+        i = np.clip(np.searchsorted(self.s, s, side='right') - 1, 0, len(self.s) - 2)
+        h = (self.s[i + 1] - self.s[i])[:, None]
+        t = ((s - self.s[i]) / h[:, 0])[:, None]
+        t2, t3 = t * t, t * t * t
+        return ((2 * t3 - 3 * t2 + 1) * self.joints[i] + (t3 - 2 * t2 + t) * h * self.dq[i]
+                + (-2 * t3 + 3 * t2) * self.joints[i + 1] + (t3 - t2) * h * self.dq[i + 1])
+
+    def sample(self, dt=0.008):
+        """
+        按固定周期重采样，返回 (times, joints)，可直接用于 ServoJ(t=dt)
+        Resample at a fixed period, returns (times, joints) ready for ServoJ(t=dt)
+        """
+        times = np.arange(0.0, self.duration + dt * 0.5, dt)
+        times[-1] = min(times[-1], self.duration)
+        return times, self.joints_at(self.path_position(times))
+
+    def _sample_ratios(self, vmax, amax, dt):
+        times, joints = self.sample(dt)
+        vel = np.diff(joints, axis=0) / dt
+        acc = np.diff(vel, axis=0) / dt
+        return times, np.max(np.abs(vel) / vmax, axis=1), np.max(np.abs(acc) / amax, axis=1)
+
+    def check_limits(self, vmax, amax, dt=0.008):
+        """
+        重采样后关节速度/加速度（差分）与限值之比的最大值 (v_ratio, a_ratio)，不超过 1 表示满足限值
+        Largest ratio of the resampled (finite-difference) joint velocity/acceleration to the limits,
+        (v_ratio, a_ratio); values up to 1 mean the limits hold
+        """
+        _, vel, acc = self._sample_ratios(vmax, amax, dt)
+        return (float(vel.max()) if len(vel) else 0.0), (float(acc.max()) if len(acc) else 0.0)
+
+    def segment_ratios(self, breakpoints, vmax, amax):
+        """
+        为 MovJ/MovL 分段建议 v/a 比例（1~100）：各段内关节峰值速度/加速度相对限值的百分比
+        Suggest v/a ratios (1-100) for MovJ/MovL segments: peak joint velocity/acceleration in each
+        segment relative to the limits
+        """
+        vel = np.abs(self.velocities()) / vmax
+        acc = np.abs(np.gradient(self.velocities(), self.times, axis=0)) / amax
+        breakpoints = list(breakpoints)
+        ratios = []
+        for start, end in zip(breakpoints[:-1], breakpoints[1:]):
+            v = float(np.max(vel[start:end + 1]))
+            a = float(np.max(acc[start:end + 1]))
+            ratios.append({'v': int(np.clip(np.ceil(v * 100), 1, 100)),
+                           'a': int(np.clip(np.ceil(a * 100), 1, 100))})
+        return ratios
+
+
+def _integrate(ds, xmax, al, bl, au, bu, start_velocity, end_velocity):
+    """
+    反向计算可控集、正向取最大加速度，返回各网格点的 x 和时间
+    Backward pass over the controllable sets and forward pass with the largest u, returns x and the times
+    """
+    n = len(xmax)
+    # 反向：可控集上界 K[i]，要求存在 u >= lower(x) 使 x + 2Δs u <= K[i+1]
+    K = np.empty(n)
+    K[-1] = min(xmax[-1], end_velocity ** 2)
+    for i in range(n - 2, -1, -1):
+        coef = 1.0 + 2.0 * ds[i] * bl[i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound = (K[i + 1] - 2.0 * ds[i] * al[i]) / coef
+        bound = np.where(np.isfinite(al[i]) & (coef > 1e-12), bound, np.inf)
+        K[i] = min(xmax[i], float(np.min(bound)))
+        if K[i] < 0:
+            raise ValueError("path is not controllable at point {:d}".format(i))
+
+    # 正向：每步取满足可控集的最大 u
+    x = np.empty(n)
+    x[0] = min(start_velocity ** 2, K[0])
+    for i in range(n - 1):
+        upper = float(np.min(au[i] + bu[i] * x[i]))
+        x[i + 1] = min(K[i + 1], x[i] + 2.0 * ds[i] * upper)
+        if x[i + 1] < 0:
+            x[i + 1] = 0.0
+
+    sd = np.sqrt(np.maximum(x, 0.0))
+    with np.errstate(divide='ignore'):
+        dt = np.where(sd[1:] + sd[:-1] > 0, 2.0 * ds / (sd[1:] + sd[:-1]), np.inf)
+    if not np.all(np.isfinite(dt)):
+        raise ValueError("path speed drops to zero inside the path")
+    return x, np.concatenate([[0.0], np.cumsum(dt)])
+
+
+def parameterize(joints, vmax, amax, start_velocity=0.0, end_velocity=0.0, dt=0.008):
+    """
+    计算关节路径的时间最优参数化
+
+    参数：
+        joints (n, 6) 关节路径，单位度
+        vmax, amax 每个关节的速度（度/秒）和加速度（度/秒²）限值，标量或 (6,)
+        start_velocity, end_velocity 起点/终点的路径速度 ṡ
+        dt 下发周期：网格点上的约束在网格点之间（尤其是拐角处）可能略有超出，
+           按 dt 重采样后仍超限的网格点会降低速度上界并重新计算
+    返回 TimeParameterization，path 不可行时抛出 ValueError
+    Compute the time-optimal parameterization of a joint path.
+    joints: (n, 6) joint path in degrees.
+    vmax, amax: per-joint velocity (deg/s) and acceleration (deg/s²) limits, scalar or (6,).
+    start_velocity, end_velocity: path speed ṡ at both ends.
+    dt: streaming period. The constraints hold at the grid points and can be exceeded slightly between them
+    (mostly at corners); grid points still over the limits after resampling at dt get a lower speed bound and
+    the parameterization is recomputed.
+    Returns a TimeParameterization, raises ValueError when the path is infeasible.
+    连续重复的路径点会被去除，TimeParameterization.joints 为去重后的路径
+    Consecutive repeated points are removed, TimeParameterization.joints is the deduplicated path
+    """
+    joints = _drop_repeats(np.asarray(joints, dtype=np.float64))
+    dof = joints.shape[1]
+    vmax = np.broadcast_to(np.asarray(vmax, dtype=np.float64), (dof,))
+    amax = np.broadcast_to(np.asarray(amax, dtype=np.float64), (dof,))
+    s, dq, ddq = _path_derivatives(joints)
+    ds = np.diff(s)
+    n = len(s)
+    al, bl, au, bu = _acceleration_bounds(dq, ddq, amax)
+    xmax = _max_velocity(dq, ddq, vmax, amax, al, bl, au, bu)
+
+    for _ in range(REFINE_ITERATIONS):
+        x, times = _integrate(ds, xmax, al, bl, au, bu, start_velocity, end_velocity)
+        result = TimeParameterization(joints, s, x, times)
+        sample_times, _, acc = result._sample_ratios(vmax, amax, dt)
+        over = np.flatnonzero(acc > 1.0 + LIMIT_TOLERANCE)
+        if len(over) == 0:
+            break
+        # 差分加速度 acc[k] 用到 t[k]..t[k+2]，降低这段时间覆盖的网格点的速度上界（加速度约与 ṡ² 成正比）
+        for k in over:
+            first = max(np.searchsorted(times, sample_times[k], side='right') - 1, 0)
+            last = min(np.searchsorted(times, sample_times[k + 2], side='left'), n - 1)
+            xmax[first:last + 1] = np.minimum(xmax[first:last + 1], x[first:last + 1] / acc[k])
+    return result
+
+
+def send_servoj(dashboard, parameterization, dt=0.008, aheadtime=-1.0, gain=-1.0):
+    """
+    按 dt 周期以 ServoJ 下发重采样后的关节路径
+    Stream the resampled joint path with ServoJ at a period of dt
+    """
+    import time
+    _, joints = parameterization.sample(dt)
+    next_time = time.perf_counter()
+    for point in joints:
+        dashboard.ServoJ(*point, t=dt, aheadtime=aheadtime, gain=gain)
+        next_time += dt
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def send_movj(dashboard, parameterization, breakpoints, vmax, amax, cp=-1):
+    """
+    以 MovJ 下发各分段终点，每段使用 segment_ratios 建议的 a/v 比例
+    Send the end point of each segment with MovJ, using the a/v ratios suggested by segment_ratios
+    """
+    breakpoints = list(breakpoints)
+    ratios = parameterization.segment_ratios(breakpoints, vmax, amax)
+    results = []
+    for end, ratio in zip(breakpoints[1:], ratios):
+        point = parameterization.joints[end]
+        results.append(dashboard.MovJ(*point, 1, a=ratio['a'], v=ratio['v'], cp=cp))
+    return results
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    t = np.linspace(0.0, 1.0, 400)
+    path = np.column_stack([60 * np.sin(2 * np.pi * t), 40 * t, -30 * np.cos(np.pi * t),
+                            20 * t ** 2, 10 * np.sin(4 * np.pi * t), 5 * t])
+    corner = np.vstack([np.linspace([0] * 6, [50, 0, 0, 0, 0, 0], 100),
+                        np.linspace([50, 0, 0, 0, 0, 0], [50, 50, 0, 0, 0, 0], 100)[1:]])
+    for name, joints in (("curve", path), ("corner", corner), ("repeated point", np.insert(path, 100, path[100], 0))):
+        start = time.perf_counter()
+        result = parameterize(joints, 90.0, 200.0)
+        elapsed = (time.perf_counter() - start) * 1000
+        v_ratio, a_ratio = result.check_limits(90.0, 200.0)
+        print("{}: {:.3f} s, {:.1f} ms, v/vmax {:.3f}, a/amax {:.3f} ({})".format(
+            name, result.duration, elapsed, v_ratio, a_ratio,
+            "ok" if max(v_ratio, a_ratio) <= 1.0 + LIMIT_TOLERANCE else "over limit"))
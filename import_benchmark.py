@@ -0,0 +1,100 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# 导入耗时基准
+# Import time benchmark
+#
+# 每个模块在全新的解释器中导入 repeat 次，报告最短/中位耗时，以及 NumPy、librosa、pygame、告警表等重依赖是否被加载。
+# --detail 用 python -X importtime 列出某个模块自身耗时最多的子模块。
+# Every module is imported repeat times, each in a fresh interpreter. Reports the best/median time and whether the
+# heavy dependencies (NumPy, librosa, pygame, the alarm tables) got loaded. --detail lists the submodules with the
+# largest self time of one module using python -X importtime.
+#
+#     python import_benchmark.py
+#     python import_benchmark.py --detail dobot_api
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEMO = os.path.join(ROOT, "music_dance_demo")
+
+TARGETS = ['dobot_api', 'dobot_connect', 'dobot_fleet', 'ui', 'demo:main', 'demo:robot_controller']
+HEAVY = ['numpy', 'librosa', 'pygame', 'scipy', 'tkinter', 'files.alarmController']
+
+_PROBE = """
+import sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print('%f|%s' % (elapsed, ','.join(name for name in {heavy!r} if name in sys.modules)))
+"""
+
+
+def _split(target):
+    if target.startswith('demo:'):
+        return target[5:], [DEMO, ROOT]
+    return target, [ROOT]
+
+
+def measure(target, repeat=5):
+    """
+    返回 (各次耗时列表, 已加载的重依赖)，导入失败时返回 (None, 错误信息)
+    Returns (times of each run, heavy dependencies loaded), or (None, error message) when the import fails
+    """
+    module, paths = _split(target)
+    code = _PROBE.format(paths=paths, module=module, heavy=HEAVY)
+    times = []
+    loaded = ''
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        elapsed, loaded = result.stdout.strip().splitlines()[-1].split('|')
+        times.append(float(elapsed))
+    return sorted(times), loaded
+
+
+def detail(target, top=15):
+    """
+    用 -X importtime 列出自身耗时最多的 top 个模块
+    List the top modules by self time with -X importtime
+    """
+    module, paths = _split(target)
+    code = "import sys; sys.path[:0] = {!r}; import {}".format(paths, module)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=ROOT)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(selfTime), int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for selfTime, cumulative, name in rows[:top]:
+        print(f"{selfTime / 1000:9.1f} {cumulative / 1000:9.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark')
+    parser.add_argument('targets', nargs='*', default=TARGETS,
+                        help='modules to import, demo:<name> for modules in music_dance_demo')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--detail', type=str, default=None, help='show -X importtime details of one module')
+    args = parser.parse_args()
+
+    if args.detail:
+        detail(args.detail)
+        return
+    print(f"{'module':<24} {'best ms':>8} {'median ms':>10}  heavy dependencies loaded")
+    for target in args.targets:
+        times, loaded = measure(target, args.repeat)
+        if times is None:
+            print(f"{target:<24} {'failed':>8} {'':>10}  {loaded}")
+            continue
+        print(f"{target:<24} {times[0] * 1000:8.1f} {times[len(times) // 2] * 1000:10.1f}  {loaded or '-'}")
+
+
+if __name__ == "__main__":
+    main()
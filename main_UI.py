@@ -1,6 +1,7 @@
 from ui import RobotUI
 
-robot_ui = RobotUI()
+if __name__ == "__main__":
+    robot_ui = RobotUI()
 
-robot_ui.pack()
-robot_ui.mainloop()
+    robot_ui.pack()
+    robot_ui.mainloop()
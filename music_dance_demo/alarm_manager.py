@@ -14,10 +14,11 @@ class AlarmManager:
     def __init__(self):
         self.controller_alarms = {}
         self.servo_alarms = {}
-        self.load_alarm_definitions()
+        self.loaded = False  # 报警定义在第一次查询时加载
         
     def load_alarm_definitions(self):
-        """加载报警定义文件"""
+        """加载报警定义文件（约 0.9 MB 的 JSON），由第一次查询触发"""
+        self.loaded = True
         try:
             # 使用dobot_api提供的函数加载报警文件
             controller_data, servo_data = alarmAlarmJsonFile()
@@ -100,6 +101,8 @@ class AlarmManager:
         返回:
             包含 description, cause, solution 的字典
         """
+        if not self.loaded:
+            self.load_alarm_definitions()
         alarm_dict = self.servo_alarms if is_servo else self.controller_alarms
         
         if alarm_id in alarm_dict:
@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+# 分析结果格式版本，分析算法变化时加 1，旧缓存自动失效
+ANALYSIS_VERSION = 1
+
+# 缓存的数组及其存储类型
+ARRAY_FIELDS = {
+    'beat_times': np.float32,
+    'onset_times': np.float32,
+    'rms_energy': np.float32,
+    'spectral_centroids': np.float32,
+}
+
+
+def file_digest(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """按文件内容计算摘要（BLAKE2b，128 位）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    音乐分析结果的磁盘缓存：每个条目是一个 float32 的 .npz 文件，
+    文件名由音乐文件内容摘要和分析参数共同决定，文件改动或参数变化都会得到新的条目。
+    总大小超过 max_bytes 时按最近使用时间（文件修改时间）淘汰最旧的条目。
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'analysis')
+        self.max_bytes = max_bytes
+        self._digests = {}  # (路径, 大小, 修改时间) -> 内容摘要，文件未变时不必重新计算
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(file_path)
+            with self._lock:
+                self._digests[key] = digest
+        return digest
+
+    def entry_path(self, file_path: str, params: dict) -> str:
+        """缓存条目路径：内容摘要 + 参数摘要"""
+        text = json.dumps(dict(params, version=ANALYSIS_VERSION), sort_keys=True)
+        param_digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.directory, f"{self.digest(file_path)}-{param_digest}.npz")
+
+    def load(self, file_path: str, params: dict) -> Optional[Dict]:
+        """读取缓存的分析结果，未命中或条目损坏时返回 None"""
+        entry = self.entry_path(file_path, params)
+        try:
+            with np.load(entry) as data:
+                result = {name: data[name] for name in ARRAY_FIELDS}
+                result['tempo'] = float(data['tempo'])
+                result['sr'] = int(data['sr'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"分析缓存条目损坏，已删除: {entry} ({e})")
+            self._remove(entry)
+            return None
+        try:
+            os.utime(entry)  # 记录最近使用时间
+        except OSError:
+            pass
+        return result
+
+    def store(self, file_path: str, params: dict, result: Dict) -> str:
+        """写入分析结果（先写临时文件再原子替换），随后按大小上限淘汰旧条目"""
+        entry = self.entry_path(file_path, params)
+        arrays = {name: np.asarray(result[name], dtype=dtype) for name, dtype in ARRAY_FIELDS.items()}
+        temp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # 新版 librosa 的 tempo 是形状 (1,) 的数组
+        tempo = float(np.ravel(result['tempo'])[0])
+        with open(temp, 'wb') as f:
+            np.savez(f, tempo=np.float64(tempo), sr=np.int64(result['sr']), **arrays)
+        os.replace(temp, entry)
+        self.evict()
+        return entry
+
+    def contains(self, file_path: str, params: dict) -> bool:
+        return os.path.exists(self.entry_path(file_path, params))
+
+    def entries(self):
+        """[(路径, 大小, 修改时间), ...]，按修改时间从旧到新"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """淘汰最久未使用的条目直到总大小不超过 max_bytes，返回删除的条目数"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        return removed
+
+    def clear(self):
+        self.evict(0)
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+# 测试代码
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as folder:
+        music = os.path.join(folder, 'song.mp3')
+        with open(music, 'wb') as f:
+            f.write(os.urandom(3_500_000))
+        cache = AnalysisCache(os.path.join(folder, 'cache'), max_bytes=300_000)
+        params = {'sample_rate': 22050, 'hop_length': 512}
+        print("miss:", cache.load(music, params))
+        result = {'tempo': 123.0, 'sr': 22050, 'beat_times': np.arange(0, 240, 0.5),
+                  'onset_times': np.arange(0, 240, 0.25), 'rms_energy': np.random.rand(10336),
+                  'spectral_centroids': np.random.rand(10336) * 5000}
+        cache.store(music, params, result)
+        start = time.perf_counter()
+        cached = cache.load(music, params)
+        print(f"hit: {(time.perf_counter() - start) * 1000:.2f} ms, tempo {cached['tempo']}, "
+              f"{len(cached['beat_times'])} beats, size {cache.size()} bytes")
+        for hop in (256, 1024, 2048):
+            cache.store(music, dict(params, hop_length=hop), result)
+        print("entries after eviction:", len(cache.entries()), "size", cache.size())
@@ -1,126 +1,307 @@
 import numpy as np
 import threading
 import queue
-import librosa
-import pygame
-from scipy import signal
+from streaming_analysis import StreamingAnalysis, warm_up
+
+
+# librosa 导入耗时较长（约 1~2 秒），只在加载/分析音乐时导入
+def _librosa():
+    import librosa
+    return librosa
+
+
+# pygame 只在播放时需要，分析进程（MusicIndexer）导入本模块时不加载 pygame
+def _mixer():
+    import pygame
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+    return pygame.mixer
+
+
+# 逐帧特征表的字段：时间、RMS、归一化 RMS、是否靠近节拍、节拍强度（RMS，靠近节拍时 ×1.5，截断到 [0, 1]）、频段
+FEATURE_TYPE = np.dtype([('time', np.float32),
+                         ('rms', np.float32),
+                         ('rms_norm', np.float32),
+                         ('on_beat', np.bool_),
+                         ('strength', np.float32),
+                         ('band', np.uint8)])
+# 频谱质心频段：< 2000 Hz 为 low，< 4000 Hz 为 mid，其余为 high
+BANDS = ('low', 'mid', 'high')
+BAND_EDGES = (2000.0, 4000.0)
+BEAT_WINDOW = 0.05  # 距节拍不超过该秒数视为"在节拍上"
+STREAM_READY_TIMEOUT = 5.0  # 流式分析时 load_music 等待开头几秒分析完成的时间上限（秒）
+
+
+def analyze_signal(y, sr, frame_size=2048, hop_length=512):
+    """分析音频信号：节拍、起音、RMS 和频谱质心，返回结果字典（可存入 AnalysisCache）"""
+    librosa = _librosa()
+    tempo, beat_frames = librosa.beat.beat_track(
+        y=y, 
+        sr=sr, 
+        hop_length=hop_length
+    )
+    
+    beat_times = librosa.frames_to_time(
+        beat_frames, 
+        sr=sr, 
+        hop_length=hop_length
+    )
+    
+    onset_envelope = librosa.onset.onset_strength(
+        y=y, 
+        sr=sr, 
+        hop_length=hop_length
+    )
+    onset_times = librosa.onset.onset_detect(
+        onset_envelope=onset_envelope,
+        sr=sr,
+        hop_length=hop_length,
+        units='time'
+    )
+    
+    rms_energy = librosa.feature.rms(
+        y=y, 
+        frame_length=frame_size, 
+        hop_length=hop_length
+    )[0]
+    
+    spectral_centroids = librosa.feature.spectral_centroid(
+        y=y, 
+        sr=sr, 
+        hop_length=hop_length
+    )[0]
+    return {'tempo': tempo, 'sr': sr, 'beat_frames': beat_frames, 'beat_times': beat_times,
+            'onset_times': onset_times, 'rms_energy': rms_energy, 'spectral_centroids': spectral_centroids}
+
+
+def analyze_file(file_path, sample_rate=22050, frame_size=2048, hop_length=512):
+    """解码并分析音乐文件，可在子进程中调用（不需要 pygame）"""
+    y, sr = _librosa().load(file_path, sr=sample_rate)
+    return analyze_signal(y, sr, frame_size, hop_length)
 
 
 class AudioAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None, streaming=False):
+        """
+        cache: AnalysisCache，命中时跳过解码和分析
+        streaming: 边解码边分析，开头几秒分析完即可播放，其余部分在后台继续分析并逐步更新特征表
+        """
+        self.cache = cache
+        self.streaming = streaming
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        self._stream_started = False  # load_music 已开始播放流式分析的结果（之后的错误由分析线程处理）
         self.sample_rate = 22050
         self.frame_size = 2048
         self.hop_length = 512
         self.tempo = 120
-        self.beat_times = []
-        self.onset_times = []
+        self.beat_times = np.zeros(0)
+        self.onset_times = np.zeros(0)
+        self.features = np.zeros(0, dtype=FEATURE_TYPE)
         self.energy_history = []
         self.is_playing = False
         self.current_time = 0
         self.audio_queue = queue.Queue()
         
-        pygame.mixer.init()
+        _mixer()
+        if streaming:
+            threading.Thread(target=warm_up, args=(self.sample_rate, self.hop_length), daemon=True).start()
+    
+    def analysis_params(self):
+        """影响分析结果的参数，作为缓存键的一部分"""
+        return {'sample_rate': self.sample_rate, 'frame_size': self.frame_size, 'hop_length': self.hop_length}
+    
+    def analysis_result(self):
+        return {'tempo': self.tempo, 'sr': self.sr, 'beat_times': self.beat_times, 'onset_times': self.onset_times,
+                'rms_energy': self.rms_energy, 'spectral_centroids': self.spectral_centroids}
+    
+    def apply_result(self, result):
+        """使用已有的分析结果（如来自缓存或分析进程）"""
+        self.sr = result['sr']
+        self.tempo = result['tempo']
+        self.beat_times = result['beat_times']
+        self.onset_times = result['onset_times']
+        self.rms_energy = result['rms_energy']
+        self.spectral_centroids = result['spectral_centroids']
+        self.build_feature_table()
     
     def load_music(self, file_path):
         try:
-            self.y, self.sr = librosa.load(file_path, sr=self.sample_rate)
-            self.analyze_audio()
-            pygame.mixer.music.load(file_path)
+            self._cancel_stream()
+            params = self.analysis_params()
+            cached = self.cache.load(file_path, params) if self.cache is not None else None
+            if cached is not None:
+                self.y = None
+                self.apply_result(cached)
+            elif self.streaming and self._stream_music(file_path):
+                self.y = None
+            else:
+                self.y, self.sr = _librosa().load(file_path, sr=self.sample_rate)
+                self.analyze_audio()
+                if self.cache is not None:
+                    self.cache.store(file_path, params, self.analysis_result())
+            _mixer().music.load(file_path)
             return True
         except Exception as e:
             print(f"Error loading music: {e}")
             return False
     
+    def _stream_music(self, file_path):
+        """
+        开始流式分析，开头几秒分析完成后返回 True；解码器不支持该文件（或缺少 soxr）时返回 False，改为整首分析。
+        开始播放后才出错时在分析线程中改为离线分析（见 _on_stream_error）。
+        分析完成后结果不写入缓存（由 MusicIndexer 的离线分析写入）
+        """
+        stream = StreamingAnalysis(file_path, self.sample_rate, self.frame_size, self.hop_length)
+        stream.on_update = lambda result: self._on_stream_update(stream, result)
+        stream.on_error = lambda error: self._on_stream_error(stream, error)
+        with self._stream_lock:
+            self._stream = stream
+            self._stream_started = False
+        stream.start()
+        if not stream.wait_ready(STREAM_READY_TIMEOUT):
+            print(f"音乐分析较慢，{STREAM_READY_TIMEOUT:.0f} 秒内未完成开头部分，先开始播放")
+        with self._stream_lock:
+            if stream.error is not None:
+                print(f"流式分析失败，改为整首分析: {stream.error}")
+                self._stream = None
+                return False
+            self._stream_started = True
+        if not stream.ready.is_set():
+            self.apply_result(stream.result())
+        return True
+    
+    def _on_stream_update(self, stream, result):
+        # 已切换到其它音乐时丢弃旧的结果
+        if stream is self._stream:
+            self.apply_result(result)
+    
+    def _on_stream_error(self, stream, error):
+        """流式分析在开始播放后出错：记录错误并在分析线程中整首分析，替换已有的部分结果"""
+        with self._stream_lock:
+            if stream is not self._stream or not self._stream_started:
+                # 已切换音乐，或 load_music 仍在等待开头部分（由它改为整首分析）
+                return
+        print(f"流式分析失败，改为整首分析: {error}")
+        try:
+            result = analyze_file(stream.file_path, self.sample_rate, self.frame_size, self.hop_length)
+        except Exception as e:
+            print(f"整首分析失败: {e}")
+            return
+        if stream is self._stream:
+            self.apply_result(result)
+            if self.cache is not None:
+                self.cache.store(stream.file_path, self.analysis_params(), self.analysis_result())
+    
+    def _cancel_stream(self):
+        if self._stream is not None:
+            self._stream.cancel()
+            self._stream = None
+    
+    def is_analyzing(self):
+        """流式分析是否仍在进行（特征表只覆盖已分析的部分）"""
+        return self._stream is not None and not self._stream.done.is_set()
+    
     def analyze_audio(self):
-        self.tempo, self.beat_frames = librosa.beat.beat_track(
-            y=self.y, 
-            sr=self.sr, 
-            hop_length=self.hop_length
-        )
-        
-        self.beat_times = librosa.frames_to_time(
-            self.beat_frames, 
-            sr=self.sr, 
-            hop_length=self.hop_length
-        )
-        
-        onset_envelope = librosa.onset.onset_strength(
-            y=self.y, 
-            sr=self.sr, 
-            hop_length=self.hop_length
-        )
-        self.onset_times = librosa.onset.onset_detect(
-            onset_envelope=onset_envelope,
-            sr=self.sr,
-            hop_length=self.hop_length,
-            units='time'
-        )
-        
-        self.rms_energy = librosa.feature.rms(
-            y=self.y, 
-            frame_length=self.frame_size, 
-            hop_length=self.hop_length
-        )[0]
-        
-        self.spectral_centroids = librosa.feature.spectral_centroid(
-            y=self.y, 
-            sr=self.sr, 
-            hop_length=self.hop_length
-        )[0]
+        result = analyze_signal(self.y, self.sr, self.frame_size, self.hop_length)
+        self.beat_frames = result['beat_frames']
+        self.apply_result(result)
+    
+    def build_feature_table(self):
+        """按 hop_length 对齐预先计算逐帧特征表，播放时的查询只需下标访问或 searchsorted"""
+        self.beat_times = np.asarray(self.beat_times, dtype=np.float64)
+        count = min(len(self.rms_energy), len(self.spectral_centroids))
+        table = np.zeros(count, dtype=FEATURE_TYPE)
+        table['time'] = np.arange(count) * self.hop_length / self.sr
+        rms = np.asarray(self.rms_energy[:count], dtype=np.float32)
+        table['rms'] = rms
+        peak = rms.max() if count else 0.0
+        table['rms_norm'] = rms / peak if peak > 0 else 0.0
+        table['on_beat'] = self._near_beat(table['time'].astype(np.float64))
+        table['strength'] = np.clip(rms * np.where(table['on_beat'], 1.5, 1.0), 0, 1)
+        table['band'] = np.searchsorted(BAND_EDGES, self.spectral_centroids[:count], side='right')
+        self.features = table
+    
+    def _near_beat(self, times):
+        """times 中每个时间是否距最近的节拍不超过 BEAT_WINDOW 秒（searchsorted 查相邻两个节拍）"""
+        times = np.asarray(times, dtype=np.float64)
+        beats = self.beat_times
+        if len(beats) == 0:
+            return np.zeros(times.shape, dtype=bool)
+        index = np.searchsorted(beats, times)
+        after = np.abs(beats[np.minimum(index, len(beats) - 1)] - times)
+        before = np.abs(times - beats[np.maximum(index - 1, 0)])
+        return np.minimum(before, after) < BEAT_WINDOW
+    
+    def _frame_at(self, current_time):
+        """当前时间对应的特征表行号，超出范围时返回 None"""
+        frame_idx = int(current_time * self.sr / self.hop_length)
+        if frame_idx < 0 or frame_idx >= len(self.features):
+            return None
+        return frame_idx
+    
+    def get_position(self):
+        """当前播放位置（秒）"""
+        return _mixer().music.get_pos() / 1000.0
+    
+    def next_beat(self, current_time=None):
+        """current_time（默认当前播放位置）之后的第一个节拍时间，没有更多节拍时返回 None"""
+        current_time = self.get_position() if current_time is None else current_time
+        index = np.searchsorted(self.beat_times, current_time, side='right')
+        return float(self.beat_times[index]) if index < len(self.beat_times) else None
+    
+    def iter_beats(self, start=None, lead=0.0):
+        """
+        从 start（默认当前播放位置）起依次产生 (节拍时间, 该帧特征) 供提前安排动作；
+        lead 为提前量，时间早于 start + lead 的节拍跳过
+        """
+        start = self.get_position() if start is None else start
+        index = int(np.searchsorted(self.beat_times, start + lead, side='left'))
+        while index < len(self.beat_times):
+            beat_time = float(self.beat_times[index])
+            frame_idx = self._frame_at(beat_time)
+            yield beat_time, (self.features[frame_idx] if frame_idx is not None else None)
+            index += 1
     
     def get_current_beat_strength(self):
         if not self.is_playing:
             return 0.0
         
-        current_time = pygame.mixer.music.get_pos() / 1000.0
-        
-        frame_idx = int(current_time * self.sr / self.hop_length)
-        if frame_idx >= len(self.rms_energy):
+        current_time = self.get_position()
+        frame_idx = self._frame_at(current_time)
+        if frame_idx is None:
             return 0.0
         
-        current_energy = self.rms_energy[frame_idx]
-        
-        is_beat = any(abs(current_time - beat_time) < 0.05 for beat_time in self.beat_times)
-        
-        beat_strength = current_energy
-        if is_beat:
+        beat_strength = float(self.features['rms'][frame_idx])
+        if self._near_beat(current_time):
             beat_strength *= 1.5
         
-        return float(np.clip(beat_strength, 0, 1))
+        return min(max(beat_strength, 0.0), 1.0)
     
     def get_current_frequency_profile(self):
         if not self.is_playing:
             return "low"
         
-        current_time = pygame.mixer.music.get_pos() / 1000.0
-        frame_idx = int(current_time * self.sr / self.hop_length)
-        
-        if frame_idx >= len(self.spectral_centroids):
+        frame_idx = self._frame_at(self.get_position())
+        if frame_idx is None:
             return "low"
         
-        centroid = self.spectral_centroids[frame_idx]
-        
-        if centroid < 2000:
-            return "low"
-        elif centroid < 4000:
-            return "mid"
-        else:
-            return "high"
+        return BANDS[self.features['band'][frame_idx]]
     
     def play(self):
-        pygame.mixer.music.play()
+        _mixer().music.play()
         self.is_playing = True
     
     def pause(self):
-        pygame.mixer.music.pause()
+        _mixer().music.pause()
         self.is_playing = False
     
     def stop(self):
-        pygame.mixer.music.stop()
+        _mixer().music.stop()
         self.is_playing = False
     
     def set_volume(self, volume):
-        pygame.mixer.music.set_volume(volume)
+        _mixer().music.set_volume(volume)
     
     def get_tempo(self):
         return self.tempo
@@ -129,5 +310,4 @@ class AudioAnalyzer:
         if not self.is_playing:
             return False
         
-        current_time = pygame.mixer.music.get_pos() / 1000.0
-        return any(abs(current_time - beat_time) < 0.05 for beat_time in self.beat_times)
\ No newline at end of file
+        return bool(self._near_beat(self.get_position()))
\ No newline at end of file
@@ -10,6 +10,13 @@ class Config:
             "music_folder": os.path.join(os.path.dirname(__file__), "music"),
             "default_speed": 50,
             "default_volume": 0.7,
+            "local_ik": False,  # True 使用本地运动学模型离线逆解，False 使用控制器 InverseKin
+            "max_queued_motions": 3,  # 控制器运动队列中最多保留的指令数，其余在主机侧缓存
+            "feedback_process": False,  # True 在独立进程中读取实时反馈并经共享内存发布
+            "connect_timeout": 3.0,  # 连接 Dashboard/反馈端口并收到第一帧反馈的时间上限（秒）
+            "analysis_cache_mb": 200,  # 音乐分析缓存（music_dance_demo/cache/analysis）的大小上限，0 表示不使用缓存
+            "streaming_analysis": True,  # 边解码边分析，开头几秒分析完即开始播放（未命中缓存时）
+            "indexer_workers": 0,  # 后台分析音乐库的进程数，0 表示按 CPU 核数自动选择（最多 4 个）
             "home_position": {
                 "joints": [0, 45, 45, 0, 90, 0],  # J1-J6的角度
                 "description": "机器人初始位置（关节角度）"
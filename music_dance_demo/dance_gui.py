@@ -5,6 +5,7 @@ import time
 import threading
 from datetime import datetime
 from config import Config
+from music_indexer import MusicIndexer, FAILED
 
 
 class DanceGUI:
@@ -25,6 +26,14 @@ class DanceGUI:
         self.current_move_name = "未开始"  # 当前舞蹈动作名称
         self.move_count = 0  # 已执行动作计数
         self.dance_start_time = None  # 舞蹈开始时间
+        self._alarm_error = None  # 报警显示对应的反馈报警状态
+        
+        # 使用分析缓存时在后台进程中预先分析整个音乐库，播放时直接命中缓存
+        self.indexer = None
+        if getattr(self.audio, 'cache', None) is not None:
+            self.indexer = MusicIndexer(self.audio.cache, self.audio.analysis_params(),
+                                        self.config.get("indexer_workers", 0), on_progress=self._on_index_progress)
+        self._play_request = 0  # 每次点击播放加一，等待分析期间只有最近一次请求会开始播放
         
         self._create_widgets()
         self._load_default_music()
@@ -45,6 +54,8 @@ class DanceGUI:
             self._update_music_list()
             if self.music_files:
                 self._log_status(f"已从 {folder} 加载 {len(self.music_files)} 个音乐文件")
+                if self.indexer is not None:
+                    self.indexer.submit(self.music_files)
         except Exception as e:
             self._log_status(f"加载音乐文件夹失败: {str(e)}")
     
@@ -160,6 +171,9 @@ class DanceGUI:
         self.dance_btn = ttk.Button(music_frame, text="开始跳舞", 
                                    command=self._toggle_dance, state=tk.DISABLED)
         self.dance_btn.grid(row=5, column=0, columnspan=2, pady=10)
+        
+        self.index_label = ttk.Label(music_frame, text="")
+        self.index_label.grid(row=6, column=0, columnspan=2, sticky=tk.W)
     
     def _create_current_move_panel(self, parent):
         """创建当前动作显示面板"""
@@ -398,6 +412,8 @@ class DanceGUI:
         if files:
             self.music_files.extend(files)
             self._update_music_list()
+            if self.indexer is not None:
+                self.indexer.submit(files)
     
     def _update_music_list(self):
         self.music_listbox.delete(0, tk.END)
@@ -410,8 +426,41 @@ class DanceGUI:
             index = selection[0]
             self.selected_music = self.music_files[index]
             self.play_btn.config(state=tk.NORMAL)
+            if self.indexer is not None:
+                # 选中的曲目及其下一首优先分析
+                self.indexer.prioritize(self.selected_music, 0)
+                if index + 1 < len(self.music_files):
+                    self.indexer.prioritize(self.music_files[index + 1], 1)
+    
+    def _on_index_progress(self, file_path, state, done, total):
+        """后台分析进度（在分析线程中调用，切换到界面线程更新）"""
+        def update():
+            self.index_label.config(text=f"音乐分析: {done}/{total}")
+            if state == FAILED:
+                self._log_error(f"分析失败: {os.path.basename(file_path)} ({self.indexer.errors.get(file_path)})")
+        self.root.after(0, update)
     
     def _play_music(self):
+        self._play_request += 1
+        request = self._play_request
+        if self.selected_music and self.indexer is not None and not self.audio.streaming:
+            # 正在后台分析时在工作线程中等待其完成，界面不阻塞；尚未开始时由 load_music 直接分析
+            # （流式分析时不等待，后台的离线分析结果留给下次播放）
+            file_path = self.selected_music
+            self.play_btn.config(state=tk.DISABLED)
+            self._log_status(f"等待分析完成: {os.path.basename(file_path)}")
+
+            def wait():
+                self.indexer.wait(file_path)
+                self.root.after(0, lambda: self._start_playback(request, file_path))
+            threading.Thread(target=wait, daemon=True).start()
+            return
+        self._start_playback(request, self.selected_music)
+
+    def _start_playback(self, request, file_path):
+        """在界面线程中加载并播放；等待期间再次点击播放或选中了其它曲目时放弃"""
+        if request != self._play_request or file_path != self.selected_music:
+            return
         if self.selected_music and self.audio.load_music(self.selected_music):
             self.audio.play()
             self.play_btn.config(state=tk.DISABLED)
@@ -522,19 +571,14 @@ class DanceGUI:
             threading.Thread(target=self._execute_single_move, args=(move,)).start()
     
     def _execute_single_move(self, move):
-        start_time = time.time()
-        duration = move.duration
-        
-        while time.time() - start_time < duration:
-            t = (time.time() - start_time) / duration
-            position = move.get_position_at_time(t)
-            self.robot.move_to_position(position)
-            time.sleep(0.05)
-        
-        # 确保执行最后一个关键帧（t=1.0），回到原始位置
-        final_position = move.get_position_at_time(1.0)
-        self.robot.move_to_position(final_position)
-        time.sleep(0.5)  # 等待机器人到达最终位置
+        # 按原来 50ms 的节拍采样整段动作，压缩为少量带过渡的 MovL/Arc 指令后一次性下发
+        steps = max(2, int(move.duration / 0.05))
+        positions = [move.get_position_at_time(i / steps) for i in range(steps)]
+        # 确保包含最后一个关键帧（t=1.0），回到原始位置
+        positions.append(move.get_position_at_time(1.0))
+        count = self.robot.move_simplified_path(positions)
+        self._log_status(f"动作 {move.description}: {len(positions)} 个采样点压缩为 {count} 条指令")
+        time.sleep(move.duration + 0.5)  # 等待机器人到达最终位置
     
     def _update_display(self):
         while True:
@@ -546,8 +590,14 @@ class DanceGUI:
                     pos_text += f"RX: {pos[3]:.1f}, RY: {pos[4]:.1f}, RZ: {pos[5]:.1f}"
                     self.position_label.config(text=pos_text)
                     
-                    # 更新报警信息
-                    alarm_info = self.robot.get_alarm_info()
+                    # 更新报警信息：有反馈时只在报警状态变化时查询 GetErrorID，没有反馈时每次查询
+                    state = self.robot.state
+                    error = state.error if state.known else None
+                    if error is None or error != self._alarm_error:
+                        alarm_info = self.robot.get_alarm_info() if error is not False else {'status': 'normal'}
+                        self._alarm_error = error
+                    else:
+                        alarm_info = {'status': 'unchanged'}
                     if alarm_info['status'] == 'alarm':
                         self.alarm_text.delete(1.0, tk.END)
                         self.alarm_text.insert(1.0, alarm_info['message'])
@@ -611,7 +661,11 @@ class DanceGUI:
         self.move_progress['value'] = progress
     
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            if self.indexer is not None:
+                self.indexer.stop()
 
 import tkinter.simpledialog as simpledialog
 
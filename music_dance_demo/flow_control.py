@@ -0,0 +1,111 @@
+"""
+运动队列流控
+跟踪已下发运动指令的队列 ID，与反馈中的 CurrentCommandId 比较，使控制器队列中最多保留 N 条运动指令；
+超出的目标在主机侧缓存：流式目标点只保留最新一个（latest-wins），路径指令按顺序全部保留。
+这样停止或切换音乐时，控制器中最多只剩 N 条旧指令需要执行完。
+"""
+import time
+import threading
+from collections import deque
+from typing import Any, Optional
+
+# RobotMode 5 表示空闲（已使能且无运动）
+ROBOT_MODE_IDLE = 5
+
+
+class MotionFlowControl:
+    """控制器运动队列深度控制 + 主机侧缓存"""
+
+    def __init__(self, max_in_flight: int = 3, idle_timeout: float = 1.0):
+        """
+        参数:
+            max_in_flight: 控制器队列中允许同时存在的运动指令数
+            idle_timeout: 机器人空闲超过该时间后仍未完成的 ID 视为已失效（如被 Stop 清除）
+        """
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._issued = deque()   # 已下发且未完成的队列 ID，升序
+        self._pending = deque()  # 主机侧缓存 [(目标, 是否可被覆盖)]
+        self._current_id = 0
+        self._idle_since = None
+        self.replaced = 0        # 被更新目标覆盖掉的目标数
+
+    def submit(self, item: Any, replaceable: bool = False):
+        """
+        加入待下发目标
+        replaceable=True 的目标（流式目标点）若与缓存末尾的可覆盖目标相邻，则直接覆盖它
+        """
+        with self._lock:
+            if replaceable and self._pending and self._pending[-1][1]:
+                self._pending[-1] = (item, True)
+                self.replaced += 1
+            else:
+                self._pending.append((item, replaceable))
+
+    def next_item(self) -> Optional[Any]:
+        """控制器队列有空余时取出下一个待下发目标，否则返回 None"""
+        with self._lock:
+            if not self._pending or len(self._issued) >= self.max_in_flight:
+                return None
+            return self._pending.popleft()[0]
+
+    def issued(self, queue_id: Optional[int]):
+        """记录已下发指令的队列 ID（指令被拒绝时为 None，不计入）"""
+        if queue_id is None:
+            return
+        with self._lock:
+            self._issued.append(queue_id)
+
+    def update(self, current_command_id: int, robot_mode: int):
+        """用反馈中的 CurrentCommandId/RobotMode 丢弃已完成的 ID"""
+        with self._lock:
+            self._current_id = current_command_id
+            idle = robot_mode == ROBOT_MODE_IDLE
+            while self._issued and (self._issued[0] < current_command_id or
+                                    (idle and self._issued[0] == current_command_id)):
+                self._issued.popleft()
+            if not idle or not self._issued:
+                self._idle_since = None
+            elif self._idle_since is None:
+                self._idle_since = time.monotonic()
+            elif time.monotonic() - self._idle_since > self.idle_timeout:
+                self._issued.clear()
+                self._idle_since = None
+
+    def clear(self):
+        """清空主机缓存和在途记录（Stop/急停后调用）"""
+        with self._lock:
+            self._pending.clear()
+            self._issued.clear()
+            self._idle_since = None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def in_flight_count(self) -> int:
+        with self._lock:
+            return len(self._issued)
+
+
+# 测试代码
+if __name__ == "__main__":
+    flow = MotionFlowControl(max_in_flight=2)
+    for i in range(10):
+        flow.submit([i, 0, 0, 0, 0, 0], replaceable=True)
+    flow.submit({'type': 'MovL'})
+    flow.submit({'type': 'Arc'})
+    print(f"缓存 {flow.pending_count()} 个目标，覆盖 {flow.replaced} 个")
+
+    queue_id = 0
+    for step in range(4):
+        while True:
+            item = flow.next_item()
+            if item is None:
+                break
+            queue_id += 1
+            flow.issued(queue_id)
+            print(f"下发 #{queue_id}: {item}")
+        print(f"在途 {flow.in_flight_count()}，等待 {flow.pending_count()}")
+        flow.update(queue_id, ROBOT_MODE_IDLE)
@@ -2,12 +2,10 @@
 import sys
 import os
 import argparse
-from robot_controller import RobotController
-from audio_analyzer import AudioAnalyzer
-from dance_moves import DanceMoveLibrary
-from dance_gui import DanceGUI
 from config import Config
 
+# RobotController/音频分析/界面模块在参数解析之后按需导入，--help 和 --no-gui 不必加载 pygame、librosa 和 Tk
+
 
 def main():
     parser = argparse.ArgumentParser(description='Dobot Nova 2 音乐舞蹈Demo')
@@ -27,9 +25,8 @@ def main():
     print(f"音乐文件夹: {config.get_music_folder()}")
     print()
     
+    from robot_controller import RobotController
     robot_controller = RobotController(robot_ip)
-    audio_analyzer = AudioAnalyzer()
-    dance_library = DanceMoveLibrary()
     
     if args.no_gui:
         print("测试模式：仅测试机器人连接")
@@ -46,6 +43,15 @@ def main():
             print("✗ 无法连接到机器人")
     else:
         print("启动图形界面...")
+        from audio_analyzer import AudioAnalyzer
+        from analysis_cache import AnalysisCache
+        from dance_moves import DanceMoveLibrary
+        from dance_gui import DanceGUI
+        # 已分析过的音乐从缓存读取，不再重新解码和分析
+        cache_mb = config.get('analysis_cache_mb', 200)
+        audio_analyzer = AudioAnalyzer(AnalysisCache(max_bytes=cache_mb * 1024 * 1024) if cache_mb > 0 else None,
+                                       streaming=config.get('streaming_analysis', True))
+        dance_library = DanceMoveLibrary()
         gui = DanceGUI(robot_controller, audio_analyzer, dance_library)
         try:
             gui.run()
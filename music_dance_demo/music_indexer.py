@@ -0,0 +1,225 @@
+import os
+import heapq
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+from audio_analyzer import analyze_file
+
+# 状态：排队、运行中、已分析、缓存中已有、失败、被调用方认领（改为同步分析）
+QUEUED, RUNNING, DONE, CACHED, FAILED, CLAIMED = 'queued', 'running', 'done', 'cached', 'failed', 'claimed'
+FINISHED = (DONE, CACHED, FAILED, CLAIMED)
+
+
+def analyze_for_cache(file_path: str, params: dict) -> Dict:
+    """在分析进程中执行：解码并分析，数组转换为 float32 以减少回传的数据量"""
+    result = analyze_file(file_path, params['sample_rate'], params['frame_size'], params['hop_length'])
+    result.pop('beat_frames', None)
+    for name in ('beat_times', 'onset_times', 'rms_energy', 'spectral_centroids'):
+        result[name] = np.asarray(result[name], dtype=np.float32)
+    return result
+
+
+class MusicIndexer:
+    """
+    后台分析整个音乐库：用进程池并行分析（librosa 主要消耗 CPU 且长时间持有 GIL），结果写入 AnalysisCache。
+    按优先级调度，prioritize() 让选中/下一首曲目先分析；on_progress(file_path, state, done, total)
+    在后台线程中调用，界面需自行切换到主线程。
+    """
+
+    def __init__(self, cache, params: dict, workers: int = 0,
+                 on_progress: Optional[Callable[[str, str, int, int], None]] = None,
+                 analyze: Callable[[str, dict], Dict] = analyze_for_cache):
+        """
+        cache: AnalysisCache
+        params: 分析参数，与 AudioAnalyzer.analysis_params() 一致才能被播放时命中
+        workers: 分析进程数，0 表示 CPU 核数减 1（最多 4 个）
+        analyze: 在分析进程中执行的函数，必须可被 pickle（模块级函数）
+        """
+        self.cache = cache
+        self.params = dict(params)
+        self.workers = workers if workers > 0 else max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.on_progress = on_progress
+        self.analyze = analyze
+        self.states = {}  # 文件路径 -> 状态
+        self.errors = {}  # 文件路径 -> 失败原因
+        self._heap = []  # (优先级, 序号, 文件路径)，同一文件重新排队时旧条目按序号作废
+        self._entries = {}  # 文件路径 -> 当前有效的序号
+        self._seq = 0
+        self._running = 0
+        self._executor = None
+        self._thread = None
+        self._stop = False
+        self._cond = threading.Condition()
+
+    def submit(self, files: Iterable[str], priority: int = 10):
+        """加入待分析的文件，已加入过的文件不重复分析（失败的文件重新排队）"""
+        with self._cond:
+            for file_path in files:
+                file_path = os.path.abspath(file_path)
+                if self.states.get(file_path) in (None, FAILED):
+                    self.states[file_path] = QUEUED
+                    self._push(file_path, priority)
+            self._cond.notify_all()
+        self.start()
+
+    def prioritize(self, file_path: str, priority: int = 0):
+        """提前分析某个文件（已在运行或完成时无效果），尚未加入的文件会被加入"""
+        file_path = os.path.abspath(file_path)
+        with self._cond:
+            state = self.states.get(file_path)
+            if state in (None, FAILED):
+                self.states[file_path] = QUEUED
+            elif state != QUEUED:
+                return
+            self._push(file_path, priority)
+            self._cond.notify_all()
+        self.start()
+
+    def _push(self, file_path, priority):
+        self._seq += 1
+        self._entries[file_path] = self._seq
+        heapq.heappush(self._heap, (priority, self._seq, file_path))
+
+    def wait(self, file_path: str, timeout: Optional[float] = None) -> bool:
+        """
+        播放前调用：文件正在分析时等待其完成；仍在排队时从队列中移除（由调用方同步分析，不必等待其它文件）。
+        返回 True 表示结果已在缓存中
+        """
+        file_path = os.path.abspath(file_path)
+        with self._cond:
+            if self.states.get(file_path) == QUEUED:
+                self.states[file_path] = CLAIMED
+                self._entries.pop(file_path, None)
+                return False
+            self._cond.wait_for(lambda: self.states.get(file_path) != RUNNING, timeout)
+            return self.states.get(file_path) in (DONE, CACHED)
+
+    def state(self, file_path: str) -> Optional[str]:
+        return self.states.get(os.path.abspath(file_path))
+
+    def progress(self):
+        """(已完成数, 总数)"""
+        with self._cond:
+            states = list(self.states.values())
+        return sum(state in FINISHED for state in states), len(states)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="MusicIndexer", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """停止调度并关闭进程池；wait=False 时不等待正在运行的分析"""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _next(self):
+        """取出优先级最高的有效条目；没有时返回 None"""
+        while self._heap:
+            _, seq, file_path = heapq.heappop(self._heap)
+            if self._entries.get(file_path) == seq and self.states.get(file_path) == QUEUED:
+                del self._entries[file_path]
+                return file_path
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop or (self._running < self.workers and
+                                                           any(self._entries.get(path) == seq
+                                                               for _, seq, path in self._heap)))
+                if self._stop:
+                    return
+                file_path = self._next()
+                if file_path is None:
+                    continue
+                self._running += 1
+                self.states[file_path] = RUNNING
+
+            # 缓存中已有时直接完成（计算内容摘要在调度线程中进行，不占用分析进程）
+            try:
+                cached = self.cache.contains(file_path, self.params)
+            except OSError as e:
+                self._finish(file_path, FAILED, str(e))
+                continue
+            if cached:
+                self._finish(file_path, CACHED)
+                continue
+
+            try:
+                future = self._pool().submit(self.analyze, file_path, self.params)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # 进程池损坏或已关闭，下次重新创建
+                with self._cond:
+                    self._executor = None
+                self._finish(file_path, FAILED, str(e))
+                continue
+            future.add_done_callback(lambda done, path=file_path: self._collect(path, done))
+
+    def _pool(self):
+        with self._cond:
+            if self._executor is None:
+                # spawn：不复制 Tk/音频线程所在的进程状态
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _collect(self, file_path, future):
+        if future.cancelled():
+            self._finish(file_path, QUEUED)
+            return
+        try:
+            self.cache.store(file_path, self.params, future.result())
+        except BrokenProcessPool as e:
+            with self._cond:
+                self._executor = None
+            self._finish(file_path, FAILED, str(e))
+        except Exception as e:
+            self._finish(file_path, FAILED, str(e))
+        else:
+            self._finish(file_path, DONE)
+
+    def _finish(self, file_path, state, error=None):
+        with self._cond:
+            self._running -= 1
+            self.states[file_path] = state
+            if error is not None:
+                self.errors[file_path] = error
+            self._cond.notify_all()
+        if self.on_progress is not None and state != QUEUED:
+            done, total = self.progress()
+            self.on_progress(file_path, state, done, total)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import sys
+    import time
+    from analysis_cache import AnalysisCache
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'music')
+    files = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+             if name.endswith(('.mp3', '.wav', '.ogg'))]
+    params = {'sample_rate': 22050, 'frame_size': 2048, 'hop_length': 512}
+    start = time.perf_counter()
+    indexer = MusicIndexer(AnalysisCache(), params, on_progress=lambda path, state, done, total: print(
+        f"[{time.perf_counter() - start:6.2f}s] {done}/{total} {state:7s} {os.path.basename(path)}"))
+    indexer.submit(files)
+    if files:
+        indexer.prioritize(files[-1])
+    for file_path in files:
+        indexer.wait(file_path)
+    while indexer.progress()[0] < len(files):
+        time.sleep(0.1)
+    print("errors:", indexer.errors)
+    indexer.stop()
@@ -0,0 +1,171 @@
+"""
+笛卡尔路径 → 连续关节路径转换器
+在下发前对整条路径做离线逆解，检查关节跳变、腕部翻转、肘部翻转和关节限位，
+不合格的路径在主机侧直接被拒绝，合格的路径输出可直接用于 MovJ/ServoJ 的关节序列。
+"""
+import os
+import sys
+import numpy as np
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dobot_kinematics import SerialArm, NOVA2_JOINT_LIMITS
+
+# 本地逆解得到的关节路径与真实解的允许误差（度），测试代码中校验
+LOCAL_IK_TOLERANCE = 0.01
+
+
+class CartesianPathConverter:
+    """将稠密笛卡尔路径转换为连续的关节路径"""
+
+    def __init__(self, solver=None, joint_limits=NOVA2_JOINT_LIMITS, max_joint_step: float = 10.0,
+                 wrist_threshold: float = 5.0, chunk_size: int = 8):
+        """
+        参数:
+            solver: 逆解器，SerialArm 实例（本地批量逆解）或 solver(pose, user, tool, joint_near) 可调用对象
+            joint_limits: (6, 2) 关节限位
+            max_joint_step: 相邻两点间单个关节允许的最大变化量（度）
+            wrist_threshold: J5 接近 0 度的腕奇异阈值（度）
+            chunk_size: 本地逆解时每批同时求解的点数
+        """
+        self.solver = solver if solver is not None else SerialArm()
+        self.joint_limits = np.asarray(joint_limits, dtype=np.float64)
+        self.max_joint_step = max_joint_step
+        self.wrist_threshold = wrist_threshold
+        self.chunk_size = chunk_size
+
+    def _solve_local(self, poses: np.ndarray, seed: np.ndarray, user: int, tool: int):
+        """
+        分块批量逆解。块内每个点的初值由前一块最后两个解线性外推得到（逐点接近各自的解，
+        近奇异处也不会滑到相邻的等效解上），未收敛的点再逐点以前一点为初值重试
+        """
+        n = len(poses)
+        joints = np.full((n, 6), np.nan)
+        solved = np.zeros(n, dtype=bool)
+        previous, previous_index = seed, 0  # 最近一个解及其序号（起始关节为 0，第 k 点为 k + 1）
+        velocity = np.zeros(6)  # 相邻两点间的关节变化量
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            seeds = previous + (np.arange(start + 1, stop + 1) - previous_index)[:, None] * velocity
+            block, ok = self.solver.inverse_batch(poses[start:stop], seeds, user, tool)
+            for i in np.flatnonzero(~ok):
+                near = joints[start + i - 1] if start + i > 0 and solved[start + i - 1] else previous
+                retry, retry_ok = self.solver.inverse_batch(poses[start + i:start + i + 1], near[None, :],
+                                                            user, tool)
+                block[i], ok[i] = retry[0], retry_ok[0]
+            joints[start:stop] = block
+            solved[start:stop] = ok
+            good = np.flatnonzero(ok)
+            if len(good) >= 2:
+                velocity = (block[good[-1]] - block[good[-2]]) / (good[-1] - good[-2])
+            elif len(good) == 1:
+                velocity = (block[good[0]] - previous) / (start + good[0] + 1 - previous_index)
+            if len(good):
+                previous, previous_index = block[good[-1]], start + good[-1] + 1
+        return joints, solved
+
+    def _solve_sequential(self, poses: np.ndarray, seed: np.ndarray, user: int, tool: int):
+        """逐点调用逆解器，每个点以前一个点的解作为 JointNear"""
+        n = len(poses)
+        joints = np.full((n, 6), np.nan)
+        solved = np.zeros(n, dtype=bool)
+        previous = seed
+        for i, pose in enumerate(poses):
+            result = self.solver(pose, user, tool, previous.tolist())
+            if result is not None:
+                joints[i] = result
+                solved[i] = True
+                previous = joints[i]
+        return joints, solved
+
+    def convert(self, poses, seed, user: int = -1, tool: int = -1) -> Dict:
+        """
+        转换笛卡尔路径
+
+        参数:
+            poses: (n, 6) 笛卡尔位姿 [x, y, z, rx, ry, rz]
+            seed: 起始关节角（通常为当前 QActual）
+
+        返回:
+            {'ok': bool, 'joints': (n, 6) 关节路径, 'issues': [{'index', 'type', 'message'}, ...]}
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+        seed = np.asarray(seed, dtype=np.float64).reshape(6)
+        if isinstance(self.solver, SerialArm):
+            joints, solved = self._solve_local(poses, seed, user, tool)
+        else:
+            joints, solved = self._solve_sequential(poses, seed, user, tool)
+
+        issues = []
+        for i in np.flatnonzero(~solved):
+            issues.append({'index': int(i), 'type': 'unreachable', 'message': f"第{i}点无逆解"})
+        issues.extend(self.check_joint_path(joints, seed, solved))
+        issues.sort(key=lambda issue: issue['index'])
+        return {'ok': not issues, 'joints': joints, 'issues': issues}
+
+    def check_joint_path(self, joints, seed=None, valid=None) -> List[Dict]:
+        """检查关节路径的跳变、翻转和限位，全部为向量化比较"""
+        joints = np.asarray(joints, dtype=np.float64).reshape(-1, 6)
+        if valid is None:
+            valid = np.ones(len(joints), dtype=bool)
+        path = joints if seed is None else np.vstack([np.asarray(seed, dtype=np.float64).reshape(1, 6), joints])
+        path_valid = valid if seed is None else np.concatenate([[True], valid])
+        offset = 0 if seed is None else 1
+        issues = []
+
+        # 关节限位
+        low = joints < self.joint_limits[:, 0]
+        high = joints > self.joint_limits[:, 1]
+        for i, j in zip(*np.nonzero((low | high) & valid[:, None])):
+            issues.append({'index': int(i), 'type': 'limit',
+                           'message': f"第{i}点 J{j + 1}={joints[i, j]:.1f}° 超出限位"})
+
+        if len(path) < 2:
+            return issues
+        pair_valid = path_valid[1:] & path_valid[:-1]
+        delta = np.diff(path, axis=0)
+
+        # 关节跳变
+        jump = (np.abs(delta) > self.max_joint_step) & pair_valid[:, None]
+        for k in np.flatnonzero(jump.any(axis=1)):
+            j = int(np.argmax(np.abs(delta[k])))
+            issues.append({'index': int(k + 1 - offset), 'type': 'discontinuity',
+                           'message': f"第{k + 1 - offset}点 J{j + 1} 跳变 {delta[k, j]:.1f}°"})
+
+        # 腕部翻转：J5 穿过 0 度或进入腕奇异区
+        j5 = path[:, 4]
+        wrist = ((np.sign(j5[1:]) * np.sign(j5[:-1]) < 0) | (np.abs(j5[1:]) < self.wrist_threshold)) & pair_valid
+        for k in np.flatnonzero(wrist):
+            issues.append({'index': int(k + 1 - offset), 'type': 'wrist_flip',
+                           'message': f"第{k + 1 - offset}点腕部翻转/接近腕奇异 (J5={j5[k + 1]:.1f}°)"})
+
+        # 肘部翻转：J3 符号改变
+        j3 = path[:, 2]
+        elbow = (np.sign(j3[1:]) * np.sign(j3[:-1]) < 0) & pair_valid
+        for k in np.flatnonzero(elbow):
+            issues.append({'index': int(k + 1 - offset), 'type': 'elbow_flip',
+                           'message': f"第{k + 1 - offset}点肘部翻转 (J3={j3[k + 1]:.1f}°)"})
+        return issues
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    arm = SerialArm()
+    converter = CartesianPathConverter(arm)
+    joint_path = np.linspace([0, 10, -80, 0, 60, 0], [60, 30, -40, 20, 80, 90], 1000)
+    poses = arm.forward(joint_path)
+
+    start = time.perf_counter()
+    result = converter.convert(poses, joint_path[0])
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"转换 {len(poses)} 个点耗时 {elapsed:.1f} ms，结果: {'通过' if result['ok'] else '拒绝'}")
+    error = np.nanmax(np.abs(result['joints'] - joint_path))
+    print(f"最大关节误差: {error:.4f}° ({'<' if error < LOCAL_IK_TOLERANCE else '超出'} {LOCAL_IK_TOLERANCE}°)")
+
+    # 从零初值逆解时结果应在关节限位内（取离初值最近的等价角）
+    joints = arm(arm.forward([10, 20, -60, 10, 50, 30]))
+    print("零初值逆解:", None if joints is None else np.round(joints, 2).tolist())
+    for issue in result['issues'][:10]:
+        print(f"  - [{issue['type']}] {issue['message']}")
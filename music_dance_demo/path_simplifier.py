@@ -0,0 +1,265 @@
+"""
+稠密路径压缩
+用 Ramer-Douglas-Peucker 算法在位置/姿态容差内把稠密位姿（或关节）序列压缩为最少的路径点，
+可将连续多段直线合并为圆弧，并为每个路径点计算 MovL 的过渡半径 r 和 MovJ 的平滑比例 cp，
+使 MovL/Arc/MovJ 能以少 10~50 倍的指令平滑执行。
+"""
+import os
+import sys
+import numpy as np
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dobot_rotations import euler_to_quat, slerp, angular_distance
+
+
+def _segment_deviation(points: np.ndarray, quats, start: int, end: int, norm=None):
+    """
+    计算 start..end 之间各点相对弦线（投影点）的偏差，norm 为 np.linalg.norm 的 ord（None 为欧氏距离，
+    np.inf 为各分量绝对值的最大值）
+    返回 (位置偏差 mm, 姿态偏差 度)，两者均为 (end-start-1,) 数组
+    """
+    inner = points[start + 1:end]
+    a, b = points[start], points[end]
+    chord = b - a
+    length2 = float(chord @ chord)
+    if length2 < 1e-12:
+        t = np.linspace(0, 1, end - start + 1)[1:-1]
+        pos_dev = np.linalg.norm(inner - a, ord=norm, axis=1)
+    else:
+        t = np.clip((inner - a) @ chord / length2, 0.0, 1.0)
+        pos_dev = np.linalg.norm(inner - (a + t[:, None] * chord), ord=norm, axis=1)
+    if quats is None:
+        return pos_dev, np.zeros_like(pos_dev)
+    interpolated = slerp(quats[start], quats[end], t)
+    return pos_dev, angular_distance(interpolated, quats[start + 1:end])
+
+
+def rdp_indices(points, pos_tolerance: float, quats=None, rot_tolerance: float = 1.0, norm=None) -> np.ndarray:
+    """
+    RDP 路径点选择（非递归，每段的偏差计算是向量化的）
+
+    参数:
+        points: (n, k) 位置或关节数组
+        pos_tolerance: 位置（或关节）容差
+        quats: 可选 (n, 4) 姿态四元数
+        rot_tolerance: 姿态容差（度）
+        norm: 位置偏差的范数（np.linalg.norm 的 ord），None 为欧氏距离，np.inf 为逐分量最大偏差
+
+    返回:
+        保留点的索引（升序，包含首尾）
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        pos_dev, rot_dev = _segment_deviation(points, quats, start, end, norm)
+        # 以容差归一化后取最大超差点
+        score = np.maximum(pos_dev / pos_tolerance, rot_dev / rot_tolerance)
+        k = int(np.argmax(score))
+        if score[k] > 1.0:
+            split = start + 1 + k
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def _circle(p0: np.ndarray, p1: np.ndarray, p2: np.ndarray):
+    """三点确定圆，返回 (圆心, 半径, 法向量)，三点共线时返回 None"""
+    u, v = p1 - p0, p2 - p0
+    normal = np.cross(u, v)
+    nn = float(normal @ normal)
+    if nn < 1e-9:
+        return None
+    center = p0 + (np.cross(normal, u) * (v @ v) + np.cross(v, normal) * (u @ u)) / (2 * nn)
+    return center, float(np.linalg.norm(p0 - center)), normal / np.sqrt(nn)
+
+
+def _fits_arc(points: np.ndarray, quats, start: int, mid: int, end: int,
+              pos_tolerance: float, rot_tolerance: float) -> bool:
+    """
+    判断 start..end 之间的全部稠密点是否落在过 start/mid/end 三点的圆弧上。
+    相邻点之间按直线运动，因此各段弦的中点也必须在圆弧容差内（稀疏的点恰好共圆时不能合并，如正方形的四个角）
+    """
+    circle = _circle(points[start], points[mid], points[end])
+    if circle is None:
+        return False
+    center, radius, normal = circle
+    samples = points[start:end + 1]
+    chord_mids = 0.5 * (samples[:-1] + samples[1:])
+    check = np.vstack([samples, chord_mids]) - center
+    out_of_plane = check @ normal
+    in_plane_all = check - out_of_plane[:, None] * normal
+    deviation = np.hypot(np.linalg.norm(in_plane_all, axis=1) - radius, out_of_plane)
+    if deviation.max() > pos_tolerance:
+        return False
+    in_plane = in_plane_all[:len(samples)]
+    # 沿圆弧的角度必须单调，避免绕过整圆的其余部分
+    x_axis = in_plane[0] / np.linalg.norm(in_plane[0])
+    y_axis = np.cross(normal, x_axis)
+    angle = np.unwrap(np.arctan2(in_plane @ y_axis, in_plane @ x_axis))
+    steps = np.diff(angle)
+    if not (np.all(steps >= -1e-9) or np.all(steps <= 1e-9)):
+        return False
+    if quats is None:
+        return True
+    t = (angle - angle[0]) / (angle[-1] - angle[0])
+    interpolated = slerp(quats[start], quats[end], t)
+    return angular_distance(interpolated, quats[start:end + 1]).max() <= rot_tolerance
+
+
+def _blend_radius(points: np.ndarray, prev_idx: int, idx: int, next_idx: int,
+                  blend_tolerance: float, max_radius: float) -> float:
+    """
+    计算拐角处的过渡半径：不超过相邻两段长度的一半，且圆弧过渡偏离拐点不超过 blend_tolerance
+    """
+    a = points[idx] - points[prev_idx]
+    b = points[next_idx] - points[idx]
+    la, lb = np.linalg.norm(a), np.linalg.norm(b)
+    if la < 1e-9 or lb < 1e-9:
+        return 0.0
+    cos_turn = np.clip(a @ b / (la * lb), -1.0, 1.0)
+    half = (np.pi - np.arccos(cos_turn)) / 2.0  # 拐角半角
+    sin_half, cos_half = np.sin(half), np.cos(half)
+    limit = 0.5 * min(la, lb)
+    if 1.0 - sin_half < 1e-9:
+        return float(min(limit, max_radius))  # 几乎共线
+    return float(min(limit, max_radius, blend_tolerance * cos_half / (1.0 - sin_half)))
+
+
+def simplify_pose_path(poses, pos_tolerance: float = 1.0, rot_tolerance: float = 1.0,
+                       blend_tolerance: float = None, max_radius: float = 50.0,
+                       use_arcs: bool = True) -> List[Dict]:
+    """
+    压缩笛卡尔位姿路径为 MovL/Arc 指令序列
+
+    参数:
+        poses: (n, 6) 位姿 [x, y, z, rx, ry, rz]
+        pos_tolerance: 位置容差（mm）
+        rot_tolerance: 姿态容差（度）
+        blend_tolerance: 过渡圆弧偏离拐点的最大距离（mm），默认等于 pos_tolerance
+        max_radius: 过渡半径上限（mm）
+        use_arcs: 是否将连续多段直线合并为圆弧
+
+    返回:
+        [{'type': 'MovL', 'pose': [...], 'r': int}, {'type': 'Arc', 'via': [...], 'pose': [...], 'r': int}, ...]
+        序列不包含起点（即当前位置）
+    """
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+    if len(poses) < 2:
+        return [{'type': 'MovL', 'pose': p.tolist(), 'r': 0} for p in poses]
+    if blend_tolerance is None:
+        blend_tolerance = pos_tolerance
+    points = poses[:, :3]
+    quats = euler_to_quat(poses[:, 3:])
+    kept = rdp_indices(points, pos_tolerance, quats, rot_tolerance)
+
+    # 合并可以用圆弧表示的连续路径点
+    segments = []  # (类型, 中间点索引, 终点索引)
+    i = 0
+    while i < len(kept) - 1:
+        best = None
+        if use_arcs:
+            j = i + 2
+            while j < len(kept):
+                mid = kept[i] + (kept[j] - kept[i]) // 2
+                if not _fits_arc(points, quats, kept[i], mid, kept[j], pos_tolerance, rot_tolerance):
+                    break
+                best = (mid, j)
+                j += 1
+        if best is not None:
+            segments.append(('Arc', best[0], kept[best[1]]))
+            i = best[1]
+        else:
+            segments.append(('MovL', None, kept[i + 1]))
+            i += 1
+
+    commands = []
+    previous = 0
+    for k, (kind, mid, end) in enumerate(segments):
+        radius = 0.0
+        if k + 1 < len(segments):
+            following = segments[k + 1][1] if segments[k + 1][0] == 'Arc' else segments[k + 1][2]
+            entry = mid if kind == 'Arc' else previous
+            radius = _blend_radius(points, entry, end, following, blend_tolerance, max_radius)
+        command = {'type': kind, 'pose': poses[end].tolist(), 'r': int(radius)}
+        if kind == 'Arc':
+            command['via'] = poses[mid].tolist()
+        commands.append(command)
+        previous = end
+    return commands
+
+
+def simplify_joint_path(joints, tolerance: float = 0.5, max_cp: int = 100) -> List[Dict]:
+    """
+    压缩关节路径为 MovJ 指令序列
+
+    参数:
+        joints: (n, 6) 关节角
+        tolerance: 关节容差（度），每个关节偏离关节空间弦线上对应点的最大允许值
+        max_cp: 平滑比例上限
+
+    返回:
+        [{'type': 'MovJ', 'joint': [...], 'cp': int}, ...]，序列不包含起点
+    """
+    joints = np.asarray(joints, dtype=np.float64).reshape(-1, 6)
+    if len(joints) < 2:
+        return [{'type': 'MovJ', 'joint': j.tolist(), 'cp': 0} for j in joints]
+    # 关节空间用无穷范数衡量偏差：任一关节超出容差即保留该点
+    kept = rdp_indices(joints, tolerance, norm=np.inf)
+    commands = []
+    for k in range(1, len(kept)):
+        cp = 0
+        if k + 1 < len(kept):
+            a = joints[kept[k]] - joints[kept[k - 1]]
+            b = joints[kept[k + 1]] - joints[kept[k]]
+            la, lb = np.linalg.norm(a), np.linalg.norm(b)
+            if la > 1e-9 and lb > 1e-9:
+                # 方向越一致允许越大的平滑比例
+                cp = int(round(max_cp * max(0.0, float(a @ b) / (la * lb))))
+        commands.append({'type': 'MovJ', 'joint': joints[kept[k]].tolist(), 'cp': cp})
+    return commands
+
+
+def send_commands(dashboard, commands: List[Dict], user: int = -1, tool: int = -1,
+                  a: int = -1, v: int = -1, speed: int = -1) -> List[str]:
+    """依次下发压缩后的指令，返回各指令的返回值"""
+    results = []
+    for command in commands:
+        if command['type'] == 'MovL':
+            results.append(dashboard.MovL(*command['pose'], 0, user=user, tool=tool, a=a, v=v,
+                                          speed=speed, r=command['r']))
+        elif command['type'] == 'Arc':
+            results.append(dashboard.Arc(*command['via'], *command['pose'], 0, user=user, tool=tool,
+                                         a=a, v=v, speed=speed, r=command['r']))
+        elif command['type'] == 'MovJ':
+            results.append(dashboard.MovJ(*command['joint'], 1, a=a, v=v, cp=command['cp']))
+    return results
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    # 50ms 采样的画圆 + 直线路径
+    angle = np.linspace(0, np.pi, 200)
+    circle = np.column_stack([-350 + 50 * np.cos(angle), 50 * np.sin(angle), np.full(200, 200.0),
+                              np.full(200, 180.0), np.zeros(200), np.zeros(200)])
+    line = np.column_stack([np.linspace(-400, -400, 100), np.linspace(0, -80, 100), np.full(100, 200.0),
+                            np.full(100, 180.0), np.zeros(100), np.zeros(100)])
+    path = np.vstack([circle, line])
+
+    start = time.perf_counter()
+    commands = simplify_pose_path(path, pos_tolerance=0.5, rot_tolerance=0.5)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(path)} 个点压缩为 {len(commands)} 条指令，耗时 {elapsed:.1f} ms")
+    for command in commands:
+        print(f"  {command['type']}: {np.round(command['pose'][:3], 1).tolist()}, r={command['r']}")
@@ -2,16 +2,24 @@ import sys
 import os
 import time
 import threading
-import queue
 import logging
 from datetime import datetime
 from typing import List, Tuple
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from dobot_api import DobotApiDashboard, DobotApiFeedBack, MyType
+from dobot_api import MyType
+from dobot_kinematics import ControllerIKSolver, SerialArm
+from dobot_program import parse_queue_id
 from config import Config
 from alarm_manager import AlarmManager
 from singularity_checker import SingularityChecker
+from path_converter import CartesianPathConverter
+from path_simplifier import simplify_pose_path, send_commands
+from flow_control import MotionFlowControl
+from dobot_shared_feedback import SharedFeedback
+from dobot_connect import connectRobot
+from dobot_io import DigitalIO
+from dobot_state import RobotState
 
 class RobotController:
     def __init__(self, ip: str):
@@ -29,16 +37,25 @@ class RobotController:
         self.feed = None
         
         self.is_connected = False
-        self.is_enabled = False
+        self._enabled = False
         self.current_position = [0, 0, 0, 0, 0, 0]
+        self.current_joints = [0, 0, 0, 0, 0, 0]
         self.error_log = []
         self.move_history = []
         
         self.feed_thread = None
         self.stop_feed = False
+        self.feed_count = 0
+        # 由反馈掩码维护的 DI/DO 状态，可用 self.io.on() 注册边沿回调
+        self.io = DigitalIO()
+        # 由反馈维护的机器人状态（模式、使能、运行、暂停、报警），可用 self.state.on() 注册转换事件
+        self.state = RobotState()
+        self.state.on('error', self._on_error)
+        self.state.on('collision', self._on_error)
         self.position_lock = threading.Lock()
         
-        self.move_queue = queue.Queue()
+        # 控制器队列中最多保留 max_queued_motions 条运动指令，其余在主机侧缓存
+        self.move_queue = MotionFlowControl(self.config.get('max_queued_motions', 3))
         self.move_thread = None
         self.stop_move = False
         
@@ -78,10 +95,27 @@ class RobotController:
     def connect(self) -> bool:
         try:
             self.logger.info(f"正在连接到机器人 {self.ip}...")
-            self.dashboard = DobotApiDashboard(self.ip, self.dashboard_port)
-            self.logger.info(f"Dashboard连接成功 (端口 {self.dashboard_port})")
+            # 并行连接 Dashboard 与反馈端口并等待第一帧反馈，IP 不可达时在超时内失败
+            feedback_process = self.config.get('feedback_process', False)
+            session = connectRobot(self.ip, self.dashboard_port, None if feedback_process else self.feed_port,
+                                   timeout=self.config.get('connect_timeout', 3.0))
+            self.dashboard = session.dashboard
+            self.logger.info(f"Dashboard连接成功 (端口 {self.dashboard_port})，耗时 {session.timings}")
+            # Stop/Pause 走独立连接，不被主通道上阻塞的指令拖住
+            if not self.dashboard.EnablePriorityLane(self.config.get('stop_timeout', 0.5)):
+                self.logger.warning("停止指令独立连接建立失败，Stop 将经主通道发送")
+            self.dashboard.reconnectCallbacks.append(self._on_reconnect)
             
-            self.feed = DobotApiFeedBack(self.ip, self.feed_port)
+            if feedback_process:
+                # 反馈在独立进程中读取，不受 GUI/音频分析占用 GIL 的影响
+                self.feed = SharedFeedback.spawn(self.ip, self.feed_port)
+                self.feed_count = 0
+            else:
+                self.feed = session.feedback
+                with self.position_lock:
+                    self.current_position = session.frame['ToolVectorActual'][0].tolist()
+                    self.current_joints = session.frame['QActual'][0].tolist()
+                self.state.update(session.frame)
             self.logger.info(f"Feed连接成功 (端口 {self.feed_port})")
             
             self.is_connected = True
@@ -116,6 +150,13 @@ class RobotController:
                     
             return False
     
+    def _on_reconnect(self, dashboard):
+        """Dashboard 重连并恢复会话后，用控制器的当前指令 ID 同步流控状态"""
+        command_id = dashboard.session.command_id
+        self.logger.warning(f"Dashboard 已重连并恢复会话，当前指令 ID: {command_id}")
+        if command_id is not None:
+            self.move_queue.update(command_id, -1)
+    
     def disconnect(self):
         self.stop_feed = True
         self.stop_move = True
@@ -131,6 +172,24 @@ class RobotController:
             self.feed.close()
         
         self.is_connected = False
+        self.state.reset()
+    
+    @property
+    def is_enabled(self) -> bool:
+        """使能状态：收到反馈后取自反馈，否则为最近一次 EnableRobot/DisableRobot 的结果"""
+        if self.state.known:
+            return self.state.enabled
+        return self._enabled
+    
+    @is_enabled.setter
+    def is_enabled(self, value: bool):
+        self._enabled = value
+    
+    def _on_error(self, event):
+        """进入报警/碰撞状态时记录一次（反馈线程中调用）"""
+        error_msg = f"机器人进入 {event.name} 状态，模式 {self.state.modeName}"
+        self.error_log.append(error_msg)
+        self.logger.warning(error_msg)
     
     def enable_robot(self) -> bool:
         if not self.is_connected:
@@ -171,28 +230,43 @@ class RobotController:
                 self.error_log.append(error_msg)
                 self.logger.error(error_msg)
     
+    def _read_feed(self):
+        """读取一帧反馈：共享内存模式下等待新帧，否则从 socket 读满 1440 字节；没有完整帧时返回 None"""
+        if isinstance(self.feed, SharedFeedback):
+            latest = self.feed.wait_frame(self.feed_count, timeout=0.1)
+            if latest is None:
+                return None
+            feed_data, self.feed_count, _ = latest
+            return feed_data
+        data = bytes()
+        while len(data) < 1440:
+            chunk = self.feed.socket_dobot.recv(1440 - len(data))
+            if not chunk:
+                break
+            data += chunk
+        if len(data) != 1440:
+            return None
+        return np.frombuffer(data, dtype=MyType)
+    
     def _feed_worker(self):
         while not self.stop_feed:
             try:
-                data = bytes()
-                while len(data) < 1440:
-                    chunk = self.feed.socket_dobot.recv(1440 - len(data))
-                    if not chunk:
-                        break
-                    data += chunk
-                
-                if len(data) == 1440:
-                    feed_data = np.frombuffer(data, dtype=MyType)
-                    if len(feed_data) > 0:
-                        with self.position_lock:
-                            self.current_position = [
-                                feed_data['ToolVectorActual'][0][0],
-                                feed_data['ToolVectorActual'][0][1],
-                                feed_data['ToolVectorActual'][0][2],
-                                feed_data['ToolVectorActual'][0][3],
-                                feed_data['ToolVectorActual'][0][4],
-                                feed_data['ToolVectorActual'][0][5]
-                            ]
+                feed_data = self._read_feed()
+                if feed_data is not None and len(feed_data) > 0:
+                    with self.position_lock:
+                        self.current_position = [
+                            feed_data['ToolVectorActual'][0][0],
+                            feed_data['ToolVectorActual'][0][1],
+                            feed_data['ToolVectorActual'][0][2],
+                            feed_data['ToolVectorActual'][0][3],
+                            feed_data['ToolVectorActual'][0][4],
+                            feed_data['ToolVectorActual'][0][5]
+                        ]
+                        self.current_joints = feed_data['QActual'][0].tolist()
+                    self.move_queue.update(int(feed_data['CurrentCommandId'][0]),
+                                           int(feed_data['RobotMode'][0]))
+                    self.io.update(feed_data)
+                    self.state.update(feed_data)
             except Exception as e:
                 if not self.stop_feed:
                     error_msg = f"Feed error: {str(e)}"
@@ -205,20 +279,24 @@ class RobotController:
     def _move_worker(self):
         while not self.stop_move:
             try:
-                if not self.move_queue.empty():
-                    position = self.move_queue.get(timeout=0.1)
-                    if self.is_enabled:
-                        self._execute_move(position)
-                else:
-                    time.sleep(0.01)
-            except queue.Empty:
-                pass
+                item = self.move_queue.next_item()
+                if item is None:
+                    time.sleep(0.005)
+                    continue
+                position, coordinate_mode = item
+                if self.is_enabled:
+                    self.move_queue.issued(parse_queue_id(self._execute_move(position, coordinate_mode) or ""))
             except Exception as e:
                 error_msg = f"Move worker error: {str(e)}"
                 self.error_log.append(error_msg)
                 self.logger.error(error_msg)
     
-    def _execute_move(self, position: List[float]):
+    def _execute_move(self, position: List[float], coordinate_mode: int = 0) -> str:
+        """执行一个目标，返回控制器的返回值（用于取队列 ID）"""
+        if coordinate_mode == 1:
+            return self.move_j(position)
+        if coordinate_mode == 2:
+            return self._execute_command(position)
         try:
             # 检查目标位置是否安全
             is_safe, warnings = self.singularity_checker.is_position_safe(position)
@@ -229,7 +307,7 @@ class RobotController:
                 
             x, y, z, rx, ry, rz = position
             # MovL 使用 speed 参数来控制速度
-            self.dashboard.MovL(x, y, z, rx, ry, rz, 0, speed=self.current_speed)
+            result = self.dashboard.MovL(x, y, z, rx, ry, rz, 0, speed=self.current_speed)
             
             move_cmd = f"MovL({x},{y},{z},{rx},{ry},{rz},speed={self.current_speed})"
             self.move_history.append({
@@ -241,6 +319,7 @@ class RobotController:
             
             if len(self.move_history) > 1000:
                 self.move_history = self.move_history[-500:]
+            return result
                 
         except Exception as e:
             error_msg = f"Move execution error: {str(e)}"
@@ -248,9 +327,68 @@ class RobotController:
             self.logger.error(error_msg)
             self.logger.debug(f"移动位置: {position}", exc_info=True)
     
+    def _execute_command(self, command: dict) -> str:
+        """执行压缩后的 MovL/Arc 指令"""
+        try:
+            is_safe, warnings = self.singularity_checker.is_position_safe(command['pose'])
+            if not is_safe:
+                self.logger.warning(f"目标位置可能不安全: {warnings}")
+            result = send_commands(self.dashboard, [command], speed=self.current_speed)
+            self.logger.debug(f"执行压缩指令: {command}")
+            return result[0] if result else None
+        except Exception as e:
+            error_msg = f"Command execution error: {str(e)}"
+            self.error_log.append(error_msg)
+            self.logger.error(error_msg)
+    
+    def move_simplified_path(self, poses: List[List[float]], pos_tolerance: float = 1.0,
+                             rot_tolerance: float = 1.0) -> int:
+        """
+        将稠密位姿序列压缩为带过渡半径的 MovL/Arc 指令后加入队列
+        
+        返回:
+            加入队列的指令数
+        """
+        if not self.is_enabled:
+            return 0
+        commands = simplify_pose_path(poses, pos_tolerance, rot_tolerance)
+        for command in commands:
+            self.move_queue.submit((command, 2))
+        self.logger.info(f"{len(poses)} 个路径点压缩为 {len(commands)} 条指令")
+        return len(commands)
+    
     def move_to_position(self, position: List[float]):
+        """流式目标点：控制器队列已满时只保留最新的目标"""
         if self.is_enabled:
-            self.move_queue.put(position)
+            self.move_queue.submit((position, 0), replaceable=True)
+    
+    def _get_path_converter(self) -> CartesianPathConverter:
+        """按配置选择本地逆解或控制器逆解"""
+        if self.config.get('local_ik', False):
+            return CartesianPathConverter(SerialArm())
+        return CartesianPathConverter(ControllerIKSolver(self.dashboard))
+    
+    def move_cartesian_path(self, poses: List[List[float]]) -> Tuple[bool, List[dict]]:
+        """
+        将稠密笛卡尔路径离线转换为连续关节路径后以 MovJ 下发
+        出现无逆解、关节跳变、腕/肘翻转或超限时整条路径被拒绝，不下发任何指令
+        
+        返回:
+            (accepted, issues)
+        """
+        if not self.is_enabled:
+            return False, []
+        with self.position_lock:
+            seed = list(self.current_joints)
+        result = self._get_path_converter().convert(poses, seed)
+        if not result['ok']:
+            self.logger.warning(f"路径被拒绝，共 {len(result['issues'])} 个问题: "
+                                f"{[issue['message'] for issue in result['issues'][:5]]}")
+            return False, result['issues']
+        for joints in result['joints']:
+            self.move_queue.submit((joints.tolist(), 1))
+        self.logger.info(f"路径已转换为 {len(result['joints'])} 个关节点并加入队列")
+        return True, []
     
     def move_to_home_position(self):
         """移动到初始位置"""
@@ -277,8 +415,9 @@ class RobotController:
             try:
                 j1, j2, j3, j4, j5, j6 = joint_positions
                 # MovJ 使用 v 参数来控制速度
-                self.dashboard.MovJ(j1, j2, j3, j4, j5, j6, 1, v=self.current_speed)
+                result = self.dashboard.MovJ(j1, j2, j3, j4, j5, j6, 1, v=self.current_speed)
                 self.logger.debug(f"执行MovJ命令，速度: {self.current_speed}%")
+                return result
             except Exception as e:
                 error_msg = f"MovJ error: {str(e)}"
                 self.error_log.append(error_msg)
@@ -288,6 +427,10 @@ class RobotController:
         with self.position_lock:
             return self.current_position.copy()
     
+    def get_current_joints(self) -> List[float]:
+        with self.position_lock:
+            return list(self.current_joints)
+    
     def get_current_speed(self) -> int:
         """获取当前速度设置"""
         return self.current_speed
@@ -314,11 +457,11 @@ class RobotController:
     def emergency_stop(self):
         if self.is_connected:
             try:
-                while not self.move_queue.empty():
-                    self.move_queue.get_nowait()
+                self.move_queue.clear()
                 
                 if self.dashboard:
                     self.dashboard.Stop()
+                    self.logger.info(f"停止指令往返时间: {self.dashboard.GetPriorityLatency()}")
             except Exception as e:
                 error_msg = f"Emergency stop error: {str(e)}"
                 self.error_log.append(error_msg)
@@ -329,16 +472,17 @@ class RobotController:
             'connected': self.is_connected,
             'enabled': self.is_enabled,
             'position': self.get_current_position(),
-            'queue_size': self.move_queue.qsize(),
+            'queue_size': self.move_queue.pending_count(),
+            'in_flight': self.move_queue.in_flight_count(),
             'error_count': len(self.error_log)
         }
         
-        if self.is_connected and self.dashboard:
-            try:
-                robot_mode = self.dashboard.RobotMode()
-                status['robot_mode'] = robot_mode
-            except:
-                status['robot_mode'] = "Unknown"
+        # 状态取自反馈，不再调用 RobotMode()
+        if self.is_connected and self.state.known:
+            status['robot_mode'] = self.state.modeName or self.state.mode
+            status.update({key: self.state.flags[key] for key in ('running', 'paused', 'error', 'collision')})
+        elif self.is_connected:
+            status['robot_mode'] = "Unknown"
         
         return status
     
@@ -0,0 +1,342 @@
+import threading
+import numpy as np
+from typing import Callable, Dict, Iterator, Optional
+
+# 频谱质心和起音强度使用的 FFT 长度（与 librosa 的默认值一致）
+N_FFT = 2048
+N_MELS = 128
+TOP_DB = 80.0
+# 开头这几秒的对数 Mel 谱保留下来，包络按目前为止的最大值重新计算（开头的最大值还不稳定）
+HEAD_SECONDS = 10.0
+# 整首速度估计时每段计算的自相关图帧数（整首一次计算时约需 170 MB）
+TEMPO_SEGMENT = 1024
+TEMPO_AC_SIZE = 8.0  # 自相关窗口长度（秒），同 librosa.feature.tempo
+# 谱通量在 Mel 频带上的汇总方式
+AGGREGATES = ('mean', 'median')
+
+
+def _aggregate(flux):
+    """(帧数, 频带数) 的谱通量 -> (帧数, len(AGGREGATES))"""
+    return np.stack([flux.mean(axis=1), np.median(flux, axis=1)], axis=1).astype(np.float32)
+
+
+def warm_up(sample_rate: int = 22050, hop_length: int = 512):
+    """
+    预先导入 librosa 的相关子模块并触发 numba 编译（首次节拍跟踪约需数秒），
+    在启动时于后台线程调用，播放第一首音乐时流式分析即可在一秒内就绪
+    """
+    import librosa
+    envelope = np.random.default_rng(0).random(8 * sample_rate // hop_length).astype(np.float32)
+    librosa.beat.beat_track(onset_envelope=envelope, sr=sample_rate, hop_length=hop_length)
+    librosa.onset.onset_detect(onset_envelope=envelope, sr=sample_rate, hop_length=hop_length, units='time')
+    librosa.filters.mel(sr=sample_rate, n_fft=N_FFT, n_mels=N_MELS)
+
+
+def _soundfile_blocks(file_path, block_size):
+    """soundfile 逐块读取，未安装或格式不支持时返回 None"""
+    try:
+        import soundfile
+        f = soundfile.SoundFile(file_path)
+    except Exception:
+        return None
+
+    def blocks():
+        with f:
+            for block in f.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+                yield block.mean(axis=1)
+    return f.samplerate, blocks()
+
+
+def _audioread_blocks(file_path):
+    """audioread（ffmpeg/GStreamer 等）逐块读取 16 位 PCM"""
+    import audioread
+    f = audioread.audio_open(file_path)
+
+    def blocks():
+        with f:
+            for buf in f:
+                block = np.frombuffer(buf, dtype='<i2').astype(np.float32) / 32768.0
+                yield block.reshape(-1, f.channels).mean(axis=1)
+    return f.samplerate, blocks()
+
+
+def decode_blocks(file_path: str, sample_rate: int = 22050, block_size: int = 65536) -> Iterator[np.ndarray]:
+    """
+    逐块解码为单声道 float32 并重采样到 sample_rate，内存中只有当前块。
+    优先使用 soundfile，不支持的格式使用 audioread；重采样需要 soxr（流式重采样，块边界无失真）
+    """
+    source = _soundfile_blocks(file_path, block_size) or _audioread_blocks(file_path)
+    native, blocks = source
+    try:
+        if native == sample_rate:
+            yield from blocks
+            return
+        import soxr
+        resampler = soxr.ResampleStream(native, sample_rate, 1, dtype='float32')
+        for block in blocks:
+            out = resampler.resample_chunk(block)
+            if len(out):
+                yield out
+        out = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(out):
+            yield out
+    finally:
+        blocks.close()
+
+
+class StreamingAnalysis:
+    """
+    边解码边分析一首音乐，不必等整首解码和节拍跟踪完成即可开始播放：
+    - 逐块解码，内存中只保留当前块和一帧的重叠，逐帧计算 RMS、频谱质心和起音强度（与 librosa 的居中分帧对齐）
+    - 每多分析 refine_interval 秒，在最近 window 秒的起音包络上重新估计速度和节拍，window 开头之前的节拍保持不变
+    - 解码结束后在完整的起音包络上按离线分析的方式做一次节拍跟踪
+    与 analyze_signal 的差异：RMS 和频谱质心相同；起音包络的 top_db 下限在开头 HEAD_SECONDS 秒之后
+    取到目前为止的最大值而不是整首的最大值，只影响比当时最大值低 TOP_DB 以上的 Mel 频带，
+    因此节拍和起音与离线分析接近但不保证逐个相同（差异见本文件的测试代码）。
+    on_update(result) 在分析线程中调用，result 为到目前为止的结果（格式同 analyze_signal，不含 beat_frames）。
+    on_error(error) 在分析线程中调用（取消后不调用），此时 ready 可能已经置位，调用方需改用离线分析。
+    已分析 ready_after 秒（或整首分析完、或出错）后 ready 置位。
+    """
+
+    def __init__(self, file_path: str, sample_rate: int = 22050, frame_size: int = 2048, hop_length: int = 512,
+                 on_update: Optional[Callable[[Dict], None]] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None,
+                 ready_after: float = 4.0, refine_interval: float = 3.0, window: float = 20.0):
+        self.file_path = file_path
+        self.sr = sample_rate
+        self.frame_size = frame_size
+        self.hop_length = hop_length
+        self.on_update = on_update
+        self.on_error = on_error
+        self.ready_after = ready_after
+        self.refine_interval = refine_interval
+        self.window = window
+        self.tempo = 0.0
+        self.beat_times = np.zeros(0)
+        self.onset_times = np.zeros(0)
+        self.samples = 0  # 已解码的样本数
+        self.frames = 0  # 已计算的帧数
+        self.error = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self._rms = []
+        self._centroids = []
+        self._flux = []
+        self._last_db = None
+        self._head = []  # 开头 HEAD_SECONDS 秒未截断的对数 Mel 谱
+        self._db_max = -np.inf
+        self._thread = None
+
+    @property
+    def duration(self) -> float:
+        """已分析的音频时长（秒）"""
+        return self.samples / self.sr
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StreamingAnalysis", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def _run(self):
+        try:
+            self.analyze()
+        except Exception as e:
+            self.error = e
+            if self.on_error is not None and not self._cancel.is_set():
+                try:
+                    self.on_error(e)
+                except Exception as handler_error:
+                    print(f"流式分析错误处理失败: {handler_error}")
+        finally:
+            self.ready.set()
+            self.done.set()
+
+    def analyze(self):
+        """在当前线程中完成整首分析（start() 在后台线程中调用）"""
+        import librosa
+        self._librosa = librosa
+        self._window_fn = librosa.filters.get_window('hann', N_FFT, fftbins=True).astype(np.float32)
+        self._mel = librosa.filters.mel(sr=self.sr, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32)
+        self._freqs = librosa.fft_frequencies(sr=self.sr, n_fft=N_FFT).astype(np.float32)
+
+        length = max(self.frame_size, N_FFT)
+        buffer = np.zeros(length // 2, dtype=np.float32)  # 居中分帧：开头补半帧零
+        next_refine = self.ready_after
+        for block in decode_blocks(self.file_path, self.sr):
+            if self._cancel.is_set():
+                return
+            self.samples += len(block)
+            buffer = self._consume(np.concatenate([buffer, block]), length)
+            if self.duration >= next_refine:
+                self._refine()
+                self.ready.set()
+                next_refine = self.duration + self.refine_interval
+        # 结尾补半帧零，帧数与 librosa 一致：1 + 样本数 // hop_length
+        self._consume(np.concatenate([buffer, np.zeros(length // 2, dtype=np.float32)]), length)
+        if not self._cancel.is_set():
+            self._refine(final=True)
+
+    def _consume(self, buffer, length):
+        """计算 buffer 中所有完整的帧，返回剩余（下一帧起点之后）的样本"""
+        count = (len(buffer) - length) // self.hop_length + 1 if len(buffer) >= length else 0
+        if count > 0:
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, length)[::self.hop_length][:count]
+            self._process(frames, length)
+            buffer = buffer[count * self.hop_length:]
+        return buffer
+
+    def _process(self, frames, length):
+        """一组帧（每行 length 个样本，居中截取 frame_size / N_FFT）的 RMS、频谱质心和起音强度"""
+        offset = (length - self.frame_size) // 2
+        rms_frames = frames[:, offset:offset + self.frame_size]
+        self._rms.append(np.sqrt(np.mean(np.square(rms_frames, dtype=np.float32), axis=1)))
+
+        offset = (length - N_FFT) // 2
+        spectrum = np.abs(np.fft.rfft(frames[:, offset:offset + N_FFT] * self._window_fn, axis=1)).astype(np.float32)
+        total = spectrum.sum(axis=1)
+        self._centroids.append(np.where(total > 0, spectrum @ self._freqs / np.maximum(total, 1e-10), 0.0))
+
+        # 对数 Mel 谱的正向差分（谱通量）；librosa 的 top_db 相对整首的最大值，这里用到目前为止的最大值
+        db = 10.0 * np.log10(np.maximum(np.square(spectrum) @ self._mel.T, 1e-10))
+        head = int(HEAD_SECONDS * self.sr / self.hop_length) - self.frames
+        if head > 0:
+            self._head.append(db[:head])
+        self._db_max = max(self._db_max, float(db.max()))
+        db = np.maximum(db, self._db_max - TOP_DB)
+        previous = np.vstack([db[:1] if self._last_db is None else self._last_db[None], db[:-1]])
+        self._flux.append(_aggregate(np.maximum(db - previous, 0.0)))
+        self._last_db = db[-1]
+        self.frames += len(frames)
+
+    def onset_envelope(self, aggregate: str = 'mean') -> np.ndarray:
+        """
+        起音强度包络，与 librosa.onset.onset_strength 一样相对谱通量延后两帧。
+        aggregate='mean' 用于起音检测，'median' 用于节拍跟踪（同 librosa.beat.beat_track）
+        """
+        column = AGGREGATES.index(aggregate)
+        flux = np.concatenate([np.zeros((2, len(AGGREGATES)), dtype=np.float32)] + self._flux)
+        if self._head:
+            head = np.maximum(np.vstack(self._head), self._db_max - TOP_DB)
+            flux[3:len(head) + 2] = _aggregate(np.maximum(head[1:] - head[:-1], 0.0))
+        return np.ascontiguousarray(flux[:self.frames, column])
+
+    def _refine(self, final=False):
+        """重新估计速度和节拍，发布当前结果"""
+        librosa = self._librosa
+        envelope = self.onset_envelope('median')
+        start = 0 if final else max(0, len(envelope) - int(self.window * self.sr / self.hop_length))
+        offset = start * self.hop_length / self.sr
+        tempo, beat_frames = librosa.beat.beat_track(onset_envelope=envelope[start:], sr=self.sr,
+                                                     hop_length=self.hop_length,
+                                                     bpm=self._global_tempo(envelope) if final else None)
+        beats = librosa.frames_to_time(beat_frames, sr=self.sr, hop_length=self.hop_length) + offset
+        envelope = self.onset_envelope('mean')
+        onsets = librosa.onset.onset_detect(onset_envelope=envelope[start:], sr=self.sr,
+                                            hop_length=self.hop_length, units='time') + offset
+        tempo = float(np.ravel(tempo)[0])
+        if start == 0:
+            self.beat_times, self.onset_times = beats, onsets
+        else:
+            # 窗口开头的节拍/起音缺少前文，保留之前的结果，从窗口中部开始替换
+            cut = offset + self.window / 2
+            period = 60.0 / tempo if tempo > 0 else 0.0
+            kept = self.beat_times[self.beat_times < cut]
+            beats = beats[beats >= cut]
+            if len(kept) and len(beats):
+                beats = beats[beats > kept[-1] + period / 2]
+            self.beat_times = np.concatenate([kept, beats])
+            self.onset_times = np.concatenate([self.onset_times[self.onset_times < cut], onsets[onsets >= cut]])
+        if tempo > 0:
+            self.tempo = tempo
+        if self.on_update is not None and not self._cancel.is_set():
+            self.on_update(self.result())
+
+    def _global_tempo(self, envelope):
+        """
+        整首的速度，与 librosa.feature.tempo 相同（自相关图按时间取平均后加先验取最大），
+        自相关图按 TEMPO_SEGMENT 帧分段计算再累加，内存占用与音乐长度无关
+        """
+        librosa = self._librosa
+        win_length = int(librosa.time_to_frames(TEMPO_AC_SIZE, sr=self.sr, hop_length=self.hop_length))
+        half = win_length // 2
+        total = np.zeros(win_length)
+        count = len(envelope)
+        for begin in range(0, count, TEMPO_SEGMENT):
+            end = min(count, begin + TEMPO_SEGMENT)
+            # 前后各多取半个窗口，段内各列的自相关窗口与整首计算时完全相同
+            low, high = max(0, begin - half), min(count, end + half)
+            tempogram = librosa.feature.tempogram(onset_envelope=envelope[low:high], sr=self.sr,
+                                                  hop_length=self.hop_length, win_length=win_length)
+            total += tempogram[:, begin - low:end - low].sum(axis=1)
+        return float(librosa.feature.tempo(tg=(total / max(count, 1))[:, None], sr=self.sr,
+                                           hop_length=self.hop_length, aggregate=None)[0])
+
+    def result(self) -> Dict:
+        return {'tempo': self.tempo, 'sr': self.sr, 'beat_times': self.beat_times, 'onset_times': self.onset_times,
+                'rms_energy': np.concatenate(self._rms) if self._rms else np.zeros(0, dtype=np.float32),
+                'spectral_centroids': (np.concatenate(self._centroids) if self._centroids
+                                       else np.zeros(0, dtype=np.float32))}
+
+
+def compare(stream_result: Dict, offline: Dict, tolerance: float = 0.07) -> Dict:
+    """
+    流式结果与 analyze_signal 结果的差异：速度差、RMS/频谱质心的最大误差，
+    以及节拍和起音在 tolerance 秒内能互相找到对应的比例（1.0 表示逐个一致）
+    """
+    def matched(times, reference):
+        """times 中距 reference 最近的时间不超过 tolerance 的比例"""
+        times, reference = np.asarray(times, dtype=np.float64), np.asarray(reference, dtype=np.float64)
+        if len(times) == 0 or len(reference) == 0:
+            return float(len(times) == len(reference))
+        index = np.searchsorted(reference, times)
+        after = np.abs(reference[np.minimum(index, len(reference) - 1)] - times)
+        before = np.abs(times - reference[np.maximum(index - 1, 0)])
+        return float(np.mean(np.minimum(before, after) <= tolerance))
+
+    count = min(len(stream_result['rms_energy']), len(offline['rms_energy']))
+    return {'tempo': abs(stream_result['tempo'] - float(np.ravel(offline['tempo'])[0])),
+            'frames': len(stream_result['rms_energy']) - len(offline['rms_energy']),
+            'rms': float(np.max(np.abs(stream_result['rms_energy'][:count] - offline['rms_energy'][:count]),
+                                initial=0.0)),
+            'centroid': float(np.max(np.abs(stream_result['spectral_centroids'][:count]
+                                            - offline['spectral_centroids'][:count]), initial=0.0)),
+            'beats': min(matched(stream_result['beat_times'], offline['beat_times']),
+                         matched(offline['beat_times'], stream_result['beat_times'])),
+            'onsets': min(matched(stream_result['onset_times'], offline['onset_times']),
+                          matched(offline['onset_times'], stream_result['onset_times']))}
+
+
+# 测试代码
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'music')
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(folder, sorted(os.listdir(folder))[0])
+    start = time.perf_counter()
+    stream = StreamingAnalysis(path, on_update=lambda result: print(
+        f"[{time.perf_counter() - start:5.2f}s] {len(result['rms_energy'])} frames, "
+        f"tempo {result['tempo']:.1f}, {len(result['beat_times'])} beats")).start()
+    stream.wait_ready()
+    print(f"ready after {time.perf_counter() - start:.2f}s ({stream.duration:.1f}s analyzed)")
+    stream.done.wait()
+    print(f"done after {time.perf_counter() - start:.2f}s, error: {stream.error}")
+
+    # 与离线分析（analyze_signal）比较
+    import librosa
+    from audio_analyzer import analyze_signal
+    y, sr = librosa.load(path, sr=stream.sr)
+    offline = analyze_signal(y, sr, stream.frame_size, stream.hop_length)
+    envelope = librosa.onset.onset_strength(y=y, sr=sr, hop_length=stream.hop_length)
+    print(f"onset envelope max error: {np.max(np.abs(stream.onset_envelope('mean') - envelope)):.4f} "
+          f"(envelope max {envelope.max():.2f})")
+    for name, value in compare(stream.result(), offline).items():
+        print(f"{name}: {value}")
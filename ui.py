@@ -4,10 +4,9 @@ import time
 from tkinter import *
 from tkinter import ttk, messagebox
 from tkinter.scrolledtext import ScrolledText
-from dobot_api import *
+from dobot_connect import connectRobot
+from dobot_state import RobotState
 import json
-from files.alarmController import alarm_controller_list
-from files.alarmServo import alarm_servo_list
 
 LABEL_JOINT = [["J1-", "J2-", "J3-", "J4-", "J5-", "J6-"],
                ["J1:", "J2:", "J3:", "J4:", "J5:", "J6:"],
@@ -17,20 +16,6 @@ LABEL_COORD = [["X-", "Y-", "Z-", "Rx-", "Ry-", "Rz-"],
                ["X:", "Y:", "Z:", "Rx:", "Ry:", "Rz:"],
                ["X+", "Y+", "Z+", "Rx+", "Ry+", "Rz+"]]
 
-LABEL_ROBOT_MODE = {
-    1:	"ROBOT_MODE_INIT",
-    2:	"ROBOT_MODE_BRAKE_OPEN",
-    3:	"",
-    4:	"ROBOT_MODE_DISABLED",
-    5:	"ROBOT_MODE_ENABLE",
-    6:	"ROBOT_MODE_BACKDRIVE",
-    7:	"ROBOT_MODE_RUNNING",
-    8:	"ROBOT_MODE_RECORDING",
-    9:	"ROBOT_MODE_ERROR",
-    10:	"ROBOT_MODE_PAUSE",
-    11:	"ROBOT_MODE_JOG"
-}
-
 
 class RobotUI(object):
 
@@ -75,6 +60,12 @@ class RobotUI(object):
             self.frame_robot, width=7, textvariable=feed_port)
         self.entry_feed.place(rely=0.2, x=520)
 
+        # 反馈在独立进程中读取，经共享内存发布 Read the feedback in a separate process, published via shared memory
+        self.feed_process = BooleanVar(self.root, value=False)
+        self.check_feed_process = Checkbutton(self.frame_robot, text="Feedback Process",
+                                              variable=self.feed_process, bg="#FFFFFF")
+        self.check_feed_process.place(rely=0.6, x=420)
+
         # Connect/DisConnect
         self.button_connect = self.set_button(master=self.frame_robot,
                                               text="Connect", rely=0.6, x=630, command=self.connect_port)
@@ -226,8 +217,17 @@ class RobotUI(object):
         self.client_dash = None
         self.client_feed = None
 
-        self.alarm_controller_dict = self.convert_dict(alarm_controller_list)
-        self.alarm_servo_dict = self.convert_dict(alarm_servo_list)
+        # 告警表在第一次查询时加载 The alarm tables are loaded on the first lookup
+        self.alarm_controller_dict = None
+        self.alarm_servo_dict = None
+
+    def load_alarms(self):
+        # 告警表模块较大（约 0.9 MB），只在出现告警时导入 The alarm modules are large, import them only when an alarm shows up
+        if self.alarm_controller_dict is None:
+            from files.alarmController import alarm_controller_list
+            from files.alarmServo import alarm_servo_list
+            self.alarm_controller_dict = self.convert_dict(alarm_controller_list)
+            self.alarm_servo_dict = self.convert_dict(alarm_servo_list)
 
     def convert_dict(self, alarm_list):
         alarm_dict = {}
@@ -309,13 +309,28 @@ class RobotUI(object):
                 i["state"] = "disable"
             self.button_connect["text"] = "Connect"
         else:
+            session = None
             try:
-                print("连接成功")
-                self.client_dash = DobotApiDashboard(
-                    self.entry_ip.get(), int(self.entry_dash.get()), self.text_log)
-                self.client_feed = DobotApiFeedBack(
-                    self.entry_ip.get(), int(self.entry_feed.get()), self.text_log)
+                # 并行连接并等待第一帧反馈，IP 不可达时在超时内报错而不是卡住界面
+                if self.feed_process.get():
+                    from dobot_shared_feedback import SharedFeedback
+                    session = connectRobot(self.entry_ip.get(), int(self.entry_dash.get()), None,
+                                           text_log=self.text_log)
+                    self.client_feed = SharedFeedback.spawn(
+                        self.entry_ip.get(), int(self.entry_feed.get()))
+                    self.feed_count = 0
+                else:
+                    session = connectRobot(self.entry_ip.get(), int(self.entry_dash.get()),
+                                           int(self.entry_feed.get()), text_log=self.text_log)
+                    self.client_feed = session.feedback
+                self.client_dash = session.dashboard
+                print("连接成功", session.timings)
             except Exception as e:
+                # 反馈进程启动失败时关闭已建立的 Dashboard 连接，界面保持未连接状态
+                if session is not None:
+                    session.close()
+                self.client_dash = None
+                self.client_feed = None
                 messagebox.showerror("Attention!", f"Connection Error:{e}")
                 return
 
@@ -417,20 +432,35 @@ class RobotUI(object):
             self.frame_feed, text_list[2][5], rely=0.7, x=x4, command=lambda: self.move_jog(text_list[2][0]))
 
     def feed_back(self):
+        # 反馈相关模块在连接后才导入 Feedback modules are imported only once connected
+        import numpy as np
+        from dobot_api import MyType
+        from dobot_shared_feedback import SharedFeedback
+        from dobot_io import DigitalIO
+        self.io = DigitalIO()
+        # 报警只在进入报警状态时查询一次 Alarms are queried once when entering the error state
+        self.state = RobotState()
+        self.state.on('error', lambda event: self.display_error_info())
         while True:
             print("self.global_state(connect)", self.global_state["connect"])
             if not self.global_state["connect"]:
                 break
 
-            self.client_feed.socket_dobot.setblocking(True)  # 设置为阻塞模式
-            data = bytes()
-            temp = self.client_feed.socket_dobot.recv(144000)
-            if len(temp) > 1440:
+            if isinstance(self.client_feed, SharedFeedback):
+                latest = self.client_feed.wait_frame(self.feed_count, timeout=0.5)
+                if latest is None:
+                    continue
+                a, self.feed_count, stamp = latest
+            else:
+                self.client_feed.socket_dobot.setblocking(True)  # 设置为阻塞模式
+                data = bytes()
                 temp = self.client_feed.socket_dobot.recv(144000)
-            data = temp[0:1440]
-        
+                if len(temp) > 1440:
+                    temp = self.client_feed.socket_dobot.recv(144000)
+                data = temp[0:1440]
 
-            a = np.frombuffer(data, dtype=MyType)
+                a = np.frombuffer(data, dtype=MyType)
+                stamp = None
             print("robot_mode:", a["RobotMode"][0])
             print("TestValue:", hex((a['TestValue'][0])))
             if hex((a['TestValue'][0])) == '0x123456789abcdef':
@@ -440,26 +470,23 @@ class RobotUI(object):
 
                 # Refresh Properties
                 self.label_feed_speed["text"] = a["SpeedScaling"][0]
-                self.label_robot_mode["text"] = LABEL_ROBOT_MODE[a["RobotMode"][0]]
-                self.label_di_input["text"] = bin(a["DigitalInputs"][0])[
-                    2:].rjust(64, '0')
-                self.label_di_output["text"] = bin(a["DigitalOutputs"][0])[
-                    2:].rjust(64, '0')
+                self.state.update(a, stamp)
+                self.label_robot_mode["text"] = self.state.modeName
+                self.io.update(a, stamp)
+                self.label_di_input["text"] = self.io.text('DI')
+                self.label_di_output["text"] = self.io.text('DO')
 
                 # Refresh coordinate points
                 self.set_feed_joint(LABEL_JOINT, a["QActual"])
                 self.set_feed_joint(LABEL_COORD, a["ToolVectorActual"])
 
-                # check alarms
-                if a["RobotMode"] == 9:
-                    self.display_error_info()
-
 
     def display_error_info(self):
         error_list = self.client_dash.GetErrorID().split("{")[1].split("}")[0]
 
         error_list = json.loads(error_list)
         print("error_list:", error_list)
+        self.load_alarms()
         if error_list[0]:
             for i in error_list[0]:
                 self.form_error(i, self.alarm_controller_dict,
@@ -485,6 +512,7 @@ class RobotUI(object):
         self.text_err.delete("1.0", "end")
 
     def set_feed_joint(self, label, value):
+        import numpy as np
         array_value = np.around(value, decimals=4)
         self.label_feed_dict[label[1][0]]["text"] = array_value[0][0]
         self.label_feed_dict[label[1][1]]["text"] = array_value[0][1]